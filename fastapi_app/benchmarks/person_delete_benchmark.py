@@ -0,0 +1,136 @@
+"""
+Benchmark for deleting a person with many tasks
+
+Maps a copy of the persons and tasks tables twice: once with the ORM cascade
+the models had before (the session loads every task and deletes them one by
+one) and once with the ON DELETE CASCADE foreign key and passive_deletes
+(a single DELETE of the person). Deletes one person per task count and
+compares the time taken.
+
+Run from fastapi_app: python -m benchmarks.person_delete_benchmark [--url URL] [--tasks 100 1000 10000 50000]
+"""
+import argparse
+import time
+from datetime import date
+from sqlalchemy import (
+    Boolean, Column, Date, ForeignKey, Integer, String, create_engine, delete, event, insert
+)
+from sqlalchemy.orm import Session, declarative_base, relationship
+
+BATCH_SIZE = 1000
+
+Base = declarative_base()
+
+
+class PersonBefore(Base):
+    """person whose tasks are deleted by the ORM cascade
+    """
+    __tablename__ = "bench_persons_before"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50))
+    tasks = relationship("TaskBefore", cascade="all, delete-orphan")
+
+
+class TaskBefore(Base):
+    __tablename__ = "bench_tasks_before"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(30))
+    completed = Column(Boolean, default=False)
+    startdate = Column(Date, nullable=False)
+    assigned_person_id = Column(Integer, ForeignKey("bench_persons_before.id"), index=True)
+
+
+class PersonAfter(Base):
+    """person whose tasks are deleted by the foreign key
+    """
+    __tablename__ = "bench_persons_after"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50))
+    tasks = relationship("TaskAfter", cascade="all, delete-orphan", passive_deletes=True)
+
+
+class TaskAfter(Base):
+    __tablename__ = "bench_tasks_after"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(30))
+    completed = Column(Boolean, default=False)
+    startdate = Column(Date, nullable=False)
+    assigned_person_id = Column(
+        Integer, ForeignKey("bench_persons_after.id", ondelete="CASCADE"), index=True
+    )
+
+
+def create_person_with_tasks(engine, person_model, task_model, tasks: int) -> int:
+    """inserts a person and its tasks in batches
+
+    Returns:
+        int: id of the person
+    """
+    with engine.begin() as conn:
+        person_id = conn.execute(
+            insert(person_model).values(name=f"person with {tasks} tasks")
+        ).inserted_primary_key[0]
+        rows = [
+            {"name": f"task {i}", "startdate": date(2023, 1, 1), "assigned_person_id": person_id}
+            for i in range(tasks)
+        ]
+        for offset in range(0, len(rows), BATCH_SIZE):
+            conn.execute(insert(task_model), rows[offset:offset + BATCH_SIZE])
+    return person_id
+
+
+def delete_with_orm_cascade(engine, person_id: int) -> None:
+    """what PersonDAO.delete_person_by_id did before: load the person, then
+    session.delete loads and deletes every task
+    """
+    with Session(engine) as db:
+        db.delete(db.get(PersonBefore, person_id))
+        db.commit()
+
+
+def delete_with_foreign_key(engine, person_id: int) -> None:
+    """what PersonDAO.delete_person_by_id does now: one DELETE statement
+    """
+    with Session(engine) as db:
+        db.execute(delete(PersonAfter).where(PersonAfter.id == person_id))
+        db.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="sqlite:///person_delete_benchmark.db")
+    parser.add_argument("--tasks", type=int, nargs="+", default=[100, 1000, 10000, 50000])
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    if engine.dialect.name == "sqlite":
+        # SQLite only enforces foreign keys, and so ON DELETE CASCADE, when asked to
+        @event.listens_for(engine, "connect")
+        def enable_foreign_keys(dbapi_connection, _record):
+            dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+    strategies = {
+        "orm cascade": (PersonBefore, TaskBefore, delete_with_orm_cascade),
+        "on delete cascade": (PersonAfter, TaskAfter, delete_with_foreign_key),
+    }
+    try:
+        for tasks in args.tasks:
+            for label, (person_model, task_model, delete_person) in strategies.items():
+                person_id = create_person_with_tasks(engine, person_model, task_model, tasks)
+                start = time.perf_counter()
+                delete_person(engine, person_id)
+                elapsed = time.perf_counter() - start
+                print(f"{tasks:>7} tasks {label:<18} {elapsed * 1000:10.1f} ms")
+    finally:
+        Base.metadata.drop_all(engine)
+
+
+if __name__ == "__main__":
+    main()
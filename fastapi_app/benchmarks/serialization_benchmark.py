@@ -0,0 +1,109 @@
+"""
+Benchmark of the serialization of large list responses
+
+Builds pages of ORM tasks and of ORM persons with their tasks, then serializes
+them the way FastAPI does for a route's response_model (validation of the rows
+into the response model, a dump to Python objects and json.dumps in
+JSONResponse) and with the fast path of FAST_SERIALIZATION (validation and
+dump to JSON bytes with one TypeAdapter in pydantic-core). Both paths must
+answer the same bytes, the median time per page is reported.
+
+Run from fastapi_app: python -m benchmarks.serialization_benchmark [--rows 10000]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import date, timedelta
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from task_manager.db import models
+from task_manager.schemas.pagination import Page
+from task_manager.schemas.persons import Person
+from task_manager.schemas.serialization import serialize_json
+from task_manager.schemas.tasks import Task
+
+
+def build_tasks(rows: int, person_id: int = 1) -> list[models.Task]:
+    """transient ORM tasks, every other one completed
+
+    Args:
+        rows (int): number of tasks
+        person_id (int): person the tasks are assigned to
+
+    Returns:
+        list[models.Task]: the tasks
+    """
+    start = date(2023, 9, 6)
+    return [
+        models.Task(
+            id=task_id, name=f"Task {task_id}", description=f"Description of task {task_id}",
+            completed=task_id % 2 == 0, startdate=start,
+            enddate=start + timedelta(days=task_id % 30) if task_id % 2 == 0 else None,
+            assigned_person_id=person_id, version=1,
+        )
+        for task_id in range(1, rows + 1)
+    ]
+
+
+def build_persons(rows: int, tasks_per_person: int) -> list[models.Person]:
+    """transient ORM persons with their tasks loaded
+
+    Args:
+        rows (int): number of persons
+        tasks_per_person (int): tasks of each person
+
+    Returns:
+        list[models.Person]: the persons
+    """
+    persons = []
+    for person_id in range(1, rows + 1):
+        person = models.Person(id=person_id, name=f"Person {person_id}", version=1)
+        person.tasks = build_tasks(tasks_per_person, person_id)
+        persons.append(person)
+    return persons
+
+
+def fastapi_body(field, page: dict) -> bytes:
+    """body FastAPI answers for a route declaring the response model of field
+    """
+    content = asyncio.run(serialize_response(field=field, response_content=page))
+    return JSONResponse(content).body
+
+
+def median_ms(serialize, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        serialize()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--tasks-per-person", type=int, default=2)
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    pages = {
+        "tasks": (Page[Task], build_tasks(args.rows)),
+        "persons": (Page[Person], build_persons(args.rows, args.tasks_per_person)),
+    }
+    for label, (schema, rows) in pages.items():
+        page = {"items": rows, "limit": args.rows, "next_cursor": None}
+        field = create_response_field(name=f"Response_{label}", type_=schema)
+        assert fastapi_body(field, page) == serialize_json(page, schema)
+
+        default = median_ms(lambda: fastapi_body(field, page), args.repeats)
+        fast = median_ms(lambda: serialize_json(page, schema), args.repeats)
+        print(
+            f"{args.rows} {label:<8} response_model {default:8.1f} ms"
+            f"   fast path {fast:8.1f} ms   {default / fast:5.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark for the cold start of the webservice
+
+Measures, in fresh interpreters, how long importing task_manager.main takes
+and, optionally, how long the lifespan startup (engines, schema check and
+broker connection) takes on top of it.
+
+Run from fastapi_app: python -m benchmarks.startup_benchmark [--runs 10] [--lifespan]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+IMPORT_SNIPPET = """
+import time
+start = time.perf_counter()
+import task_manager.main
+print(time.perf_counter() - start)
+"""
+
+LIFESPAN_SNIPPET = """
+import time
+from fastapi.testclient import TestClient
+from task_manager.main import create_app
+app = create_app()
+start = time.perf_counter()
+with TestClient(app):
+    print(time.perf_counter() - start)
+"""
+
+
+def time_snippet(snippet: str, runs: int) -> list[float]:
+    """runs the snippet in a fresh interpreter per run
+
+    Args:
+        snippet (str): code printing the measured seconds as its last line
+        runs (int): number of interpreters to start
+
+    Returns:
+        list[float]: measured seconds per run
+    """
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", snippet], capture_output=True, text=True, check=True
+        ).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+    return timings
+
+
+def report(label: str, timings: list[float]) -> None:
+    print(
+        f"{label:<20} median {statistics.median(timings) * 1000:8.1f} ms"
+        f"   min {min(timings) * 1000:8.1f} ms   max {max(timings) * 1000:8.1f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument(
+        "--lifespan", action="store_true",
+        help="also time the startup hook, needs the database and broker to be reachable",
+    )
+    args = parser.parse_args()
+
+    report("import", time_snippet(IMPORT_SNIPPET, args.runs))
+    if args.lifespan:
+        report("lifespan startup", time_snippet(LIFESPAN_SNIPPET, args.runs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Benchmark for the index set of the tasks table
+
+Builds a copy of the tasks table with the indexes it had before the rework
+(name, description and a duplicate index on the primary key) and one with
+the current access path indexes, then compares insert throughput and the
+latency of the queries the endpoints run: tasks per person, open tasks by
+date and completed tasks.
+
+Run from fastapi_app: python -m benchmarks.task_index_benchmark [--url URL] [--rows 100000]
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from sqlalchemy import (
+    Boolean, Column, Date, Index, Integer, MetaData, String, Table, create_engine, select
+)
+
+BATCH_SIZE = 1000
+
+
+def build_tables(metadata: MetaData) -> dict[str, Table]:
+    """tasks tables with the old and the new index set, index names are
+    prefixed since SQLite keeps them in one namespace per database
+
+    Args:
+        metadata (MetaData): metadata to register the tables in
+
+    Returns:
+        dict[str, Table]: tables by label
+    """
+    def columns():
+        return (
+            Column("id", Integer, primary_key=True),
+            Column("name", String(30)),
+            Column("description", String(100)),
+            Column("completed", Boolean, default=False),
+            Column("startdate", Date, nullable=False),
+            Column("enddate", Date, nullable=True),
+            Column("assigned_person_id", Integer),
+        )
+
+    before = Table("bench_tasks_before", metadata, *columns())
+    Index("bench_before_id", before.c.id)
+    Index("bench_before_name", before.c.name)
+    Index("bench_before_description", before.c.description)
+    # the implicit index MySQL creates for the foreign key
+    Index("bench_before_assigned_person_id", before.c.assigned_person_id)
+
+    after = Table("bench_tasks_after", metadata, *columns())
+    Index("bench_after_name", after.c.name)
+    Index("bench_after_assigned_person_id_startdate", after.c.assigned_person_id, after.c.startdate)
+    Index("bench_after_completed_startdate", after.c.completed, after.c.startdate)
+    Index("bench_after_completed_enddate", after.c.completed, after.c.enddate)
+
+    return {"before": before, "after": after}
+
+
+WORDS = (
+    "review", "deploy", "fix", "write", "update", "report", "design", "test", "plan",
+    "migrate", "database", "frontend", "invoice", "customer", "release", "backup",
+)
+
+
+def random_text(rng: random.Random, max_length: int) -> str:
+    """random words, so index keys arrive in random order like real names and descriptions
+    """
+    text = " ".join(rng.choice(WORDS) for _ in range(max_length // 6))
+    return text[:max_length]
+
+
+def generate_rows(rows: int, persons: int, seed: int) -> list[dict]:
+    rng = random.Random(seed)
+    first_day = date(2023, 1, 1)
+    generated = []
+    for _ in range(rows):
+        startdate = first_day + timedelta(days=rng.randrange(730))
+        completed = rng.random() < 0.5
+        generated.append({
+            "name": random_text(rng, 30),
+            "description": random_text(rng, 100),
+            "completed": completed,
+            "startdate": startdate,
+            "enddate": startdate + timedelta(days=rng.randrange(1, 60)) if completed else None,
+            "assigned_person_id": rng.randrange(1, persons + 1),
+        })
+    return generated
+
+
+def time_inserts(engine, table: Table, rows: list[dict]) -> float:
+    """inserts the rows in batches, one transaction per batch
+
+    Returns:
+        float: rows per second
+    """
+    start = time.perf_counter()
+    for offset in range(0, len(rows), BATCH_SIZE):
+        with engine.begin() as conn:
+            conn.execute(table.insert(), rows[offset:offset + BATCH_SIZE])
+    return len(rows) / (time.perf_counter() - start)
+
+
+def access_path_queries(table: Table, persons: int, rng: random.Random) -> dict:
+    """the queries of the endpoints, with random parameters per call
+    """
+    def tasks_per_person():
+        return (
+            select(table)
+            .where(table.c.assigned_person_id == rng.randrange(1, persons + 1))
+            .order_by(table.c.startdate)
+        )
+
+    def open_tasks_by_date():
+        start = date(2023, 1, 1) + timedelta(days=rng.randrange(700))
+        return select(table).where(
+            table.c.completed.is_(False),
+            table.c.startdate.between(start, start + timedelta(days=7)),
+        )
+
+    def completed_tasks():
+        end = date(2023, 1, 1) + timedelta(days=rng.randrange(700))
+        return select(table).where(
+            table.c.completed.is_(True),
+            table.c.enddate.between(end, end + timedelta(days=7)),
+        )
+
+    return {
+        "tasks per person": tasks_per_person,
+        "open tasks by date": open_tasks_by_date,
+        "completed tasks": completed_tasks,
+    }
+
+
+def time_queries(engine, table: Table, persons: int, repeats: int, seed: int) -> dict[str, float]:
+    """
+    Returns:
+        dict[str, float]: median latency in milliseconds per query
+    """
+    rng = random.Random(seed)
+    latencies = {}
+    with engine.connect() as conn:
+        for label, build_query in access_path_queries(table, persons, rng).items():
+            timings = []
+            for _ in range(repeats):
+                query = build_query()
+                start = time.perf_counter()
+                conn.execute(query).all()
+                timings.append(time.perf_counter() - start)
+            latencies[label] = statistics.median(timings) * 1000
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="sqlite:///task_index_benchmark.db")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--persons", type=int, default=1000)
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    metadata = MetaData()
+    tables = build_tables(metadata)
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+    rows = generate_rows(args.rows, args.persons, args.seed)
+    try:
+        for label, table in tables.items():
+            inserts_per_second = time_inserts(engine, table, rows)
+            print(f"{label:<7} insert throughput {inserts_per_second:12.0f} rows/s")
+            for query, latency in time_queries(
+                engine, table, args.persons, args.repeats, args.seed
+            ).items():
+                print(f"{label:<7} {query:<20} median {latency:8.3f} ms")
+    finally:
+        metadata.drop_all(engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,511 @@
+"""
+Async variant of the crud endpoints, served from the async engine
+when DATABASE_ASYNC is set
+"""
+# pylint: disable=invalid-name
+from datetime import date
+from fastapi import APIRouter, Body, Header, Path, Query, Depends, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from .schemas.persons import PersonBase, PersonBulkCreate, PersonCreate, PersonPatch, Person
+from .schemas.tasks import TaskBase, TaskBulkCreate, TaskCreate, TaskPatch, Task, TaskFilter
+from .schemas.bulk import BULK_MAX_ITEMS, BulkCreateResult
+from .schemas.pagination import DEFAULT_PAGE_LIMIT, MAX_PAGE_LIMIT, Page
+from .schemas.export import EXPORT_MEDIA_TYPES, ExportFormat, export_headers
+from .schemas.stats import StatsBucket, TaskStats
+from .schemas.fields import parse_fields, sparse_model, sparse_response
+from .schemas.serialization import fast_response
+from .schemas.etag import not_modified
+from .services.person_service import async_person_service
+from .services.task_service import async_task_service
+from .db.database import get_async_db, get_async_read_db
+
+router = APIRouter()
+
+
+@router.post("/persons", response_model=Person, status_code=status.HTTP_201_CREATED)
+async def create_person(person: PersonCreate, db: AsyncSession = Depends(get_async_db)) -> Person:
+    """POST endpoint for person
+
+    Args:
+        person (PersonCreate): person to create
+
+    Returns:
+        Person: newly created person
+    """
+    return await async_person_service.create_new_person(person=person, db=db)
+
+
+@router.post(
+    "/persons/bulk", response_model=BulkCreateResult, status_code=status.HTTP_201_CREATED
+)
+async def create_persons_bulk(
+    *,
+    persons: list[PersonBulkCreate] = Body(max_length=BULK_MAX_ITEMS),
+    partial: bool = Query(
+        default=False, description="create the valid persons even if some items fail"
+    ),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """POST endpoint to create many persons in one transaction
+
+    Args:
+        persons (list[PersonBulkCreate]): persons to create
+        partial (bool): create the valid items and report the others,
+            instead of rejecting the whole batch
+
+    Returns:
+        BulkCreateResult: number of persons created and errors per item
+    """
+    return await async_person_service.create_new_persons_bulk(persons=persons, partial=partial, db=db)
+
+
+@router.get("/persons", response_model=Page[Person])
+async def get_all_persons(
+    *,
+    db: AsyncSession = Depends(get_async_read_db),
+    cursor: int | None = Query(default=None, description="next_cursor of the previous page"),
+    limit: int = Query(default=DEFAULT_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT),
+    include: str = Query(
+        default="tasks", pattern="^(tasks)?$",
+        description="tasks to embed the tasks of each person, empty to skip loading them"
+    ),
+    fields: str | None = Query(
+        default=None, description="comma separated fields to return, e.g. id,name"
+    ),
+):
+    """GET endpoint to get persons, one page at a time
+
+    Args:
+        cursor (int): next_cursor of the previous page, None for the first page
+        limit (int): maximum number of persons in the page
+        include (str): "tasks" to embed the tasks of each person, "" to skip them
+        fields (str): only return these fields, tasks are embedded if listed
+            and include is then ignored
+
+    Returns:
+        Page[Person]: a page of persons ordered by id
+    """
+    selected = parse_fields(fields, Person)
+    include_tasks = include == "tasks" if selected is None else "tasks" in selected
+    page = await async_person_service.get_all_persons(
+        db=db, cursor=cursor, limit=limit, include_tasks=include_tasks, fields=selected
+    )
+    if selected is None:
+        return fast_response(page, Page[Person])
+    return sparse_response(page, Page[sparse_model(Person, selected)])
+
+
+# declared before /persons/{person_id} so "export" is not taken for an id
+@router.get("/persons/export", response_class=StreamingResponse)
+async def export_persons(
+    *,
+    db: AsyncSession = Depends(get_async_read_db),
+    export_format: ExportFormat = Query(default=ExportFormat.ndjson, alias="format"),
+):
+    """GET endpoint to download every person as NDJSON or CSV,
+    rows are streamed in batches as they are read from the database
+
+    Args:
+        export_format (ExportFormat): ndjson or csv
+
+    Returns:
+        StreamingResponse: the persons ordered by id, without their tasks
+    """
+    return StreamingResponse(
+        async_person_service.export_persons(db=db, export_format=export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers=export_headers("persons", export_format),
+    )
+
+
+@router.get("/persons/{person_id}", response_model=Person)
+async def get_person_by_id(
+    *,
+    db: AsyncSession = Depends(get_async_read_db),
+    person_id: int,
+    include: str = Query(
+        default="tasks", pattern="^(tasks)?$",
+        description="tasks to embed the tasks of each person, empty to skip loading them"
+    ),
+    fields: str | None = Query(
+        default=None, description="comma separated fields to return, e.g. id,name"
+    ),
+    if_none_match: str | None = Header(
+        default=None, description="ETag of the copy the client has"
+    ),
+    response: Response,
+) -> Person:
+    """GET endpoint to get person by id, answers 304 without reading the person
+    when If-None-Match has its current ETag, a cached person is served without a query
+
+    Args:
+        person_id (int): id of person
+        include (str): "tasks" to embed the tasks of the person, "" to skip them
+        fields (str): only return these fields, tasks are embedded if listed
+            and include is then ignored
+        if_none_match (str): ETags of the copies the client has
+
+    Returns:
+        Person: person with the id specified
+    """
+    selected = parse_fields(fields, Person)
+    include_tasks = include == "tasks" if selected is None else "tasks" in selected
+    etag, db_person = await async_person_service.get_person_by_id(
+        person_id=person_id, db=db, include_tasks=include_tasks, fields=selected,
+        if_none_match=if_none_match,
+    )
+    if db_person is None:
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+
+    if selected is None:
+        return fast_response(db_person, Person, headers={"ETag": etag})
+    return sparse_response(db_person, sparse_model(Person, selected), headers={"ETag": etag})
+
+
+@router.get("/persons/{person_id}/stats", response_model=TaskStats)
+async def get_person_stats(
+    *,
+    db: AsyncSession = Depends(get_async_read_db),
+    person_id: int = Path(description="id of the person"),
+    bucket: StatsBucket = Query(
+        default=StatsBucket.month, description="width of the histogram buckets"
+    ),
+    overdue_before: date | None = Query(
+        default=None, description="open tasks started before this date are overdue, default today"
+    ),
+):
+    """GET endpoint for the task statistics of a person
+
+    Args:
+        person_id (int): id of person
+        bucket (StatsBucket): day, month or year buckets for the histograms
+        overdue_before (date): open tasks started before this date are overdue
+
+    Returns:
+        TaskStats: counts by completion state, overdue count and date histograms
+    """
+    return await async_task_service.get_person_task_stats(
+        person_id=person_id, db=db, bucket=bucket, overdue_before=overdue_before
+    )
+
+
+@router.put("/persons/{person_id}", response_model=Person)
+async def update_person_by_id(
+    *,
+    person_id: int = Path(description="id of the person to update"),
+    person_update: PersonBase,
+    if_match: str | None = Header(
+        default=None, description="only update the person if it still has this ETag"
+    ),
+    db: AsyncSession = Depends(get_async_db)
+) -> Person:
+    """PUT endpoint to update person
+
+    Args:
+        person_id (int): id of person
+        person_update (PersonBase): PersonBase for update
+        if_match (str): ETags the person must have, else 412 is returned
+
+    Returns:
+        Person: updated person
+    """
+    return await async_person_service.update_person_by_id(
+        person_id=person_id, person_update=person_update, db=db, if_match=if_match
+    )
+
+
+@router.patch("/persons/{person_id}", response_model=Person)
+async def patch_person_by_id(
+    *,
+    person_id: int = Path(description="id of the person to update"),
+    person_patch: PersonPatch,
+    db: AsyncSession = Depends(get_async_db)
+) -> Person:
+    """PATCH endpoint to update the fields sent of a person,
+    nothing is written or published if they already have these values
+
+    Args:
+        person_id (int): id of person
+        person_patch (PersonPatch): fields to change
+
+    Returns:
+        Person: updated person
+    """
+    return await async_person_service.patch_person_by_id(
+        person_id=person_id, person_patch=person_patch, db=db
+    )
+
+
+@router.delete("/persons/{person_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_person_by_id(
+    person_id: int,
+    if_match: str | None = Header(
+        default=None, description="only delete the person if it still has this ETag"
+    ),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """DELETE endpoint to delete person
+
+    Args:
+        person_id (int): id of person to delete
+        if_match (str): ETags the person must have, else 412 is returned
+    """
+    return await async_person_service.delete_person_by_id(person_id=person_id, db=db, if_match=if_match)
+
+
+# ------------------------------------------------------------------------------------------
+
+
+@router.post("/tasks", response_model=Task, status_code=status.HTTP_201_CREATED)
+async def create_task(
+    *,
+    task: TaskCreate,
+    db: AsyncSession = Depends(get_async_db),
+    person_id: int = Query(description="id of the person to assign this task to")
+):
+    """POST endpoint for tasks
+
+    Args:
+        task (TaskCreate): task to create
+        person_id (int): id of the assigned person
+
+    Returns:
+        Task: newly created task
+    """
+    return await async_task_service.create_new_task(db=db, task=task, person_id=person_id)
+
+
+@router.post(
+    "/tasks/bulk", response_model=BulkCreateResult, status_code=status.HTTP_201_CREATED
+)
+async def create_tasks_bulk(
+    *,
+    tasks: list[TaskBulkCreate] = Body(max_length=BULK_MAX_ITEMS),
+    partial: bool = Query(
+        default=False, description="create the valid tasks even if some items fail"
+    ),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """POST endpoint to create many tasks in one transaction
+
+    Args:
+        tasks (list[TaskBulkCreate]): tasks to create, each with the id of its person
+        partial (bool): create the valid items and report the others,
+            instead of rejecting the whole batch
+
+    Returns:
+        BulkCreateResult: number of tasks created and errors per item
+    """
+    return await async_task_service.create_new_tasks_bulk(tasks=tasks, partial=partial, db=db)
+
+
+@router.get("/tasks", response_model=Page[Task])
+async def get_all_tasks(
+    *,
+    db: AsyncSession = Depends(get_async_read_db),
+    filters: TaskFilter = Depends(),
+    cursor: int | None = Query(default=None, description="next_cursor of the previous page"),
+    limit: int = Query(default=DEFAULT_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT),
+    fields: str | None = Query(
+        default=None, description="comma separated fields to return, e.g. id,name"
+    ),
+):
+    """GET endpoint to get tasks, one page at a time
+
+    Args:
+        filters (TaskFilter): person_id, completed, start_from/start_to and end_from/end_to
+        cursor (int): next_cursor of the previous page, None for the first page
+        limit (int): maximum number of tasks in the page
+        fields (str): only read and return these fields
+
+    Returns:
+        Page[Task]: a page of the matching tasks ordered by id
+    """
+    selected = parse_fields(fields, Task)
+    page = await async_task_service.get_all_tasks(
+        db=db, cursor=cursor, limit=limit, filters=filters, fields=selected
+    )
+    if selected is None:
+        return fast_response(page, Page[Task])
+    return sparse_response(page, Page[sparse_model(Task, selected)])
+
+
+# declared before /tasks/{task_id} so "search" is not taken for an id
+@router.get("/tasks/search", response_model=Page[Task])
+async def search_tasks(
+    *,
+    db: AsyncSession = Depends(get_async_read_db),
+    q: str = Query(
+        min_length=1, max_length=100, description="keywords to find in name or description"
+    ),
+    cursor: int | None = Query(default=None, ge=0, description="next_cursor of the previous page"),
+    limit: int = Query(default=DEFAULT_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT)
+):
+    """GET endpoint to search tasks by keywords, one page at a time
+
+    Args:
+        q (str): keywords to find in the name or description
+        cursor (int): next_cursor of the previous page, None for the first page
+        limit (int): maximum number of tasks in the page
+
+    Returns:
+        Page[Task]: a page of the matching tasks, most relevant first
+    """
+    page = await async_task_service.search_tasks(db=db, q=q, cursor=cursor, limit=limit)
+    return fast_response(page, Page[Task])
+
+
+# declared before /tasks/{task_id} so "stats" is not taken for an id
+@router.get("/tasks/stats", response_model=TaskStats)
+async def get_task_stats(
+    *,
+    db: AsyncSession = Depends(get_async_read_db),
+    filters: TaskFilter = Depends(),
+    bucket: StatsBucket = Query(
+        default=StatsBucket.month, description="width of the histogram buckets"
+    ),
+    overdue_before: date | None = Query(
+        default=None, description="open tasks started before this date are overdue, default today"
+    ),
+):
+    """GET endpoint for task statistics, computed by the database
+
+    Args:
+        filters (TaskFilter): person_id, completed, start_from/start_to and end_from/end_to
+        bucket (StatsBucket): day, month or year buckets for the histograms
+        overdue_before (date): open tasks started before this date are overdue
+
+    Returns:
+        TaskStats: counts by completion state, overdue count and date histograms
+    """
+    return await async_task_service.get_task_stats(
+        db=db, filters=filters, bucket=bucket, overdue_before=overdue_before
+    )
+
+
+# declared before /tasks/{task_id} so "export" is not taken for an id
+@router.get("/tasks/export", response_class=StreamingResponse)
+async def export_tasks(
+    *,
+    db: AsyncSession = Depends(get_async_read_db),
+    filters: TaskFilter = Depends(),
+    export_format: ExportFormat = Query(default=ExportFormat.ndjson, alias="format"),
+):
+    """GET endpoint to download the tasks as NDJSON or CSV,
+    rows are streamed in batches as they are read from the database
+
+    Args:
+        filters (TaskFilter): person_id, completed, start_from/start_to and end_from/end_to
+        export_format (ExportFormat): ndjson or csv
+
+    Returns:
+        StreamingResponse: the matching tasks ordered by id
+    """
+    return StreamingResponse(
+        async_task_service.export_tasks(db=db, export_format=export_format, filters=filters),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers=export_headers("tasks", export_format),
+    )
+
+
+@router.get("/tasks/{task_id}", response_model=Task)
+async def get_task_by_id(
+    *,
+    task_id: int = Path(description="id of the task to get"),
+    db: AsyncSession = Depends(get_async_read_db),
+    fields: str | None = Query(
+        default=None, description="comma separated fields to return, e.g. id,name"
+    ),
+    if_none_match: str | None = Header(
+        default=None, description="ETag of the copy the client has"
+    ),
+    response: Response,
+):
+    """GET endpoint to get task by id, answers 304 without reading the task
+    when If-None-Match has its current ETag, a cached task is served without a query
+
+    Args:
+        task_id (int): id of task
+        fields (str): only read and return these fields
+        if_none_match (str): ETags of the copies the client has
+
+    Returns:
+        Task: task with the id specified
+    """
+    selected = parse_fields(fields, Task)
+    etag, db_task = await async_task_service.get_task_by_id(
+        db=db, task_id=task_id, fields=selected, if_none_match=if_none_match
+    )
+    if db_task is None:
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+
+    if selected is None:
+        return fast_response(db_task, Task, headers={"ETag": etag})
+    return sparse_response(db_task, sparse_model(Task, selected), headers={"ETag": etag})
+
+
+@router.put("/tasks/{task_id}", response_model=Task)
+async def update_task_by_id(
+    *,
+    task_id: int = Path(description="id of the task to update"),
+    task_update: TaskBase,
+    if_match: str | None = Header(
+        default=None, description="only update the task if it still has this ETag"
+    ),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """PUT endpoint to update task
+
+    Args:
+        task_id (int): id of task
+        task_update (TaskBase): TaskBase for update
+        if_match (str): ETags the task must have, else 412 is returned
+
+    Returns:
+        Task: updated task
+    """
+    return await async_task_service.update_task_by_id(
+        db=db, task_id=task_id, task_update=task_update, if_match=if_match
+    )
+
+
+@router.patch("/tasks/{task_id}", response_model=Task)
+async def patch_task_by_id(
+    *,
+    task_id: int = Path(description="id of the task to update"),
+    task_patch: TaskPatch,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """PATCH endpoint to update the fields sent of a task,
+    nothing is written or published if they already have these values
+
+    Args:
+        task_id (int): id of task
+        task_patch (TaskPatch): fields to change
+
+    Returns:
+        Task: updated task
+    """
+    return await async_task_service.patch_task_by_id(
+        db=db, task_id=task_id, task_patch=task_patch
+    )
+
+
+@router.delete("/tasks/{task_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_task_by_id(
+    task_id: int,
+    if_match: str | None = Header(
+        default=None, description="only delete the task if it still has this ETag"
+    ),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """DELETE endpoint to delete task
+
+    Args:
+        task_id (int): id of task to delete
+        if_match (str): ETags the task must have, else 412 is returned
+    """
+    return await async_task_service.delete_task_by_id(db=db, task_id=task_id, if_match=if_match)
@@ -0,0 +1,146 @@
+"""
+Outbox of the notifications, written in the transaction of the change they announce
+"""
+# pylint: disable=invalid-name
+import os
+import threading
+from datetime import datetime
+from typing import Union
+from dotenv import load_dotenv
+from sqlalchemy import Row, delete, event, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from ..db.models import OutboxMessage
+from ..rabbitmq.background_publisher import notification_publisher
+
+load_dotenv()
+
+# Write the notifications to the outbox table for the relay, else they are handed
+# to the background publisher once the transaction commits
+NOTIFICATION_OUTBOX = os.getenv("NOTIFICATION_OUTBOX", "true").lower() in ("1", "true", "yes")
+
+# key of the session info holding the notifications of the current transaction
+PENDING_NOTIFICATIONS = "pending_notifications"
+
+# set whenever a transaction with outbox rows commits, wakes the relay up
+outbox_written = threading.Event()
+
+
+def add_notification(db: Union[Session, AsyncSession], message: str) -> None:
+    """adds a notification to the transaction of the session, it is only
+    published if the transaction commits
+
+    Args:
+        db (Session | AsyncSession): session of the change the notification announces
+        message (str): the notification
+    """
+    if NOTIFICATION_OUTBOX:
+        db.add(OutboxMessage(message=message))
+    db.info.setdefault(PENDING_NOTIFICATIONS, []).append(message)
+
+
+@event.listens_for(Session, "after_commit")
+def release_notifications(session: Session) -> None:
+    """wakes the relay, or publishes the notifications when there is no outbox,
+    the sync sessions of the async sessions commit through here too
+    """
+    messages = session.info.pop(PENDING_NOTIFICATIONS, None)
+    if not messages:
+        return
+    if NOTIFICATION_OUTBOX:
+        outbox_written.set()
+        return
+    for message in messages:
+        notification_publisher.publish(message=message)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_notifications(session: Session) -> None:
+    session.info.pop(PENDING_NOTIFICATIONS, None)
+
+
+class OutboxDAO:
+    def claim_unsent(
+        self, db: Session, limit: int, claimed_at: datetime, expired_before: datetime
+    ) -> list[Row]:
+        """claim the oldest unsent notifications that are not claimed, or whose claim
+        expired, and commit, the rows are only locked until then and rows locked
+        by another relay are skipped
+
+        Args:
+            db (Session): local db session
+            limit (int): maximum number of rows
+            claimed_at (datetime): time of the claim
+            expired_before (datetime): claims made earlier have expired
+
+        Returns:
+            list[Row]: id and message of the claimed rows in id order
+        """
+        result = db.execute(
+            select(OutboxMessage.id, OutboxMessage.message)
+            .where(
+                OutboxMessage.sent_at.is_(None),
+                or_(
+                    OutboxMessage.claimed_at.is_(None),
+                    OutboxMessage.claimed_at < expired_before,
+                ),
+            )
+            .order_by(OutboxMessage.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        rows = list(result.all())
+        if rows:
+            db.execute(
+                update(OutboxMessage)
+                .where(OutboxMessage.id.in_([row.id for row in rows]))
+                .values(claimed_at=claimed_at)
+            )
+        db.commit()
+        return rows
+
+    def release_claims(self, db: Session, ids: list[int]) -> None:
+        """release the claim of notifications that could not be published and commit,
+        the next relay to run claims them again
+
+        Args:
+            db (Session): local db session
+            ids (list[int]): ids of the claimed rows
+        """
+        db.execute(
+            update(OutboxMessage)
+            .where(OutboxMessage.id.in_(ids), OutboxMessage.sent_at.is_(None))
+            .values(claimed_at=None)
+        )
+        db.commit()
+
+    def mark_sent(self, db: Session, ids: list[int], sent_at: datetime) -> None:
+        """mark notifications as sent and commit
+
+        Args:
+            db (Session): local db session
+            ids (list[int]): ids of the published rows
+            sent_at (datetime): time they were published
+        """
+        db.execute(
+            update(OutboxMessage).where(OutboxMessage.id.in_(ids)).values(sent_at=sent_at)
+        )
+        db.commit()
+
+    def delete_sent(self, db: Session, before: datetime) -> int:
+        """delete the notifications sent before a time
+
+        Args:
+            db (Session): local db session
+            before (datetime): rows sent earlier are deleted
+
+        Returns:
+            int: number of rows deleted
+        """
+        result = db.execute(delete(OutboxMessage).where(OutboxMessage.sent_at < before))
+        db.commit()
+        return result.rowcount
+
+
+outbox_dao: OutboxDAO = OutboxDAO()
@@ -1,9 +1,83 @@
-from typing import Optional
+from typing import AsyncIterator, Iterator, Optional, Sequence
 from fastapi import Depends
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, delete, false, func, insert, or_, select, true, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 
-from ..schemas.persons import PersonCreate, PersonBase
-from ..db.models import Person
+from ..schemas.persons import PersonCreate, PersonBase, PersonBulkCreate
+from ..schemas.bulk import BULK_CHUNK_SIZE
+from ..schemas.export import EXPORT_BATCH_SIZE
+from ..schemas.notifications import (
+    person_created, person_deleted, person_updated, persons_bulk_created
+)
+from ..db.models import Person, Task
+from .outbox_dao import add_notification
+
+# columns of an exported person, in the order they are written, tasks are exported separately,
+# the row version is sent as the ETag rather than in the body
+PERSON_EXPORT_COLUMNS = [
+    column.key for column in Person.__table__.columns if column.key != "version"
+]
+
+
+def person_columns(fields: Optional[frozenset[str]]) -> list:
+    """columns to select for persons without their tasks, restricted to a sparse
+    fieldset if one is given, the id is always read for the page cursor
+    """
+    return [
+        getattr(Person, key)
+        for key in PERSON_EXPORT_COLUMNS
+        if fields is None or key == "id" or key in fields
+    ]
+
+
+def person_version_columns() -> list:
+    """version of a person as it is served with its tasks: the version of the row,
+    and the count, summed versions and highest id of its tasks, so creating,
+    updating or deleting one of the tasks gives the person a new version
+    """
+    person_tasks = Task.assigned_person_id == Person.id
+    return [
+        Person.version,
+        select(func.count(Task.id)).where(person_tasks).scalar_subquery().label("task_count"),
+        select(func.coalesce(func.sum(Task.version), 0))
+        .where(person_tasks).scalar_subquery().label("task_version_sum"),
+        select(func.coalesce(func.max(Task.id), 0))
+        .where(person_tasks).scalar_subquery().label("task_max_id"),
+    ]
+
+
+def person_version(person) -> tuple:
+    """version of a person read by get_person_by_id, the one person_version_columns
+    selects: computed from the loaded tasks, or read from the version columns
+    selected along with a row without tasks
+    """
+    if isinstance(person, Person):
+        return (
+            person.version,
+            len(person.tasks),
+            sum(task.version for task in person.tasks),
+            max((task.id for task in person.tasks), default=0),
+        )
+    return person.version, person.task_count, person.task_version_sum, person.task_max_id
+
+
+def person_version_clause(versions: Optional[list[tuple]]):
+    """WHERE clause of a conditional write, true if the person has one of the versions
+
+    Args:
+        versions (list[tuple]): versions of the If-Match header, None for any version
+    """
+    if versions is None:
+        return true()
+    columns = person_version_columns()
+    matches = [
+        and_(*(column == part for column, part in zip(columns, version)))
+        for version in versions
+        if len(version) == len(columns)
+    ]
+    return or_(*matches) if matches else false()
 
 
 class PersonDAO:
@@ -16,15 +90,81 @@ class PersonDAO:
 
         Returns:
             Person: newly created person
+
+        Raises:
+            IntegrityError: a person with this name already exists
         """
-        db_person: Person = Person(**person.model_dump())
+        # a new person has no tasks, setting the collection saves a lazy load,
+        # and sessions do not expire on commit so no refresh is needed
+        db_person: Person = Person(**person.model_dump(), tasks=[])
 
         db.add(db_person)
-        db.commit()
-        db.refresh(db_person)
+        add_notification(db, person_created(db_person.name))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            raise
 
         return db_person
 
+    def create_new_persons_bulk(self, persons: list[PersonBulkCreate], db: Session) -> int:
+        """create persons with one multi-row INSERT per chunk, in a single transaction
+
+        Args:
+            db (Session): local db session
+            persons (list[schemas.PersonBulkCreate]): persons to create
+
+        Returns:
+            int: number of persons created
+
+        Raises:
+            IntegrityError: a person with one of the names already exists
+        """
+        rows = [person.model_dump() for person in persons]
+        try:
+            for offset in range(0, len(rows), BULK_CHUNK_SIZE):
+                db.execute(insert(Person).values(rows[offset:offset + BULK_CHUNK_SIZE]))
+            add_notification(db, persons_bulk_created(len(rows)))
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            raise
+
+        return len(rows)
+
+    def get_existing_names(self, names: list[str], db: Session) -> set[str]:
+        """get which of the names are already registered
+
+        Args:
+            db (Session): local db session
+            names (list[str]): names to look up
+
+        Returns:
+            set[str]: names that exist
+        """
+        existing = set()
+        for offset in range(0, len(names), BULK_CHUNK_SIZE):
+            chunk = names[offset:offset + BULK_CHUNK_SIZE]
+            existing.update(db.scalars(select(Person.name).where(Person.name.in_(chunk))))
+        return existing
+
+    def get_existing_ids(self, person_ids: list[int], db: Session) -> set[int]:
+        """get which of the person ids exist
+
+        Args:
+            db (Session): local db session
+            person_ids (list[int]): ids to look up
+
+        Returns:
+            set[int]: ids that exist
+        """
+        existing = set()
+        for offset in range(0, len(person_ids), BULK_CHUNK_SIZE):
+            chunk = person_ids[offset:offset + BULK_CHUNK_SIZE]
+            existing.update(db.scalars(select(Person.id).where(Person.id.in_(chunk))))
+        return existing
+
     def get_person_by_name(self, name: str, db: Session) -> Person:
         """get person by name
 
@@ -39,73 +179,423 @@ class PersonDAO:
 
         return db_person
 
-    def get_all_persons(self, db: Session) -> list[Person]:
-        """get all persons
+    def get_all_persons(
+        self,
+        db: Session,
+        cursor: Optional[int],
+        limit: int,
+        include_tasks: bool = True,
+        fields: Optional[frozenset[str]] = None,
+    ) -> list[Person]:
+        """get one page of persons ordered by id, as a range scan on the primary key
 
         Args:
             db (Session): local db session
+            cursor (int): id after which the page starts, None for the first page
+            limit (int): maximum number of persons to return
+            include_tasks (bool): load the tasks of the page in one extra query,
+                else only the person columns are selected
+            fields (frozenset[str]): person columns to select when the tasks are not loaded
 
         Returns:
-            list[Person]: list of all people
+            list[Person]: list of people, rows without tasks if include_tasks is False
         """
-        persons: list[Person] = db.query(Person).all()
+        if include_tasks:
+            query = db.query(Person).options(selectinload(Person.tasks))
+        else:
+            query = db.query(*person_columns(fields))
+        if cursor is not None:
+            query = query.filter(Person.id > cursor)
+        persons: list[Person] = query.order_by(Person.id).limit(limit).all()
         return persons
 
-    def get_person_by_id(self, person_id: int, db: Session) -> Person:
+    def stream_persons(self, db: Session) -> Iterator[Sequence]:
+        """stream the columns of every person ordered by id from a server-side cursor,
+        only one batch of rows is held in memory at a time
+
+        Args:
+            db (Session): local db session
+
+        Yields:
+            Sequence: batches of rows with the PERSON_EXPORT_COLUMNS
+        """
+        result = db.execute(
+            select(*(getattr(Person, key) for key in PERSON_EXPORT_COLUMNS))
+            .order_by(Person.id)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        yield from result.partitions()
+
+    def get_person_version(self, person_id: int, db: Session) -> Optional[tuple]:
+        """read only the version of a person, neither the person nor its tasks are loaded
+
+        Args:
+            db (Session): local db session
+            person_id (int): id of person
+
+        Returns:
+            tuple: version of the person, None if no person has the id
+        """
+        result = db.execute(
+            select(*person_version_columns()).where(Person.id == person_id)
+        )
+        row = result.first()
+        return None if row is None else tuple(row)
+
+    def get_person_by_id(
+        self,
+        person_id: int,
+        db: Session,
+        include_tasks: bool = True,
+        fields: Optional[frozenset[str]] = None,
+    ) -> Person:
         """get person by id
 
         Args:
             db (Session): local db session
             person_id (int): id of person to get
+            include_tasks (bool): load the tasks of the person,
+                else only the person columns are selected
+            fields (frozenset[str]): person columns to select when the tasks are not loaded
 
         Returns:
-            Person: queried person
+            Person: queried person, a row without tasks but with the version columns
+                if include_tasks is False
         """
-        db_person = db.query(Person).filter(Person.id == person_id).first()
+        if include_tasks:
+            query = db.query(Person).options(selectinload(Person.tasks))
+        else:
+            query = db.query(*person_columns(fields), *person_version_columns())
+        db_person = query.filter(Person.id == person_id).first()
         return db_person
 
     def update_person_by_id(
-        self, person_id: int, person_update: PersonBase, db: Session
-    ) -> Optional[Person]:
-        """update person by id
+        self,
+        person_id: int,
+        person_update: PersonBase,
+        db: Session,
+        versions: Optional[list[tuple]] = None,
+    ) -> Optional[dict]:
+        """update person by id with a single UPDATE statement that raises its version,
+        only its tasks are read back once the update is committed
 
         Args:
             db (Session): local db session
             person_id (int): id of person to update
             person_update (schemas.PersonBase): new details of person
+            versions (list[tuple]): only update the person if it has one of these versions
 
         Returns:
-            Person: person with updated details
+            dict: the updated values of the person with its id and tasks,
+                None if no person has the id or it has another version
+
+        Raises:
+            IntegrityError: another person already has the new name
         """
-        existing_person = db.query(Person).filter(Person.id == person_id).first()
+        values = person_update.model_dump()
+        try:
+            result = db.execute(
+                update(Person)
+                .where(Person.id == person_id, person_version_clause(versions))
+                .values(**values, version=Person.version + 1)
+            )
+            if result.rowcount:
+                add_notification(db, person_updated(values["name"]))
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            raise
 
-        if existing_person is None:
+        # rowcount counts matched rows, the MySQL dialects connect with FOUND_ROWS
+        if result.rowcount == 0:
             return None
+        # the person is known from the update, only its tasks are selected
+        tasks = db.scalars(select(Task).where(Task.assigned_person_id == person_id)).all()
+        return {"id": person_id, **values, "tasks": tasks}
 
-        for attr, value in person_update.model_dump().items():
-            setattr(existing_person, attr, value)
+    def delete_person_by_id(
+        self, person_id: int, db: Session, versions: Optional[list[tuple]] = None
+    ) -> bool:
+        """delete person by id with a single DELETE statement,
+        the database deletes the tasks through the foreign key's ON DELETE CASCADE
 
+        Args:
+            db (Session): local db session
+            person_id (int): id of person to delete
+            versions (list[tuple]): only delete the person if it has one of these versions
+
+        Returns:
+            boolean: True if delete success, else False
+        """
+        result = db.execute(
+            delete(Person).where(Person.id == person_id, person_version_clause(versions))
+        )
+        if result.rowcount:
+            add_notification(db, person_deleted(person_id))
         db.commit()
-        db.refresh(existing_person)
-        return existing_person
+        return result.rowcount > 0
+
 
-    def delete_person_by_id(self, person_id: int, db: Session) -> bool:
-        """delete person by id
+class AsyncPersonDAO:
+    """PersonDAO for async sessions, tasks are loaded eagerly
+    since lazy loads are not possible outside of the session's greenlet
+    """
+    async def create_new_person(self, person: PersonCreate, db: AsyncSession) -> Person:
+        """create new person
 
         Args:
-            db (Session): local db session
+            db (AsyncSession): local async db session
+            person (schemas.PersonCreate): model for creating person
+
+        Returns:
+            Person: newly created person
+
+        Raises:
+            IntegrityError: a person with this name already exists
+        """
+        db_person: Person = Person(**person.model_dump(), tasks=[])
+
+        db.add(db_person)
+        add_notification(db, person_created(db_person.name))
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            raise
+
+        return db_person
+
+    async def create_new_persons_bulk(self, persons: list[PersonBulkCreate], db: AsyncSession) -> int:
+        """create persons with one multi-row INSERT per chunk, in a single transaction
+
+        Args:
+            db (AsyncSession): local async db session
+            persons (list[schemas.PersonBulkCreate]): persons to create
+
+        Returns:
+            int: number of persons created
+
+        Raises:
+            IntegrityError: a person with one of the names already exists
+        """
+        rows = [person.model_dump() for person in persons]
+        try:
+            for offset in range(0, len(rows), BULK_CHUNK_SIZE):
+                await db.execute(insert(Person).values(rows[offset:offset + BULK_CHUNK_SIZE]))
+            add_notification(db, persons_bulk_created(len(rows)))
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            raise
+
+        return len(rows)
+
+    async def get_existing_names(self, names: list[str], db: AsyncSession) -> set[str]:
+        """get which of the names are already registered
+
+        Args:
+            db (AsyncSession): local async db session
+            names (list[str]): names to look up
+
+        Returns:
+            set[str]: names that exist
+        """
+        existing = set()
+        for offset in range(0, len(names), BULK_CHUNK_SIZE):
+            chunk = names[offset:offset + BULK_CHUNK_SIZE]
+            existing.update(await db.scalars(select(Person.name).where(Person.name.in_(chunk))))
+        return existing
+
+    async def get_existing_ids(self, person_ids: list[int], db: AsyncSession) -> set[int]:
+        """get which of the person ids exist
+
+        Args:
+            db (AsyncSession): local async db session
+            person_ids (list[int]): ids to look up
+
+        Returns:
+            set[int]: ids that exist
+        """
+        existing = set()
+        for offset in range(0, len(person_ids), BULK_CHUNK_SIZE):
+            chunk = person_ids[offset:offset + BULK_CHUNK_SIZE]
+            existing.update(await db.scalars(select(Person.id).where(Person.id.in_(chunk))))
+        return existing
+
+    async def get_person_by_name(self, name: str, db: AsyncSession) -> Person:
+        """get person by name
+
+        Args:
+            db (AsyncSession): local async db session
+            name (str): name of person to get
+
+        Returns:
+            Person: queried person
+        """
+        result = await db.scalars(
+            select(Person).options(selectinload(Person.tasks)).where(Person.name == name)
+        )
+        return result.first()
+
+    async def get_all_persons(
+        self,
+        db: AsyncSession,
+        cursor: Optional[int],
+        limit: int,
+        include_tasks: bool = True,
+        fields: Optional[frozenset[str]] = None,
+    ) -> list[Person]:
+        """get one page of persons ordered by id, as a range scan on the primary key
+
+        Args:
+            db (AsyncSession): local async db session
+            cursor (int): id after which the page starts, None for the first page
+            limit (int): maximum number of persons to return
+            include_tasks (bool): load the tasks of the page in one extra query,
+                else only the person columns are selected
+            fields (frozenset[str]): person columns to select when the tasks are not loaded
+
+        Returns:
+            list[Person]: list of people, rows without tasks if include_tasks is False
+        """
+        if include_tasks:
+            query = select(Person).options(selectinload(Person.tasks))
+        else:
+            query = select(*person_columns(fields))
+        if cursor is not None:
+            query = query.where(Person.id > cursor)
+        result = await db.execute(query.order_by(Person.id).limit(limit))
+        return list(result.scalars().all() if include_tasks else result.all())
+
+    async def stream_persons(self, db: AsyncSession) -> AsyncIterator[Sequence]:
+        """stream the columns of every person ordered by id from a server-side cursor,
+        only one batch of rows is held in memory at a time
+
+        Args:
+            db (AsyncSession): local async db session
+
+        Yields:
+            Sequence: batches of rows with the PERSON_EXPORT_COLUMNS
+        """
+        result = await db.stream(
+            select(*(getattr(Person, key) for key in PERSON_EXPORT_COLUMNS))
+            .order_by(Person.id)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        async for rows in result.partitions():
+            yield rows
+
+    async def get_person_version(self, person_id: int, db: AsyncSession) -> Optional[tuple]:
+        """read only the version of a person, neither the person nor its tasks are loaded
+
+        Args:
+            db (AsyncSession): local async db session
+            person_id (int): id of person
+
+        Returns:
+            tuple: version of the person, None if no person has the id
+        """
+        result = await db.execute(
+            select(*person_version_columns()).where(Person.id == person_id)
+        )
+        row = result.first()
+        return None if row is None else tuple(row)
+
+    async def get_person_by_id(
+        self,
+        person_id: int,
+        db: AsyncSession,
+        include_tasks: bool = True,
+        fields: Optional[frozenset[str]] = None,
+    ) -> Person:
+        """get person by id
+
+        Args:
+            db (AsyncSession): local async db session
+            person_id (int): id of person to get
+            include_tasks (bool): load the tasks of the person,
+                else only the person columns are selected
+            fields (frozenset[str]): person columns to select when the tasks are not loaded
+
+        Returns:
+            Person: queried person, a row without tasks but with the version columns
+                if include_tasks is False
+        """
+        if include_tasks:
+            query = select(Person).options(selectinload(Person.tasks))
+        else:
+            query = select(*person_columns(fields), *person_version_columns())
+        result = await db.execute(query.where(Person.id == person_id))
+        return result.scalars().first() if include_tasks else result.first()
+
+    async def update_person_by_id(
+        self,
+        person_id: int,
+        person_update: PersonBase,
+        db: AsyncSession,
+        versions: Optional[list[tuple]] = None,
+    ) -> Optional[dict]:
+        """update person by id with a single UPDATE statement that raises its version,
+        only its tasks are read back once the update is committed
+
+        Args:
+            db (AsyncSession): local async db session
+            person_id (int): id of person to update
+            person_update (schemas.PersonBase): new details of person
+            versions (list[tuple]): only update the person if it has one of these versions
+
+        Returns:
+            dict: the updated values of the person with its id and tasks,
+                None if no person has the id or it has another version
+
+        Raises:
+            IntegrityError: another person already has the new name
+        """
+        values = person_update.model_dump()
+        try:
+            result = await db.execute(
+                update(Person)
+                .where(Person.id == person_id, person_version_clause(versions))
+                .values(**values, version=Person.version + 1)
+            )
+            if result.rowcount:
+                add_notification(db, person_updated(values["name"]))
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            raise
+
+        if result.rowcount == 0:
+            return None
+        # the person is known from the update, only its tasks are selected
+        tasks = (
+            await db.scalars(select(Task).where(Task.assigned_person_id == person_id))
+        ).all()
+        return {"id": person_id, **values, "tasks": tasks}
+
+    async def delete_person_by_id(
+        self, person_id: int, db: AsyncSession, versions: Optional[list[tuple]] = None
+    ) -> bool:
+        """delete person by id with a single DELETE statement,
+        the database deletes the tasks through the foreign key's ON DELETE CASCADE
+
+        Args:
+            db (AsyncSession): local async db session
             person_id (int): id of person to delete
+            versions (list[tuple]): only delete the person if it has one of these versions
 
         Returns:
             boolean: True if delete success, else False
         """
-        existing_person = db.query(Person).filter(Person.id == person_id).first()
-        if existing_person:
-            db.delete(existing_person)
-            db.commit()
-            return True
-        return False
+        result = await db.execute(
+            delete(Person).where(Person.id == person_id, person_version_clause(versions))
+        )
+        if result.rowcount:
+            add_notification(db, person_deleted(person_id))
+        await db.commit()
+        return result.rowcount > 0
 
 
 # instantiate person_dao object here
 person_dao: PersonDAO = PersonDAO()
+async_person_dao: AsyncPersonDAO = AsyncPersonDAO()
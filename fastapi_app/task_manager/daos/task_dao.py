@@ -1,13 +1,255 @@
-from typing import Optional
+import re
+from datetime import date
+from typing import AsyncIterator, Callable, Iterator, Optional, Sequence
+from sqlalchemy import (
+    case, column, delete, false, func, insert, literal_column, select, table, true, update
+)
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from ..schemas.tasks import TaskCreate, TaskBase
+from ..schemas.tasks import TaskCreate, TaskBase, TaskBulkCreate, TaskFilter
+from ..schemas.bulk import BULK_CHUNK_SIZE
+from ..schemas.export import EXPORT_BATCH_SIZE
+from ..schemas.stats import StatsBucket
+from ..schemas.notifications import task_created, task_deleted, task_updated, tasks_bulk_created
 from ..db.models import Person, Task
+from .outbox_dao import add_notification
+
+# columns of an exported task, in the order they are written,
+# the row version is sent as the ETag rather than in the body
+TASK_EXPORT_COLUMNS = [
+    column.key for column in Task.__table__.columns if column.key != "version"
+]
+
+
+# foreign key of the assigned person, and the MySQL error of a child row without its parent
+PERSON_FOREIGN_KEY = "fk_tasks_assigned_person_id"
+MYSQL_NO_REFERENCED_ROW = 1452
+
+
+def is_missing_person_error(error: IntegrityError) -> bool:
+    """whether a task write failed because its assigned person does not exist,
+    other integrity errors are not about the person
+
+    MySQL names the violated constraint in the message of error 1452, SQLite only
+    reports that a foreign key failed, tasks have no other one
+    """
+    args = getattr(error.orig, "args", ())
+    message = str(args[-1]) if args else str(error.orig)
+    if args and args[0] == MYSQL_NO_REFERENCED_ROW:
+        return PERSON_FOREIGN_KEY in message
+    return message.startswith("FOREIGN KEY constraint failed")
+
+
+def task_columns(fields: frozenset[str]) -> list:
+    """columns to select for a sparse fieldset, the id is always read for the page cursor
+    """
+    return [
+        getattr(Task, key) for key in TASK_EXPORT_COLUMNS if key == "id" or key in fields
+    ]
+
+
+def task_filter_clauses(filters: TaskFilter) -> list:
+    """compiles the set filters into WHERE clauses on indexed columns
+
+    Args:
+        filters (schemas.TaskFilter): filters of the task list
+
+    Returns:
+        list: clauses to AND together
+    """
+    clauses = []
+    if filters.person_id is not None:
+        clauses.append(Task.assigned_person_id == filters.person_id)
+    if filters.completed is not None:
+        clauses.append(Task.completed == filters.completed)
+    if filters.start_from is not None:
+        clauses.append(Task.startdate >= filters.start_from)
+    if filters.start_to is not None:
+        clauses.append(Task.startdate <= filters.start_to)
+    if filters.end_from is not None:
+        clauses.append(Task.enddate >= filters.end_from)
+    if filters.end_to is not None:
+        clauses.append(Task.enddate <= filters.end_to)
+    return clauses
+
+
+def task_bulk_rows(tasks: list[TaskBulkCreate]) -> list[dict]:
+    """column values of the tasks for a multi-row INSERT
+    """
+    return [
+        {**task.model_dump(exclude={"person_id"}), "assigned_person_id": task.person_id}
+        for task in tasks
+    ]
+
+
+def task_version_clause(versions: Optional[list[tuple]]):
+    """WHERE clause of a conditional write, true if the task has one of the versions
+
+    Args:
+        versions (list[tuple]): versions of the If-Match header, None for any version
+    """
+    if versions is None:
+        return true()
+    return Task.version.in_([version[0] for version in versions if len(version) == 1])
+
+
+def task_update_statement(
+    task_id: int, values: dict, dialect, versions: Optional[list[tuple]] = None
+) -> tuple:
+    """a single UPDATE of the task that raises its version and also hands back its
+    assigned person id, which the response needs but the request body does not carry
+
+    Args:
+        task_id (int): id of task to update
+        values (dict): new column values
+        dialect (Dialect): dialect of the session's engine
+        versions (list[tuple]): only update the task if it has one of these versions
+
+    Returns:
+        tuple: the statement, and whether the id comes back as a RETURNING row
+    """
+    statement = update(Task).where(Task.id == task_id, task_version_clause(versions))
+    if dialect.update_returning:
+        return statement.values(
+            **values, version=Task.version + 1
+        ).returning(Task.assigned_person_id), True
+    # MySQL has no RETURNING, LAST_INSERT_ID(expr) keeps the column as it is
+    # and reports its value as the statement's lastrowid
+    return statement.values(
+        **values,
+        version=Task.version + 1,
+        assigned_person_id=func.last_insert_id(Task.assigned_person_id),
+    ), False
+
+
+def task_update_result(task_id: int, values: dict, result, returning: bool) -> Optional[dict]:
+    """column values of the updated task, None if no row has the id
+    """
+    if returning:
+        row = result.first()
+        if row is None:
+            return None
+        assigned_person_id = row.assigned_person_id
+    else:
+        # rowcount counts matched rows, the MySQL dialects connect with FOUND_ROWS
+        if result.rowcount == 0:
+            return None
+        assigned_person_id = result.lastrowid
+    return {"id": task_id, **values, "assigned_person_id": assigned_person_id}
+
+
+# first day of the bucket as YYYY-MM-DD, in the format strings DATE_FORMAT and strftime share
+BUCKET_FORMATS = {
+    StatsBucket.day: "%Y-%m-%d",
+    StatsBucket.month: "%Y-%m-01",
+    StatsBucket.year: "%Y-01-01",
+}
+
+
+def date_bucket(column, bucket: StatsBucket, dialect):
+    """SQL expression for the first day of the bucket holding the date in column
+    """
+    if dialect.name == "sqlite":
+        return func.strftime(BUCKET_FORMATS[bucket], column)
+    return func.date_format(column, BUCKET_FORMATS[bucket])
+
+
+def task_stats_statements(
+    filters: TaskFilter, bucket: StatsBucket, overdue_before: date, dialect
+) -> tuple:
+    """the GROUP BY queries of the task statistics, the counts by completion
+    are read from the (completed, startdate) index and the histograms from the
+    startdate and (completed, enddate) indexes
+
+    Returns:
+        tuple: counts per completion state, tasks per startdate bucket,
+            completed tasks per enddate bucket
+    """
+    clauses = task_filter_clauses(filters)
+    overdue = case((Task.startdate < overdue_before, 1), else_=0)
+    counts = (
+        select(Task.completed, func.count(), func.sum(overdue))
+        .where(*clauses)
+        .group_by(Task.completed)
+    )
+
+    started_bucket = date_bucket(Task.startdate, bucket, dialect)
+    started = (
+        select(started_bucket, func.count())
+        .where(*clauses)
+        .group_by(started_bucket)
+        .order_by(started_bucket)
+    )
+
+    finished_bucket = date_bucket(Task.enddate, bucket, dialect)
+    finished = (
+        select(finished_bucket, func.count())
+        .where(*clauses, Task.completed == true(), Task.enddate.is_not(None))
+        .group_by(finished_bucket)
+        .order_by(finished_bucket)
+    )
+    return counts, started, finished
+
+
+def build_task_stats(counts: Sequence, started: Sequence, finished: Sequence) -> dict:
+    """task statistics from the rows of the task_stats_statements
+    """
+    total = completed = overdue = 0
+    for is_completed, count, overdue_count in counts:
+        total += count
+        if is_completed:
+            completed += count
+        else:
+            overdue += overdue_count
+    return {
+        "total": total,
+        "completed": completed,
+        "open": total - completed,
+        "overdue": overdue,
+        "started": [{"start": start, "count": count} for start, count in started],
+        "finished": [{"start": start, "count": count} for start, count in finished],
+    }
+
+
+SEARCH_TERM = re.compile(r"\w+")
+
+
+def task_search_statement(q: str, dialect):
+    """SELECT of the tasks whose name or description match the keywords of q,
+    most relevant first, through the FULLTEXT index on MySQL and tasks_fts on SQLite
+
+    Args:
+        q (str): keywords
+        dialect (Dialect): dialect of the session's engine
+
+    Returns:
+        Select: the ranked query
+    """
+    if dialect.name == "sqlite":
+        terms = SEARCH_TERM.findall(q)
+        if not terms:
+            return select(Task).where(false())
+        # quoted so FTS5 does not read operators from the keywords
+        fts_query = " OR ".join(f'"{term}"' for term in terms)
+        tasks_fts = table("tasks_fts", column("rowid"), column("rank"))
+        return (
+            select(Task)
+            .join(tasks_fts, tasks_fts.c.rowid == Task.id)
+            .where(literal_column("tasks_fts").op("MATCH")(fts_query))
+            .order_by(tasks_fts.c.rank, Task.id)
+        )
+    relevance = match(Task.name, Task.description, against=q).in_natural_language_mode()
+    return select(Task).where(relevance).order_by(relevance.desc(), Task.id)
 
 
 class TaskDAO:
     def create_new_task(self, task: TaskCreate, person_id: int, db: Session) -> Task:
-        """create new task
+        """create new task with a single INSERT, the foreign key checks that the
+        person exists and the task is not read back, the id and the column
+        defaults are set on it by the flush
 
         Args:
             db (Session): local db session
@@ -16,80 +258,523 @@ class TaskDAO:
 
         Returns:
             Task: newly created task
+
+        Raises:
+            IntegrityError: no person has the id
         """
         db_task = Task(**task.model_dump(), assigned_person_id=person_id)
         db.add(db_task)
-        db.commit()
-        db.refresh(db_task)
+        add_notification(db, task_created(db_task.name, person_id))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            raise
         return db_task
 
-    def get_all_tasks(self, db: Session) -> list[Task]:
-        """get all tasks
+    def create_new_tasks_bulk(
+        self,
+        tasks: list[TaskBulkCreate],
+        db: Session,
+        notification: Callable[[int], str] = tasks_bulk_created,
+    ) -> int:
+        """create tasks with one multi-row INSERT per chunk, in a single transaction
+
+        Args:
+            db (Session): local db session
+            tasks (list[schemas.TaskBulkCreate]): tasks to create with their person ids
+            notification (Callable[[int], str]): message announcing the number of tasks created
+
+        Returns:
+            int: number of tasks created
+
+        Raises:
+            IntegrityError: an assigned person does not exist
+        """
+        rows = task_bulk_rows(tasks)
+        try:
+            for offset in range(0, len(rows), BULK_CHUNK_SIZE):
+                db.execute(insert(Task).values(rows[offset:offset + BULK_CHUNK_SIZE]))
+            add_notification(db, notification(len(rows)))
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            raise
+        return len(rows)
+
+    def get_all_tasks(
+        self,
+        db: Session,
+        cursor: Optional[int],
+        limit: int,
+        filters: Optional[TaskFilter] = None,
+        fields: Optional[frozenset[str]] = None,
+    ) -> list[Task]:
+        """get one page of tasks ordered by id, as a range scan on the primary key
 
         Args:
             db (Session): local db session
+            cursor (int): id after which the page starts, None for the first page
+            limit (int): maximum number of tasks to return
+            filters (schemas.TaskFilter): filters applied in the same WHERE clause
+            fields (frozenset[str]): only select these columns, None for whole tasks
 
         Returns:
-            list[Task]: list of all tasks
+            list[Task]: list of tasks, rows of the selected columns if fields is set
         """
-        tasks: list[Task] = db.query(Task).all()
+        query = db.query(Task) if fields is None else db.query(*task_columns(fields))
+        if filters is not None:
+            query = query.filter(*task_filter_clauses(filters))
+        if cursor is not None:
+            query = query.filter(Task.id > cursor)
+        tasks: list[Task] = query.order_by(Task.id).limit(limit).all()
         return tasks
 
-    def get_task_by_id(self, task_id: int, db: Session) -> Task:
+    def search_tasks(self, db: Session, q: str, offset: int, limit: int) -> list[Task]:
+        """search tasks by keywords in their name and description
+
+        Args:
+            db (Session): local db session
+            q (str): keywords
+            offset (int): number of results to skip
+            limit (int): maximum number of tasks to return
+
+        Returns:
+            list[Task]: matching tasks, most relevant first
+        """
+        statement = task_search_statement(q, db.get_bind().dialect)
+        return list(db.scalars(statement.offset(offset).limit(limit)))
+
+    def get_task_stats(
+        self, db: Session, filters: TaskFilter, bucket: StatsBucket, overdue_before: date
+    ) -> dict:
+        """count the tasks by completion state and date buckets with GROUP BY queries,
+        no task row is loaded
+
+        Args:
+            db (Session): local db session
+            filters (schemas.TaskFilter): tasks to count
+            bucket (StatsBucket): width of the histogram buckets
+            overdue_before (date): open tasks started before this date are overdue
+
+        Returns:
+            dict: counts and histograms of the tasks
+        """
+        statements = task_stats_statements(
+            filters, bucket, overdue_before, db.get_bind().dialect
+        )
+        return build_task_stats(*(db.execute(statement).all() for statement in statements))
+
+    def stream_tasks(
+        self, db: Session, filters: Optional[TaskFilter] = None
+    ) -> Iterator[Sequence]:
+        """stream the columns of every task ordered by id from a server-side cursor,
+        only one batch of rows is held in memory at a time
+
+        Args:
+            db (Session): local db session
+            filters (schemas.TaskFilter): filters applied in the WHERE clause
+
+        Yields:
+            Sequence: batches of rows with the TASK_EXPORT_COLUMNS
+        """
+        query = select(*(getattr(Task, key) for key in TASK_EXPORT_COLUMNS))
+        if filters is not None:
+            query = query.where(*task_filter_clauses(filters))
+        result = db.execute(
+            query.order_by(Task.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        yield from result.partitions()
+
+    def get_task_version(self, task_id: int, db: Session) -> Optional[tuple]:
+        """read only the version of a task, the task itself is not loaded
+
+        Args:
+            db (Session): local db session
+            task_id (int): id of task
+
+        Returns:
+            tuple: version of the task, None if no task has the id
+        """
+        result = db.execute(select(Task.version).where(Task.id == task_id))
+        row = result.first()
+        return None if row is None else tuple(row)
+
+    def get_task_by_id(
+        self, task_id: int, db: Session, fields: Optional[frozenset[str]] = None
+    ) -> Task:
         """get task by id
 
         Args:
             db (Session): local db session
             task_id (int): id of task to get
+            fields (frozenset[str]): only select these columns, None for the whole task
 
         Returns:
-            Task: queried task
+            Task: queried task, a row of the selected columns and the version if fields is set
         """
-        db_task = db.query(Task).filter(Task.id == task_id).first()
+        query = db.query(Task) if fields is None else db.query(*task_columns(fields), Task.version)
+        db_task = query.filter(Task.id == task_id).first()
         return db_task
 
     def update_task_by_id(
-        self, task_id: int, task_update: TaskBase, db: Session
-    ) -> Optional[Person]:
-        """update task based on task id
+        self,
+        task_id: int,
+        task_update: TaskBase,
+        db: Session,
+        versions: Optional[list[tuple]] = None,
+    ) -> Optional[dict]:
+        """update task based on task id with a single UPDATE statement,
+        the task is not read before or after the write
 
         Args:
             db (Session): local db session
-            task_id (int):
-            task_update (schemas.PersonBase): new task
+            task_id (int): id of task to update
+            task_update (schemas.TaskBase): new task
+            versions (list[tuple]): only update the task if it has one of these versions
 
         Returns:
-            Task: task with updated details
+            dict: column values of the updated task, None if no task has the id
+                or it has another version
         """
-        existing_task = db.query(Task).filter(Task.id == task_id).first()
+        values = task_update.model_dump()
+        statement, returning = task_update_statement(
+            task_id, values, db.get_bind().dialect, versions
+        )
+        result = db.execute(statement)
+        updated_task = task_update_result(task_id, values, result, returning)
+        if updated_task is not None:
+            add_notification(
+                db, task_updated(updated_task["name"], updated_task["assigned_person_id"])
+            )
+        db.commit()
+        return updated_task
 
-        if existing_task is None:
-            return None
+    def patch_task_by_id(
+        self, task_id: int, changes: dict, db: Session, version: Optional[int] = None
+    ) -> bool:
+        """write only the changed columns of a task and raise its version,
+        a task loaded in the session is updated along with the row
 
-        for attr, value in task_update.model_dump().items():
-            setattr(existing_task, attr, value)
+        Args:
+            db (Session): local db session
+            task_id (int): id of task to update
+            changes (dict): new value per changed column
+            version (int): only update the task if it still has the version the
+                changes were checked against, None for any version
 
+        Returns:
+            Boolean: True if the task was updated, False if no task has the id
+                or it has another version
+        """
+        statement = update(Task).where(Task.id == task_id)
+        if version is not None:
+            statement = statement.where(Task.version == version)
+        result = db.execute(statement.values(**changes, version=Task.version + 1))
+        if result.rowcount:
+            # the task is in the identity map when loaded, the UPDATE has synchronized it
+            db_task = db.get(Task, task_id)
+            add_notification(db, task_updated(db_task.name, db_task.assigned_person_id))
         db.commit()
-        db.refresh(existing_task)
-        return existing_task
+        return result.rowcount > 0
 
-    def delete_task_by_id(self, task_id: int, db: Session) -> bool:
-        """delete task by id
+    def delete_task_by_id(
+        self, task_id: int, db: Session, versions: Optional[list[tuple]] = None
+    ) -> Optional[Task]:
+        """delete task by id, with If-Match versions the DELETE only matches the
+        version that was read so a task updated in between is kept
 
         Args:
             db (Session): local db session
             task_id (int): id of task to delete
+            versions (list[tuple]): only delete the task if it has one of these versions
 
         Returns:
-            Boolean: True if task deleted successfully, else false
+            Task: the deleted task, None if no task has the id or it has another version
         """
-        existing_task = db.query(Task).filter(Task.id == task_id).first()
-        if existing_task:
-            db.delete(existing_task)
-            db.commit()
-            return True
-        return False
+        existing_task = (
+            db.query(Task).filter(Task.id == task_id, task_version_clause(versions)).first()
+        )
+        if existing_task is None:
+            return None
+        statement = delete(Task).where(Task.id == task_id)
+        if versions is not None:
+            statement = statement.where(Task.version == existing_task.version)
+        result = db.execute(statement)
+        if result.rowcount:
+            add_notification(db, task_deleted(task_id))
+        db.commit()
+        return existing_task if result.rowcount > 0 else None
+
+
+class AsyncTaskDAO:
+    """TaskDAO for async sessions
+    """
+    async def create_new_task(self, task: TaskCreate, person_id: int, db: AsyncSession) -> Task:
+        """create new task with a single INSERT, the foreign key checks that the
+        person exists and the task is not read back, the id and the column
+        defaults are set on it by the flush
+
+        Args:
+            db (AsyncSession): local async db session
+            task (schemas.TaskCreate): task to create
+            person_id (int): id of assigned person
+
+        Returns:
+            Task: newly created task
+
+        Raises:
+            IntegrityError: no person has the id
+        """
+        db_task = Task(**task.model_dump(), assigned_person_id=person_id)
+        db.add(db_task)
+        add_notification(db, task_created(db_task.name, person_id))
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            raise
+        return db_task
+
+    async def create_new_tasks_bulk(
+        self,
+        tasks: list[TaskBulkCreate],
+        db: AsyncSession,
+        notification: Callable[[int], str] = tasks_bulk_created,
+    ) -> int:
+        """create tasks with one multi-row INSERT per chunk, in a single transaction
+
+        Args:
+            db (AsyncSession): local async db session
+            tasks (list[schemas.TaskBulkCreate]): tasks to create with their person ids
+            notification (Callable[[int], str]): message announcing the number of tasks created
+
+        Returns:
+            int: number of tasks created
+
+        Raises:
+            IntegrityError: an assigned person does not exist
+        """
+        rows = task_bulk_rows(tasks)
+        try:
+            for offset in range(0, len(rows), BULK_CHUNK_SIZE):
+                await db.execute(insert(Task).values(rows[offset:offset + BULK_CHUNK_SIZE]))
+            add_notification(db, notification(len(rows)))
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            raise
+        return len(rows)
+
+    async def get_all_tasks(
+        self,
+        db: AsyncSession,
+        cursor: Optional[int],
+        limit: int,
+        filters: Optional[TaskFilter] = None,
+        fields: Optional[frozenset[str]] = None,
+    ) -> list[Task]:
+        """get one page of tasks ordered by id, as a range scan on the primary key
+
+        Args:
+            db (AsyncSession): local async db session
+            cursor (int): id after which the page starts, None for the first page
+            limit (int): maximum number of tasks to return
+            filters (schemas.TaskFilter): filters applied in the same WHERE clause
+            fields (frozenset[str]): only select these columns, None for whole tasks
+
+        Returns:
+            list[Task]: list of tasks, rows of the selected columns if fields is set
+        """
+        query = select(Task) if fields is None else select(*task_columns(fields))
+        if filters is not None:
+            query = query.where(*task_filter_clauses(filters))
+        if cursor is not None:
+            query = query.where(Task.id > cursor)
+        result = await db.execute(query.order_by(Task.id).limit(limit))
+        return list(result.scalars().all() if fields is None else result.all())
+
+    async def search_tasks(self, db: AsyncSession, q: str, offset: int, limit: int) -> list[Task]:
+        """search tasks by keywords in their name and description
+
+        Args:
+            db (AsyncSession): local async db session
+            q (str): keywords
+            offset (int): number of results to skip
+            limit (int): maximum number of tasks to return
+
+        Returns:
+            list[Task]: matching tasks, most relevant first
+        """
+        statement = task_search_statement(q, db.get_bind().dialect)
+        result = await db.scalars(statement.offset(offset).limit(limit))
+        return list(result.all())
+
+    async def get_task_stats(
+        self, db: AsyncSession, filters: TaskFilter, bucket: StatsBucket, overdue_before: date
+    ) -> dict:
+        """count the tasks by completion state and date buckets with GROUP BY queries,
+        no task row is loaded
+
+        Args:
+            db (AsyncSession): local async db session
+            filters (schemas.TaskFilter): tasks to count
+            bucket (StatsBucket): width of the histogram buckets
+            overdue_before (date): open tasks started before this date are overdue
+
+        Returns:
+            dict: counts and histograms of the tasks
+        """
+        statements = task_stats_statements(
+            filters, bucket, overdue_before, db.get_bind().dialect
+        )
+        rows = [(await db.execute(statement)).all() for statement in statements]
+        return build_task_stats(*rows)
+
+    async def stream_tasks(
+        self, db: AsyncSession, filters: Optional[TaskFilter] = None
+    ) -> AsyncIterator[Sequence]:
+        """stream the columns of every task ordered by id from a server-side cursor,
+        only one batch of rows is held in memory at a time
+
+        Args:
+            db (AsyncSession): local async db session
+            filters (schemas.TaskFilter): filters applied in the WHERE clause
+
+        Yields:
+            Sequence: batches of rows with the TASK_EXPORT_COLUMNS
+        """
+        query = select(*(getattr(Task, key) for key in TASK_EXPORT_COLUMNS))
+        if filters is not None:
+            query = query.where(*task_filter_clauses(filters))
+        result = await db.stream(
+            query.order_by(Task.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        async for rows in result.partitions():
+            yield rows
+
+    async def get_task_version(self, task_id: int, db: AsyncSession) -> Optional[tuple]:
+        """read only the version of a task, the task itself is not loaded
+
+        Args:
+            db (AsyncSession): local async db session
+            task_id (int): id of task
+
+        Returns:
+            tuple: version of the task, None if no task has the id
+        """
+        result = await db.execute(select(Task.version).where(Task.id == task_id))
+        row = result.first()
+        return None if row is None else tuple(row)
+
+    async def get_task_by_id(
+        self, task_id: int, db: AsyncSession, fields: Optional[frozenset[str]] = None
+    ) -> Task:
+        """get task by id
+
+        Args:
+            db (AsyncSession): local async db session
+            task_id (int): id of task to get
+            fields (frozenset[str]): only select these columns, None for the whole task
+
+        Returns:
+            Task: queried task, a row of the selected columns and the version if fields is set
+        """
+        query = select(Task) if fields is None else select(*task_columns(fields), Task.version)
+        result = await db.execute(query.where(Task.id == task_id))
+        return result.scalars().first() if fields is None else result.first()
+
+    async def update_task_by_id(
+        self,
+        task_id: int,
+        task_update: TaskBase,
+        db: AsyncSession,
+        versions: Optional[list[tuple]] = None,
+    ) -> Optional[dict]:
+        """update task based on task id with a single UPDATE statement,
+        the task is not read before or after the write
+
+        Args:
+            db (AsyncSession): local async db session
+            task_id (int): id of task to update
+            task_update (schemas.TaskBase): new task
+            versions (list[tuple]): only update the task if it has one of these versions
+
+        Returns:
+            dict: column values of the updated task, None if no task has the id
+                or it has another version
+        """
+        values = task_update.model_dump()
+        statement, returning = task_update_statement(
+            task_id, values, db.get_bind().dialect, versions
+        )
+        result = await db.execute(statement)
+        updated_task = task_update_result(task_id, values, result, returning)
+        if updated_task is not None:
+            add_notification(
+                db, task_updated(updated_task["name"], updated_task["assigned_person_id"])
+            )
+        await db.commit()
+        return updated_task
+
+    async def patch_task_by_id(
+        self, task_id: int, changes: dict, db: AsyncSession, version: Optional[int] = None
+    ) -> bool:
+        """write only the changed columns of a task and raise its version,
+        a task loaded in the session is updated along with the row
+
+        Args:
+            db (AsyncSession): local async db session
+            task_id (int): id of task to update
+            changes (dict): new value per changed column
+            version (int): only update the task if it still has the version the
+                changes were checked against, None for any version
+
+        Returns:
+            Boolean: True if the task was updated, False if no task has the id
+                or it has another version
+        """
+        statement = update(Task).where(Task.id == task_id)
+        if version is not None:
+            statement = statement.where(Task.version == version)
+        result = await db.execute(statement.values(**changes, version=Task.version + 1))
+        if result.rowcount:
+            # the task is in the identity map when loaded, the UPDATE has synchronized it
+            db_task = await db.get(Task, task_id)
+            add_notification(db, task_updated(db_task.name, db_task.assigned_person_id))
+        await db.commit()
+        return result.rowcount > 0
+
+    async def delete_task_by_id(
+        self, task_id: int, db: AsyncSession, versions: Optional[list[tuple]] = None
+    ) -> Optional[Task]:
+        """delete task by id, with If-Match versions the DELETE only matches the
+        version that was read so a task updated in between is kept
+
+        Args:
+            db (AsyncSession): local async db session
+            task_id (int): id of task to delete
+            versions (list[tuple]): only delete the task if it has one of these versions
+
+        Returns:
+            Task: the deleted task, None if no task has the id or it has another version
+        """
+        result = await db.execute(
+            select(Task).where(Task.id == task_id, task_version_clause(versions))
+        )
+        existing_task = result.scalars().first()
+        if existing_task is None:
+            return None
+        statement = delete(Task).where(Task.id == task_id)
+        if versions is not None:
+            statement = statement.where(Task.version == existing_task.version)
+        result = await db.execute(statement)
+        if result.rowcount:
+            add_notification(db, task_deleted(task_id))
+        await db.commit()
+        return existing_task if result.rowcount > 0 else None
 
 
 # instantiate person_dao object here
 task_dao: TaskDAO = TaskDAO()
+async_task_dao: AsyncTaskDAO = AsyncTaskDAO()
@@ -2,12 +2,15 @@
 Module to define database configurations
 """
 # pylint: disable=invalid-name
+# pylint: disable=global-statement
 # pylint: disable=trailing-whitespace
 import os
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from .models import Base
+from .pool import InstrumentedAsyncAdaptedQueuePool, InstrumentedQueuePool
 
 # Load environment variables from .env file
 load_dotenv()
@@ -18,10 +21,155 @@ DATABASE_PASSWORD = os.getenv("DATABASE_PASSWORD")
 DATABASE_HOST = os.getenv("DATABASE_HOST")
 DATABASE = os.getenv("DATABASE")
 DATABASE_URL = f"mysql+pymysql://{DATABASE_USERNAME}:{DATABASE_PASSWORD}@{DATABASE_HOST}/{DATABASE}"
+ASYNC_DATABASE_URL = f"mysql+aiomysql://{DATABASE_USERNAME}:{DATABASE_PASSWORD}@{DATABASE_HOST}/{DATABASE}"
 
-engine = create_engine(DATABASE_URL)
-Base.metadata.create_all(bind=engine)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Optional read replica, left empty to serve reads from the primary
+DATABASE_REPLICA_HOST = os.getenv("DATABASE_REPLICA_HOST")
+REPLICA_DATABASE_URL = f"mysql+pymysql://{DATABASE_USERNAME}:{DATABASE_PASSWORD}@{DATABASE_REPLICA_HOST}/{DATABASE}"
+ASYNC_REPLICA_DATABASE_URL = f"mysql+aiomysql://{DATABASE_USERNAME}:{DATABASE_PASSWORD}@{DATABASE_REPLICA_HOST}/{DATABASE}"
+
+# Serve the crud endpoints from the async engine instead of the blocking one
+DATABASE_ASYNC = os.getenv("DATABASE_ASYNC", "false").lower() in ("1", "true", "yes")
+
+# Connection pool settings, sized against the 40 worker threads that serve sync endpoints
+DATABASE_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", "20"))
+DATABASE_MAX_OVERFLOW = int(os.getenv("DATABASE_MAX_OVERFLOW", "20"))
+DATABASE_POOL_TIMEOUT = float(os.getenv("DATABASE_POOL_TIMEOUT", "30"))
+DATABASE_POOL_RECYCLE = int(os.getenv("DATABASE_POOL_RECYCLE", "1800"))
+DATABASE_POOL_PRE_PING = os.getenv("DATABASE_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+# Create missing tables on startup, turn off once the schema is managed by migrations
+DATABASE_CREATE_SCHEMA = os.getenv("DATABASE_CREATE_SCHEMA", "true").lower() in ("1", "true", "yes")
+
+
+def enable_sqlite_foreign_keys(engine) -> None:
+    """turns foreign keys on for each new connection of a SQLite engine, SQLite
+    only enforces them when asked to, the tasks of unknown persons are otherwise
+    inserted instead of rejected
+
+    Args:
+        engine (Engine): engine to configure, others than SQLite are left as they are
+    """
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_foreign_keys(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+
+def create_pooled_engine(url: str, asynchronous: bool = False):
+    """creates an engine with the configured connection pool settings
+
+    Args:
+        url (str): database url
+        asynchronous (bool): build an AsyncEngine for an asyncio driver
+
+    Returns:
+        Engine | AsyncEngine: engine with an instrumented pool
+    """
+    if asynchronous:
+        new_engine = create_async_engine(
+            url,
+            poolclass=InstrumentedAsyncAdaptedQueuePool,
+            pool_size=DATABASE_POOL_SIZE,
+            max_overflow=DATABASE_MAX_OVERFLOW,
+            pool_timeout=DATABASE_POOL_TIMEOUT,
+            pool_recycle=DATABASE_POOL_RECYCLE,
+            pool_pre_ping=DATABASE_POOL_PRE_PING,
+        )
+        enable_sqlite_foreign_keys(new_engine.sync_engine)
+        return new_engine
+    new_engine = create_engine(
+        url,
+        poolclass=InstrumentedQueuePool,
+        pool_size=DATABASE_POOL_SIZE,
+        max_overflow=DATABASE_MAX_OVERFLOW,
+        pool_timeout=DATABASE_POOL_TIMEOUT,
+        pool_recycle=DATABASE_POOL_RECYCLE,
+        pool_pre_ping=DATABASE_POOL_PRE_PING,
+    )
+    enable_sqlite_foreign_keys(new_engine)
+    return new_engine
+
+
+# engines are built by init_db from the app's lifespan, not on import,
+# the session factories are bound to them once they exist.
+# Sessions live for one request, so objects are not expired on commit
+# and the values just written are served without reloading them
+engine = None
+replica_engine = None
+async_engine = None
+async_replica_engine = None
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False)
+ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False)
+AsyncSessionLocal = async_sessionmaker(class_=AsyncSession, autoflush=False, expire_on_commit=False)
+AsyncReplicaSessionLocal = async_sessionmaker(
+    class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
+
+def init_db(create_schema: bool = DATABASE_CREATE_SCHEMA) -> None:
+    """builds the engines and binds the session factories to them,
+    does nothing if they were already built
+
+    Args:
+        create_schema (bool): create missing tables on the primary
+    """
+    global engine, replica_engine, async_engine, async_replica_engine
+    if engine is not None:
+        return
+
+    engine = create_pooled_engine(DATABASE_URL)
+    if create_schema:
+        Base.metadata.create_all(bind=engine)
+    SessionLocal.configure(bind=engine)
+
+    # read-only endpoints use the replica when one is configured, else the primary
+    if DATABASE_REPLICA_HOST:
+        replica_engine = create_pooled_engine(REPLICA_DATABASE_URL)
+    ReplicaSessionLocal.configure(
+        bind=replica_engine or engine, info={"replica": replica_engine is not None}
+    )
+
+    # the async engines are only built when selected, so the asyncio driver stays optional
+    if DATABASE_ASYNC:
+        async_engine = create_pooled_engine(ASYNC_DATABASE_URL, asynchronous=True)
+        if DATABASE_REPLICA_HOST:
+            async_replica_engine = create_pooled_engine(ASYNC_REPLICA_DATABASE_URL, asynchronous=True)
+        AsyncSessionLocal.configure(bind=async_engine)
+        AsyncReplicaSessionLocal.configure(
+            bind=async_replica_engine or async_engine,
+            info={"replica": async_replica_engine is not None},
+        )
+
+
+async def dispose_db() -> None:
+    """closes the pooled connections of every engine built by init_db
+    """
+    global engine, replica_engine, async_engine, async_replica_engine
+    for sync_engine in (engine, replica_engine):
+        if sync_engine is not None:
+            sync_engine.dispose()
+    for asynchronous_engine in (async_engine, async_replica_engine):
+        if asynchronous_engine is not None:
+            await asynchronous_engine.dispose()
+    engine = replica_engine = async_engine = async_replica_engine = None
+
+
+def is_replica_session(db) -> bool:
+    """tells a session of the read replica apart from one of the primary, the
+    replica may lag behind the writes the services have just made
+
+    Args:
+        db (Session | AsyncSession): local session
+
+    Returns:
+        bool: True if the session reads from a configured replica
+    """
+    return db.info.get("replica", False)
 
 
 def get_db():
@@ -36,3 +184,55 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_read_db():
+    """gets a local session of the read replica for read-only endpoints,
+    and close db after completing operation
+
+    Yields:
+        db: local session of the replica, or of the primary if none is configured
+    """
+    db = ReplicaSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db():
+    """gets a local async session of database,
+    and close db after completing operation
+
+    Yields:
+        db: local async session of database
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_async_read_db():
+    """gets a local async session of the read replica for read-only endpoints,
+    and close db after completing operation
+
+    Yields:
+        db: local async session of the replica, or of the primary if none is configured
+    """
+    async with AsyncReplicaSessionLocal() as db:
+        yield db
+
+
+def get_pool_status(replica: bool = False) -> dict:
+    """gets live statistics of the connection pool serving the crud endpoints
+
+    Args:
+        replica (bool): report the replica pool instead of the primary one
+
+    Returns:
+        dict: pool occupancy and checkout statistics
+    """
+    if async_engine is not None:
+        selected = async_replica_engine if replica and async_replica_engine else async_engine
+    else:
+        selected = replica_engine if replica and replica_engine else engine
+    return selected.pool.status_dict()
@@ -2,28 +2,74 @@
 Models to be used in ORM
 """
 # pylint: disable=too-few-public-methods
-from sqlalchemy import Column, Integer, ForeignKey, String, Boolean, Date
+from sqlalchemy import (
+    DDL, Column, Integer, ForeignKey, String, Boolean, Date, DateTime, Index, event, func
+)
 from sqlalchemy.orm import relationship, declarative_base
 
 Base = declarative_base()
 
 class Task(Base):
     """
-    Task table
+    Task table, indexed for the access paths of the endpoints:
+    tasks per person, open tasks by date and completed tasks by date
     """
     __tablename__ = "tasks"
+    __table_args__ = (
+        # also serves the foreign key and the Person.tasks join
+        Index("ix_tasks_assigned_person_id_startdate", "assigned_person_id", "startdate"),
+        Index("ix_tasks_completed_startdate", "completed", "startdate"),
+        Index("ix_tasks_completed_enddate", "completed", "enddate"),
+        # keyword search, see TASK_SEARCH_DDL for the SQLite equivalent
+        Index(
+            "ix_tasks_name_description_fulltext", "name", "description", mysql_prefix="FULLTEXT"
+        ).ddl_if(dialect="mysql"),
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     name = Column(String(30), index=True)
-    description = Column(String(100), index=True)
+    description = Column(String(100))
     completed = Column(Boolean, default=False)
     startdate = Column(Date, nullable=False)
     enddate = Column(Date, nullable=True)
-    assigned_person_id = Column(Integer, ForeignKey("persons.id"))
+    # the database deletes the tasks of a deleted person
+    assigned_person_id = Column(
+        Integer,
+        ForeignKey("persons.id", name="fk_tasks_assigned_person_id", ondelete="CASCADE"),
+    )
+
+    # raised by one on every write, the ETag of the task
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     # Define a foreign key relationship to the Person model
     assigned_person = relationship("Person", back_populates="tasks")
 
+# SQLite has no FULLTEXT index, tasks_fts is an FTS5 inverted index of the same
+# columns, kept in sync by triggers on every write path
+TASK_SEARCH_DDL = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts
+    USING fts5(name, description, content='tasks', content_rowid='id')""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+        INSERT INTO tasks_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+        INSERT INTO tasks_fts(tasks_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE ON tasks BEGIN
+        INSERT INTO tasks_fts(tasks_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO tasks_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END""",
+)
+for statement in TASK_SEARCH_DDL:
+    event.listen(Task.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(
+    Task.__table__, "after_drop", DDL("DROP TABLE IF EXISTS tasks_fts").execute_if(dialect="sqlite")
+)
+
 class Person(Base):
     """
     Person table
@@ -31,8 +77,33 @@ class Person(Base):
     __tablename__ = "persons"
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String(50), index=True)
+    name = Column(String(50), unique=True, index=True)
+    # raised by one on every write to the person row, task writes are
+    # tracked by the ETag of the person through the tasks' own versions
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     # Establish a one-to-many relationship with Task
-    # cascade delete
-    tasks = relationship("Task", back_populates="assigned_person", cascade="all, delete-orphan")
+    # cascade delete, left to the ON DELETE CASCADE of the foreign key
+    # so the tasks are not loaded to delete them one by one
+    tasks = relationship(
+        "Task", back_populates="assigned_person", cascade="all, delete-orphan", passive_deletes=True
+    )
+
+class OutboxMessage(Base):
+    """
+    Outbox table, notifications written in the transaction of the change they
+    announce and published by the relay, which claims them by setting claimed_at
+    and sets sent_at once the broker confirmed them
+    """
+    __tablename__ = "outbox"
+    __table_args__ = (
+        # the relay reads the unsent rows in id order
+        Index("ix_outbox_sent_at_id", "sent_at", "id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    message = Column(String(255), nullable=False)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    sent_at = Column(DateTime, nullable=True)
+    # a claim expires after the lease, the rows of a relay that stopped are claimed again
+    claimed_at = Column(DateTime, nullable=True)
@@ -0,0 +1,58 @@
+"""
+Command line entry point to import tasks from a CSV or NDJSON file,
+with the same rules and batching as POST /tasks/import
+
+Run from fastapi_app: python -m task_manager.import_tasks FILE [--format csv|ndjson]
+"""
+import argparse
+import sys
+from .db.database import SessionLocal, init_db
+from .rabbitmq.rabbitmq_service import rabbitmq_service
+from .rabbitmq.background_publisher import notification_publisher
+from .schemas.imports import ImportFormat
+from .services.task_service import task_service
+
+
+def print_progress(result: dict) -> None:
+    print(
+        f"{result['created']:>10} created {result['failed']:>8} failed "
+        f"{result['rows_per_second']:>10.0f} rows/s",
+        file=sys.stderr,
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("file", help="file to import")
+    parser.add_argument(
+        "--format",
+        choices=[import_format.value for import_format in ImportFormat],
+        help="format of the file, taken from its extension when not set",
+    )
+    args = parser.parse_args()
+
+    import_format = ImportFormat(
+        args.format or ("csv" if args.file.lower().endswith(".csv") else "ndjson")
+    )
+
+    init_db()
+    try:
+        with SessionLocal() as db, open(args.file, newline="", encoding="utf-8") as file:
+            result = task_service.import_tasks(
+                lines=file, import_format=import_format, db=db, progress=print_progress
+            )
+    finally:
+        notification_publisher.stop()
+        rabbitmq_service.close()
+
+    for error in result["errors"]:
+        print(f"line {error['line']}: {error['detail']}")
+    print(
+        f"created {result['created']}, failed {result['failed']} "
+        f"in {result['seconds']:.1f} s ({result['rows_per_second']:.0f} rows/s)"
+    )
+    return 1 if result["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
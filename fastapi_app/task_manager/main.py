@@ -3,18 +3,51 @@ Main module that provides the crud endpoints for the webservice
 """
 # pylint: disable=invalid-name
 # pylint: disable=trailing-whitespace
-from fastapi import FastAPI, Path, Query, HTTPException, Depends, status
+import codecs
+import logging
+from contextlib import asynccontextmanager
+from typing import Iterator
+import anyio
+from fastapi import (
+    APIRouter, Body, FastAPI, Header, Path, Query, HTTPException, Depends, Request, Response,
+    status
+)
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from pika.exceptions import AMQPError
 from sqlalchemy.orm import Session
-from datetime import datetime
-from .schemas.persons import PersonBase, PersonCreate, Person
-from .schemas.tasks import TaskBase, TaskCreate, Task
+from datetime import date, datetime
+from .schemas.persons import PersonBase, PersonBulkCreate, PersonCreate, PersonPatch, Person
+from .schemas.tasks import TaskBase, TaskBulkCreate, TaskCreate, TaskPatch, Task, TaskFilter
+from .schemas.bulk import BULK_MAX_ITEMS, BulkCreateResult
+from .schemas.pagination import DEFAULT_PAGE_LIMIT, MAX_PAGE_LIMIT, Page
+from .schemas.export import EXPORT_MEDIA_TYPES, ExportFormat, export_headers
+from .schemas.stats import StatsBucket, TaskStats
+from .schemas.fields import parse_fields, sparse_model, sparse_response
+from .schemas.serialization import fast_response
+from .schemas.etag import not_modified
+from .schemas.rules import rule_violation_handler
+from .schemas.imports import ImportFormat, ImportResult
+from .schemas.metrics import CacheStatus, PoolStatus, PublisherStatus
 from .services.person_service import person_service
 from .services.task_service import task_service
-from .db.database import get_db
-
-app = FastAPI()
-
-@app.post("/persons", response_model=Person, status_code=status.HTTP_201_CREATED)
+from .services.cache import person_cache, task_cache
+from .services.outbox_relay import outbox_relay
+from .daos.outbox_dao import NOTIFICATION_OUTBOX
+from .db.database import DATABASE_ASYNC, get_db, get_read_db, get_pool_status, init_db, dispose_db
+from .rabbitmq.rabbitmq_service import rabbitmq_service
+from .rabbitmq.background_publisher import notification_publisher
+from .async_routes import router as async_router
+
+logger = logging.getLogger(__name__)
+
+# crud endpoints served from the blocking session, see async_routes for the async variant
+router = APIRouter()
+metrics_router = APIRouter()
+# long running imports use the blocking session in both modes
+import_router = APIRouter()
+
+@router.post("/persons", response_model=Person, status_code=status.HTTP_201_CREATED)
 def create_person(person: PersonCreate, db: Session = Depends(get_db)) -> Person:
     """POST endpoint for person
 
@@ -27,34 +60,169 @@ def create_person(person: PersonCreate, db: Session = Depends(get_db)) -> Person
     return person_service.create_new_person(person=person, db=db)
 
 
-@app.get("/persons", response_model=list[Person])
-def get_all_persons(db: Session = Depends(get_db)) -> list[Person]:
-    """GET endpoint to get all persons
+@router.post(
+    "/persons/bulk", response_model=BulkCreateResult, status_code=status.HTTP_201_CREATED
+)
+def create_persons_bulk(
+    *,
+    persons: list[PersonBulkCreate] = Body(max_length=BULK_MAX_ITEMS),
+    partial: bool = Query(
+        default=False, description="create the valid persons even if some items fail"
+    ),
+    db: Session = Depends(get_db)
+):
+    """POST endpoint to create many persons in one transaction
+
+    Args:
+        persons (list[PersonBulkCreate]): persons to create
+        partial (bool): create the valid items and report the others,
+            instead of rejecting the whole batch
+
+    Returns:
+        BulkCreateResult: number of persons created and errors per item
+    """
+    return person_service.create_new_persons_bulk(persons=persons, partial=partial, db=db)
+
+
+@router.get("/persons", response_model=Page[Person])
+def get_all_persons(
+    *,
+    db: Session = Depends(get_read_db),
+    cursor: int | None = Query(default=None, description="next_cursor of the previous page"),
+    limit: int = Query(default=DEFAULT_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT),
+    include: str = Query(
+        default="tasks", pattern="^(tasks)?$",
+        description="tasks to embed the tasks of each person, empty to skip loading them"
+    ),
+    fields: str | None = Query(
+        default=None, description="comma separated fields to return, e.g. id,name"
+    ),
+):
+    """GET endpoint to get persons, one page at a time
+
+    Args:
+        cursor (int): next_cursor of the previous page, None for the first page
+        limit (int): maximum number of persons in the page
+        include (str): "tasks" to embed the tasks of each person, "" to skip them
+        fields (str): only return these fields, tasks are embedded if listed
+            and include is then ignored
+
+    Returns:
+        Page[Person]: a page of persons ordered by id
+    """
+    selected = parse_fields(fields, Person)
+    include_tasks = include == "tasks" if selected is None else "tasks" in selected
+    page = person_service.get_all_persons(
+        db=db, cursor=cursor, limit=limit, include_tasks=include_tasks, fields=selected
+    )
+    if selected is None:
+        return fast_response(page, Page[Person])
+    return sparse_response(page, Page[sparse_model(Person, selected)])
+
+
+# declared before /persons/{person_id} so "export" is not taken for an id
+@router.get("/persons/export", response_class=StreamingResponse)
+def export_persons(
+    *,
+    db: Session = Depends(get_read_db),
+    export_format: ExportFormat = Query(default=ExportFormat.ndjson, alias="format"),
+):
+    """GET endpoint to download every person as NDJSON or CSV,
+    rows are streamed in batches as they are read from the database
+
+    Args:
+        export_format (ExportFormat): ndjson or csv
 
     Returns:
-        list[Person]: a list of all persons
+        StreamingResponse: the persons ordered by id, without their tasks
     """
-    return person_service.get_all_persons(db=db)
+    return StreamingResponse(
+        person_service.export_persons(db=db, export_format=export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers=export_headers("persons", export_format),
+    )
 
 
-@app.get("/persons/{person_id}", response_model=Person)
-def get_person_by_id(*, db: Session = Depends(get_db), person_id: int) -> Person:
-    """GET endpoint to get person by id
+@router.get("/persons/{person_id}", response_model=Person)
+def get_person_by_id(
+    *,
+    db: Session = Depends(get_read_db),
+    person_id: int,
+    include: str = Query(
+        default="tasks", pattern="^(tasks)?$",
+        description="tasks to embed the tasks of each person, empty to skip loading them"
+    ),
+    fields: str | None = Query(
+        default=None, description="comma separated fields to return, e.g. id,name"
+    ),
+    if_none_match: str | None = Header(
+        default=None, description="ETag of the copy the client has"
+    ),
+    response: Response,
+) -> Person:
+    """GET endpoint to get person by id, answers 304 without reading the person
+    when If-None-Match has its current ETag, a cached person is served without a query
 
     Args:
         person_id (int): id of person
+        include (str): "tasks" to embed the tasks of the person, "" to skip them
+        fields (str): only return these fields, tasks are embedded if listed
+            and include is then ignored
+        if_none_match (str): ETags of the copies the client has
 
     Returns:
         Person: person with the id specified
     """
-    return person_service.get_person_by_id(person_id=person_id, db=db)
+    selected = parse_fields(fields, Person)
+    include_tasks = include == "tasks" if selected is None else "tasks" in selected
+    etag, db_person = person_service.get_person_by_id(
+        person_id=person_id, db=db, include_tasks=include_tasks, fields=selected,
+        if_none_match=if_none_match,
+    )
+    if db_person is None:
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+
+    if selected is None:
+        return fast_response(db_person, Person, headers={"ETag": etag})
+    return sparse_response(db_person, sparse_model(Person, selected), headers={"ETag": etag})
+
+
+@router.get("/persons/{person_id}/stats", response_model=TaskStats)
+def get_person_stats(
+    *,
+    db: Session = Depends(get_read_db),
+    person_id: int = Path(description="id of the person"),
+    bucket: StatsBucket = Query(
+        default=StatsBucket.month, description="width of the histogram buckets"
+    ),
+    overdue_before: date | None = Query(
+        default=None, description="open tasks started before this date are overdue, default today"
+    ),
+):
+    """GET endpoint for the task statistics of a person
+
+    Args:
+        person_id (int): id of person
+        bucket (StatsBucket): day, month or year buckets for the histograms
+        overdue_before (date): open tasks started before this date are overdue
+
+    Returns:
+        TaskStats: counts by completion state, overdue count and date histograms
+    """
+    return task_service.get_person_task_stats(
+        person_id=person_id, db=db, bucket=bucket, overdue_before=overdue_before
+    )
 
 
-@app.put("/persons/{person_id}", response_model=Person)
+@router.put("/persons/{person_id}", response_model=Person)
 def update_person_by_id(
     *,
     person_id: int = Path(description="id of the person to update"),
     person_update: PersonBase,
+    if_match: str | None = Header(
+        default=None, description="only update the person if it still has this ETag"
+    ),
     db: Session = Depends(get_db)
 ) -> Person:
     """PUT endpoint to update person
@@ -62,32 +230,62 @@ def update_person_by_id(
     Args:
         person_id (int): id of person
         person_update (PersonBase): PersonBase for update
+        if_match (str): ETags the person must have, else 412 is returned
 
     Returns:
         Person: updated person
     """
     return person_service.update_person_by_id(
-        person_id=person_id, person_update=person_update, db=db
+        person_id=person_id, person_update=person_update, db=db, if_match=if_match
     )
 
 
-@app.delete("/persons/{person_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_person_by_id(person_id: int, db: Session = Depends(get_db)):
+@router.patch("/persons/{person_id}", response_model=Person)
+def patch_person_by_id(
+    *,
+    person_id: int = Path(description="id of the person to update"),
+    person_patch: PersonPatch,
+    db: Session = Depends(get_db)
+) -> Person:
+    """PATCH endpoint to update the fields sent of a person,
+    nothing is written or published if they already have these values
+
+    Args:
+        person_id (int): id of person
+        person_patch (PersonPatch): fields to change
+
+    Returns:
+        Person: updated person
+    """
+    return person_service.patch_person_by_id(
+        person_id=person_id, person_patch=person_patch, db=db
+    )
+
+
+@router.delete("/persons/{person_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_person_by_id(
+    person_id: int,
+    if_match: str | None = Header(
+        default=None, description="only delete the person if it still has this ETag"
+    ),
+    db: Session = Depends(get_db),
+):
     """DELETE endpoint to delete person
 
     Args:
         person_id (int): id of person to delete
+        if_match (str): ETags the person must have, else 412 is returned
 
     Returns:
         Dict: message that person is deleted
     """
-    return person_service.delete_person_by_id(person_id=person_id, db=db)
+    return person_service.delete_person_by_id(person_id=person_id, db=db, if_match=if_match)
 
 
 # ------------------------------------------------------------------------------------------
 
 
-@app.post("/tasks", response_model=Task, status_code=status.HTTP_201_CREATED)
+@router.post("/tasks", response_model=Task, status_code=status.HTTP_201_CREATED)
 def create_task(
     *,
     task: TaskCreate,
@@ -106,38 +304,184 @@ def create_task(
     return task_service.create_new_task(db=db, task=task, person_id=person_id)
 
 
-@app.get("/tasks", response_model=list[Task])
-def get_all_tasks(db: Session = Depends(get_db)):
-    """GET endpoint to get all tasks
+@router.post(
+    "/tasks/bulk", response_model=BulkCreateResult, status_code=status.HTTP_201_CREATED
+)
+def create_tasks_bulk(
+    *,
+    tasks: list[TaskBulkCreate] = Body(max_length=BULK_MAX_ITEMS),
+    partial: bool = Query(
+        default=False, description="create the valid tasks even if some items fail"
+    ),
+    db: Session = Depends(get_db)
+):
+    """POST endpoint to create many tasks in one transaction
+
+    Args:
+        tasks (list[TaskBulkCreate]): tasks to create, each with the id of its person
+        partial (bool): create the valid items and report the others,
+            instead of rejecting the whole batch
+
+    Returns:
+        BulkCreateResult: number of tasks created and errors per item
+    """
+    return task_service.create_new_tasks_bulk(tasks=tasks, partial=partial, db=db)
+
+
+@router.get("/tasks", response_model=Page[Task])
+def get_all_tasks(
+    *,
+    db: Session = Depends(get_read_db),
+    filters: TaskFilter = Depends(),
+    cursor: int | None = Query(default=None, description="next_cursor of the previous page"),
+    limit: int = Query(default=DEFAULT_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT),
+    fields: str | None = Query(
+        default=None, description="comma separated fields to return, e.g. id,name"
+    ),
+):
+    """GET endpoint to get tasks, one page at a time
+
+    Args:
+        filters (TaskFilter): person_id, completed, start_from/start_to and end_from/end_to
+        cursor (int): next_cursor of the previous page, None for the first page
+        limit (int): maximum number of tasks in the page
+        fields (str): only read and return these fields
+
+    Returns:
+        Page[Task]: a page of the matching tasks ordered by id
+    """
+    selected = parse_fields(fields, Task)
+    page = task_service.get_all_tasks(
+        db=db, cursor=cursor, limit=limit, filters=filters, fields=selected
+    )
+    if selected is None:
+        return fast_response(page, Page[Task])
+    return sparse_response(page, Page[sparse_model(Task, selected)])
+
+
+# declared before /tasks/{task_id} so "search" is not taken for an id
+@router.get("/tasks/search", response_model=Page[Task])
+def search_tasks(
+    *,
+    db: Session = Depends(get_read_db),
+    q: str = Query(
+        min_length=1, max_length=100, description="keywords to find in name or description"
+    ),
+    cursor: int | None = Query(default=None, ge=0, description="next_cursor of the previous page"),
+    limit: int = Query(default=DEFAULT_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT)
+):
+    """GET endpoint to search tasks by keywords, one page at a time
+
+    Args:
+        q (str): keywords to find in the name or description
+        cursor (int): next_cursor of the previous page, None for the first page
+        limit (int): maximum number of tasks in the page
+
+    Returns:
+        Page[Task]: a page of the matching tasks, most relevant first
+    """
+    page = task_service.search_tasks(db=db, q=q, cursor=cursor, limit=limit)
+    return fast_response(page, Page[Task])
+
+
+# declared before /tasks/{task_id} so "stats" is not taken for an id
+@router.get("/tasks/stats", response_model=TaskStats)
+def get_task_stats(
+    *,
+    db: Session = Depends(get_read_db),
+    filters: TaskFilter = Depends(),
+    bucket: StatsBucket = Query(
+        default=StatsBucket.month, description="width of the histogram buckets"
+    ),
+    overdue_before: date | None = Query(
+        default=None, description="open tasks started before this date are overdue, default today"
+    ),
+):
+    """GET endpoint for task statistics, computed by the database
+
+    Args:
+        filters (TaskFilter): person_id, completed, start_from/start_to and end_from/end_to
+        bucket (StatsBucket): day, month or year buckets for the histograms
+        overdue_before (date): open tasks started before this date are overdue
 
     Returns:
-        list[Person]: a list of all tasks
+        TaskStats: counts by completion state, overdue count and date histograms
     """
-    return task_service.get_all_tasks(db=db)
+    return task_service.get_task_stats(
+        db=db, filters=filters, bucket=bucket, overdue_before=overdue_before
+    )
+
 
+# declared before /tasks/{task_id} so "export" is not taken for an id
+@router.get("/tasks/export", response_class=StreamingResponse)
+def export_tasks(
+    *,
+    db: Session = Depends(get_read_db),
+    filters: TaskFilter = Depends(),
+    export_format: ExportFormat = Query(default=ExportFormat.ndjson, alias="format"),
+):
+    """GET endpoint to download the tasks as NDJSON or CSV,
+    rows are streamed in batches as they are read from the database
 
-@app.get("/tasks/{task_id}", response_model=Task)
+    Args:
+        filters (TaskFilter): person_id, completed, start_from/start_to and end_from/end_to
+        export_format (ExportFormat): ndjson or csv
+
+    Returns:
+        StreamingResponse: the matching tasks ordered by id
+    """
+    return StreamingResponse(
+        task_service.export_tasks(db=db, export_format=export_format, filters=filters),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers=export_headers("tasks", export_format),
+    )
+
+
+@router.get("/tasks/{task_id}", response_model=Task)
 def get_task_by_id(
     *,
     task_id: int = Path(description="id of the task to get"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db),
+    fields: str | None = Query(
+        default=None, description="comma separated fields to return, e.g. id,name"
+    ),
+    if_none_match: str | None = Header(
+        default=None, description="ETag of the copy the client has"
+    ),
+    response: Response,
 ):
-    """GET endpoint to get task by id
+    """GET endpoint to get task by id, answers 304 without reading the task
+    when If-None-Match has its current ETag, a cached task is served without a query
 
     Args:
         task_id (int): id of task
+        fields (str): only read and return these fields
+        if_none_match (str): ETags of the copies the client has
 
     Returns:
         Task: task with the id specified
     """
-    return task_service.get_task_by_id(db=db, task_id=task_id)
+    selected = parse_fields(fields, Task)
+    etag, db_task = task_service.get_task_by_id(
+        db=db, task_id=task_id, fields=selected, if_none_match=if_none_match
+    )
+    if db_task is None:
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+
+    if selected is None:
+        return fast_response(db_task, Task, headers={"ETag": etag})
+    return sparse_response(db_task, sparse_model(Task, selected), headers={"ETag": etag})
 
 
-@app.put("/tasks/{task_id}", response_model=Task)
+@router.put("/tasks/{task_id}", response_model=Task)
 def update_task_by_id(
     *,
     task_id: int = Path(description="id of the task to update"),
     task_update: TaskBase,
+    if_match: str | None = Header(
+        default=None, description="only update the task if it still has this ETag"
+    ),
     db: Session = Depends(get_db)
 ):
     """PUT endpoint to update task
@@ -145,26 +489,183 @@ def update_task_by_id(
     Args:
         task_id (int): id of task
         task_update (TaskBase): TaskBase for update
+        if_match (str): ETags the task must have, else 412 is returned
 
     Returns:
         Task: updated task
     """
     return task_service.update_task_by_id(
-        db=db, task_id=task_id, task_update=task_update
+        db=db, task_id=task_id, task_update=task_update, if_match=if_match
     )
 
 
-@app.delete("/tasks/{task_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_task_by_id(task_id: int, db: Session = Depends(get_db)):
+@router.patch("/tasks/{task_id}", response_model=Task)
+def patch_task_by_id(
+    *,
+    task_id: int = Path(description="id of the task to update"),
+    task_patch: TaskPatch,
+    db: Session = Depends(get_db)
+):
+    """PATCH endpoint to update the fields sent of a task,
+    nothing is written or published if they already have these values
+
+    Args:
+        task_id (int): id of task
+        task_patch (TaskPatch): fields to change
+
+    Returns:
+        Task: updated task
+    """
+    return task_service.patch_task_by_id(
+        db=db, task_id=task_id, task_patch=task_patch
+    )
+
+
+@router.delete("/tasks/{task_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_task_by_id(
+    task_id: int,
+    if_match: str | None = Header(
+        default=None, description="only delete the task if it still has this ETag"
+    ),
+    db: Session = Depends(get_db),
+):
     """DELETE endpoint to delete task
 
     Args:
         task_id (int): id of task to delete
+        if_match (str): ETags the task must have, else 412 is returned
+    """
+    return task_service.delete_task_by_id(db=db, task_id=task_id, if_match=if_match)
+
+
+# ------------------------------------------------------------------------------------------
+
+
+def request_lines(request: Request) -> Iterator[str]:
+    """lines of the request body, received chunk by chunk from the worker thread
+    running the endpoint, so the body is never held in memory as a whole
+
+    Args:
+        request (Request): request with a text body
+
+    Yields:
+        str: lines with their "\n"
+    """
+    body = request.stream()
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    while True:
+        try:
+            chunk = anyio.from_thread.run(body.__anext__)
+        except StopAsyncIteration:
+            break
+        # split on "\n" only like a file read line by line, str.splitlines also
+        # breaks on characters such as U+2028 that JSON strings may hold unescaped
+        lines = (pending + decoder.decode(chunk)).split("\n")
+        # the last line is completed by the next chunk
+        pending = lines.pop()
+        yield from (line + "\n" for line in lines)
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+@import_router.post("/tasks/import", response_model=ImportResult)
+def import_tasks(
+    *,
+    request: Request,
+    import_format: ImportFormat = Query(default=ImportFormat.ndjson, alias="format"),
+    db: Session = Depends(get_db)
+):
+    """POST endpoint to import the tasks of a CSV or NDJSON file sent as the request body,
+    the file is parsed while it is received and inserted in batches
+
+    Args:
+        import_format (ImportFormat): ndjson, or csv with a header line
+
+    Returns:
+        ImportResult: number of tasks created and failed, errors per line and throughput
+    """
+    return task_service.import_tasks(
+        lines=request_lines(request), import_format=import_format, db=db
+    )
+
+# ------------------------------------------------------------------------------------------
+
+
+@metrics_router.get("/metrics/pool", response_model=PoolStatus)
+def get_pool_metrics(
+    replica: bool = Query(default=False, description="report the read replica pool")
+):
+    """GET endpoint for database connection pool statistics
+
+    Args:
+        replica (bool): report the read replica pool instead of the primary one
+
+    Returns:
+        PoolStatus: occupancy, overflow, wait time and timeouts of the pool
     """
-    return task_service.delete_task_by_id(db=db, task_id=task_id)
+    return get_pool_status(replica=replica)
+
+
+@metrics_router.get("/metrics/cache", response_model=dict[str, CacheStatus])
+def get_cache_metrics():
+    """GET endpoint for statistics of the person and task caches
+
+    Returns:
+        dict[str, CacheStatus]: size, hits and misses per cache
+    """
+    return {"persons": person_cache.status_dict(), "tasks": task_cache.status_dict()}
+
+
+@metrics_router.get("/metrics/publisher", response_model=PublisherStatus)
+def get_publisher_metrics():
+    """GET endpoint for statistics of the background notification publisher
+
+    Returns:
+        PublisherStatus: queue depth, dropped and spilled messages and publish latency
+    """
+    return notification_publisher.status_dict()
 
 # ------------------------------------------------------------------------------------------
 
-@app.on_event("shutdown")
-def shutdown_event():
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """builds the database engines, opens the shared broker connection and starts
+    the outbox relay on startup, stops the relay, drains the notification queue
+    and closes the connections on shutdown
+    """
+    init_db()
+    try:
+        rabbitmq_service.connect()
+    except (AMQPError, OSError):
+        # an unreachable or unresolvable broker, the service connects on the first publish instead
+        logger.warning("RabbitMQ is not reachable, connecting on first publish")
+    if NOTIFICATION_OUTBOX:
+        outbox_relay.start()
+    yield
+    # publishes the queued notifications before the connection is closed,
+    # the outbox rows left unsent are relayed after the next start
+    outbox_relay.stop()
+    notification_publisher.stop()
     rabbitmq_service.close()
+    await dispose_db()
+
+
+def create_app() -> FastAPI:
+    """creates the webservice, connections are only opened once the app starts
+
+    Returns:
+        FastAPI: the application
+    """
+    application = FastAPI(lifespan=lifespan)
+    # bodies breaking a rule of the schemas get the 400 the services used to send
+    application.add_exception_handler(RequestValidationError, rule_violation_handler)
+    application.include_router(async_router if DATABASE_ASYNC else router)
+    application.include_router(import_router)
+    application.include_router(metrics_router)
+    return application
+
+
+app = create_app()
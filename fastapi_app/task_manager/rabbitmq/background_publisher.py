@@ -0,0 +1,310 @@
+"""
+Background publishing of the notifications, off the request threads
+"""
+# pylint: disable=invalid-name
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from enum import Enum
+from typing import Optional
+from dotenv import load_dotenv
+from pika.exceptions import AMQPError
+from .rabbitmq_service import RabbitMQService, rabbitmq_service
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+class BackpressurePolicy(str, Enum):
+    """What publish does when the queue is full
+    """
+    # wait for room, up to the block timeout, then drop the new message,
+    # callers on an event loop do not wait
+    block = "block"
+    # drop the oldest queued message to make room
+    drop_oldest = "drop_oldest"
+    # append the message to the spill file, replayed once the queue is drained
+    spill = "spill"
+
+
+# Publish from a dedicated thread, a slow broker then no longer delays the writes
+RABBITMQ_PUBLISH_BACKGROUND = os.getenv("RABBITMQ_PUBLISH_BACKGROUND", "true").lower() in ("1", "true", "yes")
+RABBITMQ_PUBLISH_QUEUE_SIZE = int(os.getenv("RABBITMQ_PUBLISH_QUEUE_SIZE", "10000"))
+RABBITMQ_PUBLISH_BATCH_SIZE = int(os.getenv("RABBITMQ_PUBLISH_BATCH_SIZE", "100"))
+RABBITMQ_PUBLISH_POLICY = BackpressurePolicy(os.getenv("RABBITMQ_PUBLISH_POLICY", "drop_oldest"))
+RABBITMQ_PUBLISH_BLOCK_TIMEOUT = float(os.getenv("RABBITMQ_PUBLISH_BLOCK_TIMEOUT", "5"))
+RABBITMQ_PUBLISH_SPILL_PATH = os.getenv("RABBITMQ_PUBLISH_SPILL_PATH", "notification_spill.ndjson")
+RABBITMQ_PUBLISH_RETRY_SECONDS = float(os.getenv("RABBITMQ_PUBLISH_RETRY_SECONDS", "1"))
+
+
+def on_event_loop() -> bool:
+    """whether the caller runs on an event loop, the async sessions commit there too
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class BackgroundPublisher:
+    """Bounded queue of notifications drained in batches by a dedicated thread
+
+    publish only enqueues the message, the thread is started on the first one.
+    A batch the broker rejects is retried until it is published, the queue fills
+    up meanwhile and the backpressure policy decides what happens to new messages.
+    Once a message is spilled, the following ones are spilled too until the file
+    is replayed, so messages are published in the order they were enqueued.
+    """
+    def __init__(
+        self,
+        rabbitmq_service_param: RabbitMQService,
+        max_size: int = RABBITMQ_PUBLISH_QUEUE_SIZE,
+        batch_size: int = RABBITMQ_PUBLISH_BATCH_SIZE,
+        policy: BackpressurePolicy = RABBITMQ_PUBLISH_POLICY,
+        block_timeout: float = RABBITMQ_PUBLISH_BLOCK_TIMEOUT,
+        spill_path: str = RABBITMQ_PUBLISH_SPILL_PATH,
+        retry_seconds: float = RABBITMQ_PUBLISH_RETRY_SECONDS,
+        enabled: bool = RABBITMQ_PUBLISH_BACKGROUND,
+    ):
+        self.rabbitmq_service = rabbitmq_service_param
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.spill_path = spill_path
+        self.retry_seconds = retry_seconds
+        self.enabled = enabled
+        # (enqueue time, message) pairs, oldest first
+        self._queue: deque = deque()
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._in_flight = 0
+        # messages in the spill file not published yet, and where the next one starts
+        self._spill_pending = 0
+        self._spill_offset = 0
+        self._spill_counted = False
+        self.published = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.failed_attempts = 0
+        self.batches = 0
+        self.total_publish_seconds = 0.0
+        self.max_publish_seconds = 0.0
+        self.total_delay_seconds = 0.0
+        self.max_delay_seconds = 0.0
+
+    def publish(self, message: str) -> None:
+        """enqueues a notification, publishes it right away when the publisher is disabled
+
+        With the block policy the caller waits while the queue is full, up to the
+        block timeout. A caller on an event loop never waits, the message is only
+        enqueued if there is room, so the loop is not held up.
+        """
+        if not self.enabled:
+            self.rabbitmq_service.publish(message=message)
+            return
+        with self._condition:
+            self._start()
+            enqueued_at = time.time()
+            if self._spill_pending:
+                self._spill([(enqueued_at, message)])
+            elif len(self._queue) < self.max_size:
+                self._queue.append((enqueued_at, message))
+            elif self.policy == BackpressurePolicy.drop_oldest:
+                self._queue.popleft()
+                self._queue.append((enqueued_at, message))
+                self.dropped += 1
+            elif self.policy == BackpressurePolicy.spill:
+                self._spill([(enqueued_at, message)])
+            elif not on_event_loop() and self._condition.wait_for(
+                lambda: len(self._queue) < self.max_size, timeout=self.block_timeout
+            ):
+                self._queue.append((enqueued_at, message))
+            else:
+                self.dropped += 1
+                logger.warning("Notification queue is full, dropped: %s", message)
+            self._condition.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """waits until every enqueued and spilled message is published
+
+        Returns:
+            bool: True if everything was published before the timeout
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: not self._queue and not self._spill_pending and not self._in_flight,
+                timeout=timeout,
+            )
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """publishes what is left, up to the timeout, and stops the thread,
+        the next publish starts it again
+        """
+        if not self.flush(timeout):
+            logger.warning(
+                "Stopped with %d notifications queued and %d spilled",
+                len(self._queue), self._spill_pending,
+            )
+        with self._condition:
+            thread = self._thread
+            self._stopping = True
+            self._condition.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+        with self._condition:
+            self._thread = None
+            self._stopping = False
+
+    def _start(self) -> None:
+        """starts the thread if it is not running, called with the condition held
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        if not self._spill_counted:
+            # messages spilled by a previous process are replayed first
+            self._spill_counted = True
+            if os.path.exists(self.spill_path):
+                with open(self.spill_path, encoding="utf-8") as spill_file:
+                    self._spill_pending = sum(1 for _ in spill_file)
+        self._thread = threading.Thread(
+            target=self._run, name="notification-publisher", daemon=True
+        )
+        self._thread.start()
+
+    def _spill(self, entries: list[tuple]) -> None:
+        """appends messages to the spill file, called with the condition held
+        """
+        with open(self.spill_path, "a", encoding="utf-8") as spill_file:
+            for enqueued_at, message in entries:
+                spill_file.write(json.dumps([enqueued_at, message]) + "\n")
+        self._spill_pending += len(entries)
+        self.spilled += len(entries)
+
+    def _read_spill(self) -> tuple[list[tuple], int]:
+        """reads the next batch of spilled messages, called with the condition held
+
+        Returns:
+            tuple[list[tuple], int]: the messages and the offset after them
+        """
+        entries = []
+        with open(self.spill_path, encoding="utf-8") as spill_file:
+            spill_file.seek(self._spill_offset)
+            while len(entries) < min(self.batch_size, self._spill_pending):
+                entries.append(tuple(json.loads(spill_file.readline())))
+            return entries, spill_file.tell()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._queue or self._spill_pending or self._stopping
+                )
+                if self._queue:
+                    count = min(self.batch_size, len(self._queue))
+                    entries = [self._queue.popleft() for _ in range(count)]
+                    spill_offset = None
+                elif self._spill_pending:
+                    entries, spill_offset = self._read_spill()
+                else:
+                    return
+                self._in_flight = len(entries)
+                # blocked publishers can enqueue again
+                self._condition.notify_all()
+
+            published = self._publish_batch(entries)
+
+            with self._condition:
+                if spill_offset is not None and published:
+                    self._spill_offset = spill_offset
+                    self._spill_pending -= len(entries)
+                    if not self._spill_pending:
+                        os.remove(self.spill_path)
+                        self._spill_offset = 0
+                self._in_flight = 0
+                self._condition.notify_all()
+                if not published and self._stopping:
+                    return
+
+    def _publish_batch(self, entries: list[tuple]) -> bool:
+        """publishes a batch, retried while the broker is unreachable, only
+        other errors drop it
+
+        Returns:
+            bool: False if the batch was given up
+        """
+        messages = [message for _, message in entries]
+        while True:
+            start = time.perf_counter()
+            try:
+                self.rabbitmq_service.publish_batch(messages)
+                break
+            except (AMQPError, OSError):
+                # rejected, or the broker host is unreachable or does not resolve
+                logger.warning("Publishing %d notifications failed, retrying", len(messages))
+                # reconnect on the next attempt
+                self.rabbitmq_service.close()
+                with self._condition:
+                    self.failed_attempts += 1
+                    if self._condition.wait_for(lambda: self._stopping, timeout=self.retry_seconds):
+                        logger.error("Stopped, %d notifications not published", len(messages))
+                        return False
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Dropped %d notifications", len(messages))
+                with self._condition:
+                    self.dropped += len(messages)
+                return False
+
+        finished = time.perf_counter()
+        elapsed = finished - start
+        now = time.time()
+        with self._condition:
+            self.published += len(messages)
+            self.batches += 1
+            self.total_publish_seconds += elapsed
+            self.max_publish_seconds = max(self.max_publish_seconds, elapsed)
+            for enqueued_at, _ in entries:
+                delay = now - enqueued_at
+                self.total_delay_seconds += delay
+                self.max_delay_seconds = max(self.max_delay_seconds, delay)
+        return True
+
+    def status_dict(self) -> dict:
+        """queue depth, counters and publish latency of the publisher
+
+        Returns:
+            dict: publisher statistics
+        """
+        with self._condition:
+            return {
+                "enabled": self.enabled,
+                "policy": self.policy.value,
+                "depth": len(self._queue),
+                "max_size": self.max_size,
+                "spill_pending": self._spill_pending,
+                "in_flight": self._in_flight,
+                "published": self.published,
+                "dropped": self.dropped,
+                "spilled": self.spilled,
+                "failed_attempts": self.failed_attempts,
+                "batches": self.batches,
+                "avg_batch_publish_seconds": (
+                    self.total_publish_seconds / self.batches if self.batches else 0.0
+                ),
+                "max_batch_publish_seconds": self.max_publish_seconds,
+                "avg_delay_seconds": (
+                    self.total_delay_seconds / self.published if self.published else 0.0
+                ),
+                "max_delay_seconds": self.max_delay_seconds,
+            }
+
+
+# shared by the sync and async services, started on the first notification
+notification_publisher: BackgroundPublisher = BackgroundPublisher(rabbitmq_service)
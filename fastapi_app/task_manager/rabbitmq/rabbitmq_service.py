@@ -1,24 +1,59 @@
+import os
+import threading
 import pika
 from pika.exchange_type import ExchangeType
 
+RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "rabbitmq3")
+
 class RabbitMQService:
     def __init__(self, rabbitmq_url: str):
         self.rabbitmq_url = rabbitmq_url
+        self.connection = None
+        self.channel = None
+        # one BlockingConnection is shared by all request threads and is not thread safe
+        self._lock = threading.Lock()
+
+    @property
+    def is_connected(self) -> bool:
+        return self.connection is not None and self.connection.is_open
 
     def connect(self) -> None:
         self.connection_parameters = pika.ConnectionParameters(self.rabbitmq_url)
         self.connection = pika.BlockingConnection(self.connection_parameters)
         self.channel = self.connection.channel()
         self.channel.exchange_declare(exchange='notification', exchange_type=ExchangeType.fanout)
+        # basic_publish returns once the broker confirmed the message, raises if it was nacked
+        self.channel.confirm_delivery()
 
     def publish(self, message: str):
-        self.channel.basic_publish(
-            exchange='notification',
-            routing_key='',
-            body=message
-        )
+        with self._lock:
+            # connect on first use if the broker was not reachable at startup
+            if not self.is_connected:
+                self.connect()
+            self.channel.basic_publish(
+                exchange='notification',
+                routing_key='',
+                body=message
+            )
+
+    def publish_batch(self, messages: list[str]):
+        # one lock and connection check for the whole batch of the background publisher
+        with self._lock:
+            if not self.is_connected:
+                self.connect()
+            for message in messages:
+                self.channel.basic_publish(
+                    exchange='notification',
+                    routing_key='',
+                    body=message
+                )
 
     def close(self):
-        self.connection.close()
+        with self._lock:
+            if self.is_connected:
+                self.connection.close()
+            self.connection = None
+            self.channel = None
 
-#rabbitmq_service: RabbitMQService = RabbitMQService('localhost')
\ No newline at end of file
+# single broker connection shared by the services, opened in the app's lifespan
+rabbitmq_service: RabbitMQService = RabbitMQService(RABBITMQ_HOST)
@@ -0,0 +1,21 @@
+"""
+Schemas for bulk creates
+"""
+# pylint: disable=too-few-public-methods
+from pydantic import BaseModel
+
+# rows per multi-row INSERT statement
+BULK_CHUNK_SIZE = 1000
+BULK_MAX_ITEMS = 10000
+
+class BulkItemError(BaseModel):
+    """Schema for an item of a bulk request that was not created
+    """
+    index: int
+    detail: str
+
+class BulkCreateResult(BaseModel):
+    """Schema for bulk create response model
+    """
+    created: int
+    errors: list[BulkItemError] = []
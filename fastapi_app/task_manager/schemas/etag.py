@@ -0,0 +1,63 @@
+"""
+Entity tags of the task and person responses
+"""
+from typing import Optional
+from fastapi import Response, status
+
+
+def format_etag(version: tuple) -> str:
+    """quoted entity tag of a row version, the parts are joined with dashes
+
+    Args:
+        version (tuple): version of the entity as read by the DAO
+
+    Returns:
+        str: the tag, e.g. "3" or "2-5-9-41"
+    """
+    return '"' + "-".join(str(part) for part in version) + '"'
+
+
+def parse_etags(header: Optional[str]) -> Optional[list[tuple]]:
+    """versions listed in an If-Match header, tags we did not issue are skipped
+    since they cannot match
+
+    Args:
+        header (str): value of the header
+
+    Returns:
+        list[tuple]: versions of the tags, None if the header is missing or "*"
+            and so matches any version
+    """
+    if header is None or header.strip() == "*":
+        return None
+    versions = []
+    for tag in header.split(","):
+        tag = tag.strip().removeprefix("W/").strip('"')
+        try:
+            versions.append(tuple(int(part) for part in tag.split("-")))
+        except ValueError:
+            continue
+    return versions
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """whether an If-None-Match header lists the current tag, compared weakly
+
+    Args:
+        header (str): value of the header
+        etag (str): current tag of the entity
+
+    Returns:
+        bool: True if the client already has this version
+    """
+    if header is None:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    """empty 304 response telling the client its copy is current
+    """
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
@@ -0,0 +1,78 @@
+"""
+Schemas for streamed exports
+"""
+import csv
+import io
+import json
+from enum import Enum
+from typing import AsyncIterator, Iterable, Iterator, Sequence
+
+# rows fetched from the server-side cursor and written to the response at a time
+EXPORT_BATCH_SIZE = 1000
+
+class ExportFormat(str, Enum):
+    """Formats of the export endpoints
+    """
+    ndjson = "ndjson"
+    csv = "csv"
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.csv: "text/csv",
+}
+
+
+def export_headers(name: str, export_format: ExportFormat) -> dict:
+    """response headers offering the export as a file download
+    """
+    return {"Content-Disposition": f'attachment; filename="{name}.{export_format.value}"'}
+
+
+def encode_partition(rows: Sequence, columns: list[str], export_format: ExportFormat) -> str:
+    """encodes a batch of rows as NDJSON lines or CSV records
+
+    Args:
+        rows (Sequence): rows holding the values of the columns in order
+        columns (list[str]): column names
+        export_format (ExportFormat): ndjson or csv
+
+    Returns:
+        str: the encoded rows
+    """
+    if export_format is ExportFormat.csv:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue()
+    # dates are written in the YYYY-MM-DD format of the other endpoints
+    return "".join(json.dumps(dict(zip(columns, row)), default=str) + "\n" for row in rows)
+
+
+def csv_header(columns: list[str]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(columns)
+    return buffer.getvalue()
+
+
+def encode_export(
+    partitions: Iterable[Sequence], columns: list[str], export_format: ExportFormat
+) -> Iterator[str]:
+    """encodes the batches of rows as they are fetched, one chunk of the response per batch
+
+    Yields:
+        str: header of a CSV export, then the encoded batches
+    """
+    if export_format is ExportFormat.csv:
+        yield csv_header(columns)
+    for rows in partitions:
+        yield encode_partition(rows, columns, export_format)
+
+
+async def encode_export_async(
+    partitions: AsyncIterator[Sequence], columns: list[str], export_format: ExportFormat
+) -> AsyncIterator[str]:
+    """encode_export for batches fetched from an async session
+    """
+    if export_format is ExportFormat.csv:
+        yield csv_header(columns)
+    async for rows in partitions:
+        yield encode_partition(rows, columns, export_format)
@@ -0,0 +1,74 @@
+"""
+Schemas for sparse fieldsets, responses trimmed to the fields a client asks for
+"""
+from functools import lru_cache
+from typing import Optional
+from fastapi import HTTPException, Response, status
+from pydantic import BaseModel, ConfigDict, create_model
+
+
+def parse_fields(fields: Optional[str], schema: type[BaseModel]) -> Optional[frozenset[str]]:
+    """parses the fields query parameter against the fields of the response model
+
+    Args:
+        fields (str): comma separated field names, None for every field
+        schema (type[BaseModel]): full response model
+
+    Returns:
+        frozenset[str]: selected fields, None for every field
+
+    Raises:
+        HTTPException: no field or an unknown field was asked for
+    """
+    if fields is None:
+        return None
+    selected = frozenset(field.strip() for field in fields.split(",") if field.strip())
+    unknown = sorted(selected - schema.model_fields.keys())
+    if not selected or unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}" if unknown else "No fields selected",
+        )
+    return selected
+
+
+@lru_cache(maxsize=None)
+def sparse_model(schema: type[BaseModel], fields: frozenset[str]) -> type[BaseModel]:
+    """response model with only the selected fields of schema, built once per selection
+
+    Args:
+        schema (type[BaseModel]): full response model
+        fields (frozenset[str]): selected fields
+
+    Returns:
+        type[BaseModel]: the trimmed model
+    """
+    return create_model(
+        f"{schema.__name__}Fields",
+        __config__=ConfigDict(from_attributes=True),
+        **{
+            name: (field.annotation, field)
+            for name, field in schema.model_fields.items()
+            if name in fields
+        },
+    )
+
+
+def sparse_response(
+    content, response_schema: type[BaseModel], headers: Optional[dict] = None
+) -> Response:
+    """serializes the content with a trimmed model instead of the route's response_model
+
+    Args:
+        content: object, row or dict to serialize
+        response_schema (type[BaseModel]): trimmed model of the response
+        headers (dict): headers of the response
+
+    Returns:
+        Response: the JSON response
+    """
+    return Response(
+        content=response_schema.model_validate(content).model_dump_json(),
+        media_type="application/json",
+        headers=headers,
+    )
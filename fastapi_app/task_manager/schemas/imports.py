@@ -0,0 +1,30 @@
+"""
+Schemas for file imports
+"""
+# pylint: disable=too-few-public-methods
+from enum import Enum
+from pydantic import BaseModel
+
+# errors kept in the result, the others are only counted
+IMPORT_MAX_ERRORS = 1000
+
+class ImportFormat(str, Enum):
+    """Formats of the import files
+    """
+    ndjson = "ndjson"
+    csv = "csv"
+
+class ImportLineError(BaseModel):
+    """Schema for a line of an import file that was not imported
+    """
+    line: int
+    detail: str
+
+class ImportResult(BaseModel):
+    """Schema for import response model
+    """
+    created: int
+    failed: int
+    errors: list[ImportLineError] = []
+    seconds: float
+    rows_per_second: float
@@ -0,0 +1,51 @@
+"""
+Schemas for metrics
+"""
+# pylint: disable=too-few-public-methods
+from pydantic import BaseModel
+
+class PoolStatus(BaseModel):
+    """Schema for connection pool statistics
+    """
+    pool_size: int
+    checked_in: int
+    checked_out: int
+    overflow: int
+    max_overflow: int
+    checkouts: int
+    timeouts: int
+    total_wait_seconds: float
+    avg_wait_seconds: float
+    max_wait_seconds: float
+
+
+class CacheStatus(BaseModel):
+    """Schema for entity cache statistics
+    """
+    enabled: bool
+    entries: int
+    max_entries: int
+    ttl_seconds: float
+    hits: int
+    misses: int
+    hit_ratio: float
+
+
+class PublisherStatus(BaseModel):
+    """Schema for background publisher statistics
+    """
+    enabled: bool
+    policy: str
+    depth: int
+    max_size: int
+    spill_pending: int
+    in_flight: int
+    published: int
+    dropped: int
+    spilled: int
+    failed_attempts: int
+    batches: int
+    avg_batch_publish_seconds: float
+    max_batch_publish_seconds: float
+    avg_delay_seconds: float
+    max_delay_seconds: float
@@ -0,0 +1,39 @@
+"""
+Messages of the notifications published for the person and task changes
+"""
+
+
+def person_created(name: str) -> str:
+    return f"PERSON CREATE: {name}"
+
+
+def persons_bulk_created(created: int) -> str:
+    return f"PERSON BULK CREATE: {created} persons"
+
+
+def person_updated(name: str) -> str:
+    return f"PERSON UPDATED: {name}"
+
+
+def person_deleted(person_id: int) -> str:
+    return f"PERSON (ID: {person_id}) DELETED"
+
+
+def task_created(name: str, person_id: int) -> str:
+    return f"TASK CREATE: {name}, PERSON ASSIGNED: {person_id}"
+
+
+def tasks_bulk_created(created: int) -> str:
+    return f"TASK BULK CREATE: {created} tasks"
+
+
+def tasks_imported(created: int) -> str:
+    return f"TASK IMPORT: {created} tasks"
+
+
+def task_updated(name: str, person_id: int) -> str:
+    return f"TASK UPDATED: {name}, PERSON ASSIGNED: {person_id}"
+
+
+def task_deleted(task_id: int) -> str:
+    return f"TASK ID {task_id} DELETED"
@@ -0,0 +1,52 @@
+"""
+Schemas for paginated responses
+"""
+# pylint: disable=too-few-public-methods
+from typing import Generic, TypeVar
+from pydantic import BaseModel
+
+ItemT = TypeVar("ItemT")
+
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+
+class Page(BaseModel, Generic[ItemT]):
+    """Schema for one page of a keyset paginated list,
+    next_cursor is the id to pass as cursor for the following page
+    """
+    items: list[ItemT]
+    limit: int
+    next_cursor: int | None = None
+
+
+def build_page(rows: list, limit: int) -> dict:
+    """builds a page from rows fetched with limit + 1,
+    the extra row only tells whether another page follows
+
+    Args:
+        rows (list): rows ordered by id, at most limit + 1
+        limit (int): page size
+
+    Returns:
+        dict: items, limit and next_cursor of the page
+    """
+    items = rows[:limit]
+    next_cursor = items[-1].id if len(rows) > limit else None
+    return {"items": items, "limit": limit, "next_cursor": next_cursor}
+
+
+def build_offset_page(rows: list, offset: int, limit: int) -> dict:
+    """builds a page of a list that is not ordered by id, such as search results
+    ordered by relevance, from rows fetched with limit + 1 starting at offset,
+    next_cursor is then the offset of the following page
+
+    Args:
+        rows (list): rows of the page, at most limit + 1
+        offset (int): position of the first row in the list
+        limit (int): page size
+
+    Returns:
+        dict: items, limit and next_cursor of the page
+    """
+    next_cursor = offset + limit if len(rows) > limit else None
+    return {"items": rows[:limit], "limit": limit, "next_cursor": next_cursor}
@@ -0,0 +1,49 @@
+"""
+Helpers for partial updates
+"""
+from typing import TypeVar
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+def changed_fields(current, patch: BaseModel) -> dict:
+    """fields sent in the patch whose value differs from the current one
+
+    Args:
+        current: row or object holding the current values
+        patch (BaseModel): partial body, unset fields are not part of the change
+
+    Returns:
+        dict: new value per changed field, empty if the patch changes nothing
+    """
+    return {
+        field: value
+        for field, value in patch.model_dump(exclude_unset=True).items()
+        if getattr(current, field) != value
+    }
+
+
+def apply_patch(schema: type[ModelT], current, changes: dict) -> ModelT:
+    """the full body the patch results in, validated like the body of a PUT
+
+    Args:
+        schema (type[BaseModel]): schema of the full body
+        current: row or object holding the current values
+        changes (dict): changed fields
+
+    Returns:
+        BaseModel: current values with the changes applied
+
+    Raises:
+        RequestValidationError: a field was set to a value the full body does not accept
+    """
+    values = {field: getattr(current, field) for field in schema.model_fields}
+    values.update(changes)
+    try:
+        return schema.model_validate(values)
+    except ValidationError as exc:
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in exc.errors()]
+        ) from exc
@@ -3,22 +3,59 @@ Schemas for persons
 """
 # pylint: disable=too-few-public-methods
 # pylint: disable=unnecessary-pass
+from typing import Optional
 from .tasks import Task
-from pydantic import BaseModel, ConfigDict
+from .rules import rule_violation
+from pydantic import BaseModel, ConfigDict, model_validator
 
-class PersonBase(BaseModel):
-    """Schema for person updates
+
+def person_rule_violation(person: "PersonFields") -> Optional[str]:
+    """first rule a person with well-formed fields breaks
+
+    Returns:
+        str: message of the rule, None if the person keeps all of them
+    """
+    if not person.name:
+        return "Person name cannot be empty!"
+    if len(person.name) > 50:
+        return "Person name is too long!"
+    return None
+
+class PersonFields(BaseModel):
+    """Fields of a person, shared by the request and response schemas
     """
     name: str
 
+class PersonBase(PersonFields):
+    """Schema for person updates, a body breaking a rule is answered with 400
+    """
+    @model_validator(mode="after")
+    def check_rules(self) -> "PersonBase":
+        violation = person_rule_violation(self)
+        if violation is not None:
+            raise rule_violation(violation)
+        return self
+
+class PersonPatch(BaseModel):
+    """Schema for partial person updates, only the fields sent are changed
+    """
+    name: str | None = None
+
 class PersonCreate(PersonBase):
     """Schema for person create
     """
     pass
 
-class Person(PersonBase):
+class PersonBulkCreate(PersonFields):
+    """Schema for an item of a bulk person create, the rules are checked per item
+    so one broken item does not reject the whole body
+    """
+    pass
+
+class Person(PersonFields):
     """Schema for Person response model
     """
     id: int
-    tasks: list[Task] = []
+    # None when the tasks were not requested with include=tasks
+    tasks: list[Task] | None = None
     model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
@@ -0,0 +1,32 @@
+"""
+Business rules of the request bodies, checked by pydantic while a body is parsed
+"""
+from fastapi import Request, status
+from fastapi.exception_handlers import request_validation_exception_handler
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, Response
+from pydantic_core import PydanticCustomError
+
+# error type of a broken rule, its message is the detail of the 400 response
+RULE_VIOLATION = "rule_violation"
+
+
+def rule_violation(message: str) -> PydanticCustomError:
+    """validation error of a broken rule, raised by the model validators
+    """
+    return PydanticCustomError(RULE_VIOLATION, message)
+
+
+async def rule_violation_handler(request: Request, exc: RequestValidationError) -> Response:
+    """answers a body that breaks a rule with 400 and the rule's message,
+    other validation errors keep FastAPI's 422 response
+
+    The model validators only run once every field parsed, so a broken rule
+    is never reported together with a malformed field.
+    """
+    for error in exc.errors():
+        if error["type"] == RULE_VIOLATION:
+            return JSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST, content={"detail": error["msg"]}
+            )
+    return await request_validation_exception_handler(request, exc)
@@ -0,0 +1,65 @@
+"""
+Fast serialization of the read responses, straight from the rows to JSON bytes
+"""
+import os
+from functools import lru_cache
+from typing import Any, Optional
+from dotenv import load_dotenv
+from fastapi import Response
+from pydantic import TypeAdapter
+
+load_dotenv()
+
+# Serialize the read responses with one pass of pydantic-core instead of letting FastAPI
+# build the response model, dump it to Python objects and encode those with json
+FAST_SERIALIZATION = os.getenv("FAST_SERIALIZATION", "false").lower() in ("1", "true", "yes")
+
+
+@lru_cache(maxsize=None)
+def response_adapter(response_schema: Any) -> TypeAdapter:
+    """type adapter of a response model, built once per model
+
+    Args:
+        response_schema: response model of the route, e.g. Page[Task]
+
+    Returns:
+        TypeAdapter: adapter validating rows by attribute and dumping them to JSON
+    """
+    return TypeAdapter(response_schema)
+
+
+def serialize_json(content, response_schema: Any) -> bytes:
+    """validates the content against the response model and dumps it to JSON bytes,
+    both in pydantic-core without building intermediate Python objects
+
+    Args:
+        content: object, row or dict to serialize
+        response_schema: response model of the route
+
+    Returns:
+        bytes: the JSON body
+    """
+    adapter = response_adapter(response_schema)
+    return adapter.dump_json(adapter.validate_python(content, from_attributes=True))
+
+
+def fast_response(content, response_schema: Any, headers: Optional[dict] = None):
+    """serializes the content with the route's response model when the fast path is on,
+    the response_model of the route still documents the body in OpenAPI
+
+    Args:
+        content: object, row or dict to serialize
+        response_schema: response model of the route
+        headers (dict): headers of the response
+
+    Returns:
+        Response: the JSON response, or the content unchanged for FastAPI
+            to serialize when FAST_SERIALIZATION is off
+    """
+    if not FAST_SERIALIZATION:
+        return content
+    return Response(
+        content=serialize_json(content, response_schema),
+        media_type="application/json",
+        headers=headers,
+    )
@@ -0,0 +1,32 @@
+"""
+Schemas for task statistics
+"""
+# pylint: disable=too-few-public-methods
+from datetime import date
+from enum import Enum
+from pydantic import BaseModel
+
+class StatsBucket(str, Enum):
+    """Width of the buckets of the date histograms
+    """
+    day = "day"
+    month = "month"
+    year = "year"
+
+class DateBucket(BaseModel):
+    """Schema for a bucket of a date histogram, start is its first day
+    """
+    start: date
+    count: int
+
+class TaskStats(BaseModel):
+    """Schema for task statistics response model,
+    overdue counts the open tasks started before overdue_before
+    """
+    total: int
+    completed: int
+    open: int
+    overdue: int
+    # tasks per startdate bucket, and completed tasks per enddate bucket
+    started: list[DateBucket]
+    finished: list[DateBucket]
@@ -4,10 +4,33 @@ Schemas for task
 # pylint: disable=too-few-public-methods
 # pylint: disable=unnecessary-pass
 from datetime import date
-from pydantic import BaseModel, ConfigDict
+from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+from .rules import rule_violation
 
-class TaskBase(BaseModel):
-    """Schema for task updates
+
+def task_rule_violation(task: "TaskFields") -> Optional[str]:
+    """first rule a task with well-formed fields breaks
+
+    Returns:
+        str: message of the rule, None if the task keeps all of them
+    """
+    if not task.name:
+        return "Task name cannot be empty!"
+    if len(task.name) > 50:
+        return "Task name is too long!"
+    if not task.startdate:
+        return "Task start date cannot be null!"
+    if len(task.description) > 100:
+        return "Task description is too long!"
+    if (task.completed and not task.enddate) or (task.enddate and not task.completed):
+        return "enddate and completed values are invalid!"
+    if task.enddate and task.startdate > task.enddate:
+        return "End date must be later than start date"
+    return None
+
+class TaskFields(BaseModel):
+    """Fields of a task, shared by the request and response schemas
     """
     name: str
     description: str
@@ -15,14 +38,49 @@ class TaskBase(BaseModel):
     startdate: date | None = None
     enddate: date | None = None
 
+class TaskBase(TaskFields):
+    """Schema for task updates, a body breaking a rule is answered with 400
+    """
+    @model_validator(mode="after")
+    def check_rules(self) -> "TaskBase":
+        violation = task_rule_violation(self)
+        if violation is not None:
+            raise rule_violation(violation)
+        return self
+
+class TaskPatch(BaseModel):
+    """Schema for partial task updates, only the fields sent are changed
+    """
+    name: str | None = None
+    description: str | None = None
+    completed: bool | None = None
+    startdate: date | None = None
+    enddate: date | None = None
+
 class TaskCreate(TaskBase):
     """Schema for task create
     """
     pass
 
-class Task(TaskBase):
+class TaskBulkCreate(TaskFields):
+    """Schema for an item of a bulk task create, the rules are checked per item
+    so one broken item does not reject the whole body
+    """
+    person_id: int
+
+class Task(TaskFields):
     """Schema for Task response model
     """
     id: int
     assigned_person_id: int
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+class TaskFilter(BaseModel):
+    """Schema for filtering the task list, fields left unset do not filter
+    """
+    person_id: int | None = Field(default=None, description="id of the assigned person")
+    completed: bool | None = None
+    start_from: date | None = Field(default=None, description="earliest startdate")
+    start_to: date | None = Field(default=None, description="latest startdate")
+    end_from: date | None = Field(default=None, description="earliest enddate")
+    end_to: date | None = Field(default=None, description="latest enddate")
\ No newline at end of file
@@ -0,0 +1,124 @@
+"""
+In-process cache of serialized entities for the services
+"""
+# pylint: disable=invalid-name
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Cache the serialized persons and tasks read by id with their ETags, entries expire
+# after the ttl so writes made by other processes are picked up. Only reads of the
+# primary are cached, with a replica configured every read goes to it
+SERVICE_CACHE_ENABLED = os.getenv("SERVICE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+SERVICE_CACHE_MAX_ENTRIES = int(os.getenv("SERVICE_CACHE_MAX_ENTRIES", "10000"))
+SERVICE_CACHE_TTL_SECONDS = float(os.getenv("SERVICE_CACHE_TTL_SECONDS", "60"))
+
+
+class EntityCache:
+    """Thread safe LRU cache whose entries expire after a time to live
+
+    Every invalidation bumps a generation counter and records it for the keys it
+    invalidated. A reader takes the generation before loading from the database
+    and passes it to set, so a value read before a concurrent write is not stored
+    after that write invalidated its key, while fills of other keys are kept.
+    """
+    def __init__(self, max_entries: int, ttl_seconds: float, enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.generation = 0
+        # generation of the last invalidation per key, oldest first, and the
+        # generation every key counts as invalidated at, raised by clear and
+        # when the oldest recorded key is forgotten
+        self._invalidated: OrderedDict = OrderedDict()
+        self._invalidated_floor = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """gets a cached value and marks it as recently used
+
+        Returns:
+            Any: the value, None if it is not cached or has expired
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, generation: int) -> None:
+        """caches a value, evicting the least recently used entries over the limit
+
+        Args:
+            generation (int): generation taken before the value was loaded,
+                the value is dropped if its key was invalidated since
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._invalidated.get(key, self._invalidated_floor) > generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *keys: Hashable) -> None:
+        with self._lock:
+            self.generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+                self._invalidated[key] = self.generation
+                self._invalidated.move_to_end(key)
+            while len(self._invalidated) > self.max_entries:
+                _, forgotten = self._invalidated.popitem(last=False)
+                self._invalidated_floor = forgotten
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._invalidated.clear()
+            self._invalidated_floor = self.generation
+
+    def status_dict(self) -> dict:
+        """current size and hit statistics of the cache
+
+        Returns:
+            dict: cache statistics
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# shared by the sync and async services, so writes from either invalidate the entries
+person_cache: EntityCache = EntityCache(
+    SERVICE_CACHE_MAX_ENTRIES, SERVICE_CACHE_TTL_SECONDS, SERVICE_CACHE_ENABLED
+)
+task_cache: EntityCache = EntityCache(
+    SERVICE_CACHE_MAX_ENTRIES, SERVICE_CACHE_TTL_SECONDS, SERVICE_CACHE_ENABLED
+)
@@ -0,0 +1,162 @@
+"""
+Relay of the notification outbox to RabbitMQ
+"""
+# pylint: disable=invalid-name
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+from dotenv import load_dotenv
+from pika.exceptions import AMQPError
+from sqlalchemy.orm import Session
+
+from ..daos.outbox_dao import OutboxDAO, outbox_dao, outbox_written
+from ..db.database import SessionLocal
+from ..rabbitmq.rabbitmq_service import RabbitMQService, rabbitmq_service
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# rows published per broker round of the relay, and how long it sleeps when the
+# outbox is empty, a commit with outbox rows wakes it up earlier
+NOTIFICATION_OUTBOX_BATCH_SIZE = int(os.getenv("NOTIFICATION_OUTBOX_BATCH_SIZE", "100"))
+NOTIFICATION_OUTBOX_POLL_SECONDS = float(os.getenv("NOTIFICATION_OUTBOX_POLL_SECONDS", "1"))
+# a claimed batch not marked sent within the lease is claimed again, by this or another relay
+NOTIFICATION_OUTBOX_LEASE_SECONDS = float(os.getenv("NOTIFICATION_OUTBOX_LEASE_SECONDS", "60"))
+# sent rows are kept this long, then deleted
+NOTIFICATION_OUTBOX_RETENTION_SECONDS = float(
+    os.getenv("NOTIFICATION_OUTBOX_RETENTION_SECONDS", "86400")
+)
+PURGE_INTERVAL_SECONDS = 60
+
+
+class OutboxRelay:
+    """Publishes the outbox rows in id order from a dedicated thread
+
+    A batch is claimed in a short transaction, published with no transaction or
+    connection held, and marked sent in a second one once the broker confirmed
+    every message of it. If the relay stops in between, the claim expires after
+    the lease and the batch is published again, so consumers get each
+    notification at least once. Relays of several processes share the outbox,
+    the rows one of them has claimed are skipped by the others.
+    """
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        rabbitmq_service_param: RabbitMQService,
+        outbox_dao_param: OutboxDAO,
+        batch_size: int = NOTIFICATION_OUTBOX_BATCH_SIZE,
+        poll_seconds: float = NOTIFICATION_OUTBOX_POLL_SECONDS,
+        retention_seconds: float = NOTIFICATION_OUTBOX_RETENTION_SECONDS,
+        lease_seconds: float = NOTIFICATION_OUTBOX_LEASE_SECONDS,
+    ):
+        self.session_factory = session_factory
+        self.rabbitmq_service = rabbitmq_service_param
+        self.outbox_dao = outbox_dao_param
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.retention_seconds = retention_seconds
+        self.lease_seconds = lease_seconds
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._last_purge = 0.0
+
+    def relay_batch(self) -> int:
+        """claims the next batch of unsent notifications, publishes it and marks it sent
+
+        Returns:
+            int: number of notifications published
+
+        Raises:
+            AMQPError: the broker did not confirm the batch, its claim is released
+                and it stays unsent, as on any other failure to publish it
+        """
+        claimed_at = datetime.utcnow()
+        with self.session_factory() as db:
+            rows = self.outbox_dao.claim_unsent(
+                db=db,
+                limit=self.batch_size,
+                claimed_at=claimed_at,
+                expired_before=claimed_at - timedelta(seconds=self.lease_seconds),
+            )
+        if not rows:
+            return 0
+        ids = [row.id for row in rows]
+        try:
+            self.rabbitmq_service.publish_batch([row.message for row in rows])
+        except Exception:
+            # the batch is claimed again at once rather than after the lease
+            with self.session_factory() as db:
+                self.outbox_dao.release_claims(db=db, ids=ids)
+            raise
+        with self.session_factory() as db:
+            self.outbox_dao.mark_sent(db=db, ids=ids, sent_at=datetime.utcnow())
+        return len(rows)
+
+    def relay_pending(self) -> int:
+        """publishes batches until the outbox has no unsent notification left
+
+        Returns:
+            int: number of notifications published
+        """
+        relayed = 0
+        while True:
+            count = self.relay_batch()
+            relayed += count
+            if count < self.batch_size:
+                return relayed
+
+    def purge_sent(self) -> int:
+        """deletes the notifications sent longer ago than the retention
+
+        Returns:
+            int: number of rows deleted
+        """
+        with self.session_factory() as db:
+            return self.outbox_dao.delete_sent(
+                db=db, before=datetime.utcnow() - timedelta(seconds=self.retention_seconds)
+            )
+
+    def start(self) -> None:
+        """starts the relay thread if it is not running
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="outbox-relay", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """stops the relay thread after the batch it is publishing, the rows
+        left unsent are published by the next relay to run, a batch claimed but
+        not marked sent once its claim expired
+        """
+        self._stopping.set()
+        outbox_written.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            outbox_written.clear()
+            try:
+                self.relay_pending()
+                if time.monotonic() - self._last_purge > PURGE_INTERVAL_SECONDS:
+                    self._last_purge = time.monotonic()
+                    self.purge_sent()
+            except (AMQPError, OSError):
+                # rejected, or the broker host is unreachable or does not resolve
+                logger.warning("Relaying the outbox failed, retrying")
+                # reconnect on the next attempt
+                self.rabbitmq_service.close()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Relaying the outbox failed, retrying")
+            outbox_written.wait(self.poll_seconds)
+
+
+# relays the outbox of the primary database, started in the app's lifespan
+outbox_relay: OutboxRelay = OutboxRelay(SessionLocal, rabbitmq_service, outbox_dao)
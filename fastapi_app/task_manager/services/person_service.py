@@ -1,48 +1,115 @@
-from typing import Optional
+from typing import AsyncIterator, Iterator, Optional
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status
 
-from ..schemas.persons import PersonCreate, PersonBase
-from ..daos.person_dao import PersonDAO, person_dao
+from ..schemas.persons import (
+    PersonCreate, PersonBase, PersonBulkCreate, PersonPatch, Person as PersonSchema,
+    person_rule_violation
+)
+from ..schemas.patch import apply_patch, changed_fields
+from ..schemas.export import ExportFormat, encode_export, encode_export_async
+from ..schemas.pagination import build_page
+from ..schemas.etag import etag_matches, format_etag, parse_etags
+from ..daos.person_dao import (
+    PersonDAO, person_dao, AsyncPersonDAO, async_person_dao, PERSON_EXPORT_COLUMNS, person_version
+)
 from ..db.models import Person
-from ..rabbitmq.rabbitmq_service import RabbitMQService
+from ..db.database import is_replica_session
+from .cache import EntityCache, person_cache, task_cache
+
+
+def validate_persons_bulk(persons: list[PersonBulkCreate]) -> tuple[list, list[dict]]:
+    """splits the items of a bulk create into the ones keeping the person rules
+    and the errors of the others, a name repeated in the batch is a duplicate
+
+    Returns:
+        tuple[list, list[dict]]: (index, person) pairs and errors
+    """
+    valid, errors, seen_names = [], [], set()
+    for index, person in enumerate(persons):
+        violation = person_rule_violation(person)
+        if violation is not None:
+            errors.append({"index": index, "detail": violation})
+            continue
+        if person.name in seen_names:
+            errors.append({"index": index, "detail": "Person with this name already registered"})
+            continue
+        seen_names.add(person.name)
+        valid.append((index, person))
+    return valid, errors
+
+
+def reject_bulk_errors(errors: list[dict], partial: bool) -> None:
+    """sorts the errors of a bulk create by item, and rejects the whole batch
+    when there are errors and the caller did not ask for partial success
+    """
+    errors.sort(key=lambda error: error["index"])
+    if errors and not partial:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=errors)
+
+
+def person_cache_keys(person_id: int) -> tuple:
+    """keys of both cached variants of a person, with and without its tasks
+    """
+    return (person_id, True), (person_id, False)
 
 
 class PersonService:
-    def __init__(self):
-        self.person_dao = PersonDAO()
-        self.rabbitmq_service = RabbitMQService('rabbitmq3')
-        self.rabbitmq_service.connect()
+    def __init__(
+        self,
+        person_dao_param: PersonDAO,
+        cache_param: EntityCache,
+    ):
+        self.person_dao = person_dao_param
+        self.cache = cache_param
 
     def create_new_person(self, person: PersonCreate, db: Session) -> Optional[Person]:
-        if not person.name:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Person name cannot be empty!",
-            )
-        if len(person.name) > 50:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Person name is too long!",
-            )
-        
-        existing_person = self.get_person_by_name(name=person.name, db=db)
-        if existing_person:
+        # the unique constraint on the name rejects duplicates, also under concurrent requests
+        try:
+            db_person: Person = self.person_dao.create_new_person(person=person, db=db)
+        except IntegrityError:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Person with this name already registered",
             )
 
-        db_person: Person = self.person_dao.create_new_person(person=person, db=db)
-
         if not db_person:
             return None
 
-        notificationMessage: str = f"PERSON CREATE: {db_person.name}"
-        self.rabbitmq_service.publish(message=notificationMessage)
-
         return db_person
 
+    def create_new_persons_bulk(
+        self, persons: list[PersonBulkCreate], partial: bool, db: Session
+    ) -> dict:
+        valid, errors = validate_persons_bulk(persons)
+        existing_names = self.person_dao.get_existing_names(
+            names=[person.name for _, person in valid], db=db
+        )
+        new_persons = []
+        for index, person in valid:
+            if person.name in existing_names:
+                errors.append({"index": index, "detail": "Person with this name already registered"})
+            else:
+                new_persons.append(person)
+        reject_bulk_errors(errors, partial)
+
+        created = 0
+        if new_persons:
+            try:
+                created = self.person_dao.create_new_persons_bulk(persons=new_persons, db=db)
+            except IntegrityError:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Person with this name already registered",
+                )
+
+        return {"created": created, "errors": errors}
+
+    def get_existing_person_ids(self, person_ids: list[int], db: Session) -> set[int]:
+        return self.person_dao.get_existing_ids(person_ids=person_ids, db=db)
+
     def get_person_by_name(self, name: str, db: Session) -> Optional[Person]:
         db_person: Person = self.person_dao.get_person_by_name(name=name, db=db)
 
@@ -51,58 +118,374 @@ class PersonService:
 
         return db_person
 
-    def get_all_persons(self, db: Session) -> Optional[list[Person]]:
-        return self.person_dao.get_all_persons(db=db)
+    def get_all_persons(
+        self,
+        db: Session,
+        cursor: Optional[int],
+        limit: int,
+        include_tasks: bool = True,
+        fields: Optional[frozenset[str]] = None,
+    ) -> dict:
+        # one extra row tells whether there is a next page
+        persons = self.person_dao.get_all_persons(
+            db=db, cursor=cursor, limit=limit + 1, include_tasks=include_tasks, fields=fields
+        )
+        return build_page(persons, limit)
+
+    def export_persons(self, db: Session, export_format: ExportFormat) -> Iterator[str]:
+        partitions = self.person_dao.stream_persons(db=db)
+        return encode_export(partitions, PERSON_EXPORT_COLUMNS, export_format)
+
+    def get_person_etag(self, person_id: int, db: Session) -> str:
+        version = self.person_dao.get_person_version(person_id=person_id, db=db)
+        if version is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Person with this id does not exist",
+            )
+        return format_etag(version)
+
+    def raise_if_modified(
+        self, person_id: int, db: Session, versions: Optional[list[tuple]]
+    ) -> None:
+        """a conditional write matched no row, tells a person with another version
+        apart from a missing one
+        """
+        if versions is not None and self.person_dao.get_person_version(
+            person_id=person_id, db=db
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail="Person was modified, its version does not match If-Match",
+            )
+
+    def get_person_by_id(
+        self,
+        person_id: int,
+        db: Session,
+        include_tasks: bool = True,
+        fields: Optional[frozenset[str]] = None,
+        if_none_match: Optional[str] = None,
+    ) -> tuple[str, Optional[Person]]:
+        """ETag and person, the person is None when If-None-Match has the ETag
 
-    def get_person_by_id(self, person_id: int, db: Session) -> Optional[Person]:
-        db_person: Person = self.person_dao.get_person_by_id(person_id=person_id, db=db)
+        A cached person is served with the ETag it was cached with, without a query.
+        Otherwise the ETag is computed from the person as it was loaded, only
+        If-None-Match costs a version lookup before it.
+        """
+        # sparse reads are not cached, the full ones are served as serialized dicts
+        cached = fields is None and self.cache.get((person_id, include_tasks))
+        if cached:
+            etag, person = cached
+            return etag, None if etag_matches(if_none_match, etag) else person
+        generation = self.cache.generation
+
+        if if_none_match is not None:
+            etag = self.get_person_etag(person_id=person_id, db=db)
+            if etag_matches(if_none_match, etag):
+                return etag, None
+        db_person: Person = self.person_dao.get_person_by_id(
+            person_id=person_id, db=db, include_tasks=include_tasks, fields=fields
+        )
         if not db_person:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Person with this id does not exist",
             )
+        etag = format_etag(person_version(db_person))
+
+        # a lagging replica would have its rows served for the whole ttl
+        if fields is None and self.cache.enabled and not is_replica_session(db):
+            person = PersonSchema.model_validate(db_person).model_dump()
+            self.cache.set((person_id, include_tasks), (etag, person), generation)
+            return etag, person
         
-        return db_person
+        return etag, db_person
 
     def update_person_by_id(
-        self, person_id: int, person_update: PersonBase, db: Session
-    ) -> Optional[Person]:
-        if not person_update.name:
+        self,
+        person_id: int,
+        person_update: PersonBase,
+        db: Session,
+        if_match: Optional[str] = None,
+    ) -> Optional[dict]:
+        versions = parse_etags(if_match)
+        try:
+            updated_person = self.person_dao.update_person_by_id(
+                person_id=person_id, person_update=person_update, db=db, versions=versions
+            )
+        except IntegrityError:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Person name cannot be empty!",
+                detail="Person with this name already registered",
+            )
+
+        if updated_person is None:
+            self.raise_if_modified(person_id=person_id, db=db, versions=versions)
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Person with this id does not exist",
+            )
+
+        self.cache.invalidate(*person_cache_keys(person_id))
+
+        return updated_person
+
+    def patch_person_by_id(
+        self, person_id: int, person_patch: PersonPatch, db: Session
+    ) -> Optional[Person | dict]:
+        # read past the cache, the patch is applied to the stored row
+        db_person = self.person_dao.get_person_by_id(
+            person_id=person_id, db=db
+        )
+        if not db_person:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Person with this id does not exist",
+            )
+
+        # nothing is written or published when the sent fields already have these values
+        changes = changed_fields(db_person, person_patch)
+        if not changes:
+            return db_person
+
+        return self.update_person_by_id(
+            person_id=person_id,
+            person_update=apply_patch(PersonBase, db_person, changes),
+            db=db,
+        )
+
+    def delete_person_by_id(
+        self, person_id: int, db: Session, if_match: Optional[str] = None
+    ) -> bool:
+        versions = parse_etags(if_match)
+        delete_success = self.person_dao.delete_person_by_id(
+            person_id=person_id, db=db, versions=versions
+        )
+        if not delete_success:
+            self.raise_if_modified(person_id=person_id, db=db, versions=versions)
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Person not found"
             )
-        if len(person_update.name) > 50:
+        
+        # the tasks of the person were deleted with it
+        self.cache.invalidate(*person_cache_keys(person_id))
+        task_cache.clear()
+
+        return delete_success
+
+
+class AsyncPersonService:
+    def __init__(
+        self,
+        person_dao_param: AsyncPersonDAO,
+        cache_param: EntityCache,
+    ):
+        self.person_dao = person_dao_param
+        self.cache = cache_param
+
+    async def create_new_person(self, person: PersonCreate, db: AsyncSession) -> Optional[Person]:
+        try:
+            db_person: Person = await self.person_dao.create_new_person(person=person, db=db)
+        except IntegrityError:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Person name is too long!",
+                detail="Person with this name already registered",
+            )
+
+        if not db_person:
+            return None
+
+        return db_person
+
+    async def create_new_persons_bulk(
+        self, persons: list[PersonBulkCreate], partial: bool, db: AsyncSession
+    ) -> dict:
+        valid, errors = validate_persons_bulk(persons)
+        existing_names = await self.person_dao.get_existing_names(
+            names=[person.name for _, person in valid], db=db
+        )
+        new_persons = []
+        for index, person in valid:
+            if person.name in existing_names:
+                errors.append({"index": index, "detail": "Person with this name already registered"})
+            else:
+                new_persons.append(person)
+        reject_bulk_errors(errors, partial)
+
+        created = 0
+        if new_persons:
+            try:
+                created = await self.person_dao.create_new_persons_bulk(persons=new_persons, db=db)
+            except IntegrityError:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Person with this name already registered",
+                )
+
+        return {"created": created, "errors": errors}
+
+    async def get_existing_person_ids(self, person_ids: list[int], db: AsyncSession) -> set[int]:
+        return await self.person_dao.get_existing_ids(person_ids=person_ids, db=db)
+
+    async def get_person_by_name(self, name: str, db: AsyncSession) -> Optional[Person]:
+        return await self.person_dao.get_person_by_name(name=name, db=db)
+
+    async def get_all_persons(
+        self,
+        db: AsyncSession,
+        cursor: Optional[int],
+        limit: int,
+        include_tasks: bool = True,
+        fields: Optional[frozenset[str]] = None,
+    ) -> dict:
+        persons = await self.person_dao.get_all_persons(
+            db=db, cursor=cursor, limit=limit + 1, include_tasks=include_tasks, fields=fields
+        )
+        return build_page(persons, limit)
+
+    def export_persons(self, db: AsyncSession, export_format: ExportFormat) -> AsyncIterator[str]:
+        partitions = self.person_dao.stream_persons(db=db)
+        return encode_export_async(partitions, PERSON_EXPORT_COLUMNS, export_format)
+
+    async def get_person_etag(self, person_id: int, db: AsyncSession) -> str:
+        version = await self.person_dao.get_person_version(person_id=person_id, db=db)
+        if version is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Person with this id does not exist",
+            )
+        return format_etag(version)
+
+    async def raise_if_modified(
+        self, person_id: int, db: AsyncSession, versions: Optional[list[tuple]]
+    ) -> None:
+        """a conditional write matched no row, tells a person with another version
+        apart from a missing one
+        """
+        if versions is not None and await self.person_dao.get_person_version(
+            person_id=person_id, db=db
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail="Person was modified, its version does not match If-Match",
             )
 
-        updated_person = self.person_dao.update_person_by_id(
-            person_id=person_id, person_update=person_update, db=db
+    async def get_person_by_id(
+        self,
+        person_id: int,
+        db: AsyncSession,
+        include_tasks: bool = True,
+        fields: Optional[frozenset[str]] = None,
+        if_none_match: Optional[str] = None,
+    ) -> tuple[str, Optional[Person]]:
+        """ETag and person, the person is None when If-None-Match has the ETag
+
+        A cached person is served with the ETag it was cached with, without a query.
+        Otherwise the ETag is computed from the person as it was loaded, only
+        If-None-Match costs a version lookup before it.
+        """
+        # sparse reads are not cached, the full ones are served as serialized dicts
+        cached = fields is None and self.cache.get((person_id, include_tasks))
+        if cached:
+            etag, person = cached
+            return etag, None if etag_matches(if_none_match, etag) else person
+        generation = self.cache.generation
+
+        if if_none_match is not None:
+            etag = await self.get_person_etag(person_id=person_id, db=db)
+            if etag_matches(if_none_match, etag):
+                return etag, None
+        db_person: Person = await self.person_dao.get_person_by_id(
+            person_id=person_id, db=db, include_tasks=include_tasks, fields=fields
         )
+        if not db_person:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Person with this id does not exist",
+            )
+        etag = format_etag(person_version(db_person))
+
+        # a lagging replica would have its rows served for the whole ttl
+        if fields is None and self.cache.enabled and not is_replica_session(db):
+            person = PersonSchema.model_validate(db_person).model_dump()
+            self.cache.set((person_id, include_tasks), (etag, person), generation)
+            return etag, person
+
+        return etag, db_person
+
+    async def update_person_by_id(
+        self,
+        person_id: int,
+        person_update: PersonBase,
+        db: AsyncSession,
+        if_match: Optional[str] = None,
+    ) -> Optional[dict]:
+        versions = parse_etags(if_match)
+        try:
+            updated_person = await self.person_dao.update_person_by_id(
+                person_id=person_id, person_update=person_update, db=db, versions=versions
+            )
+        except IntegrityError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Person with this name already registered",
+            )
 
         if updated_person is None:
+            await self.raise_if_modified(person_id=person_id, db=db, versions=versions)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Person with this id does not exist",
             )
 
-        notificationMessage: str = f"PERSON UPDATED: {updated_person.name}"
-        self.rabbitmq_service.publish(message=notificationMessage)
+        self.cache.invalidate(*person_cache_keys(person_id))
 
         return updated_person
 
-    def delete_person_by_id(self, person_id: int, db: Session) -> bool:
-        delete_success = self.person_dao.delete_person_by_id(person_id=person_id, db=db)
+    async def patch_person_by_id(
+        self, person_id: int, person_patch: PersonPatch, db: AsyncSession
+    ) -> Optional[Person | dict]:
+        # read past the cache, the patch is applied to the stored row
+        db_person = await self.person_dao.get_person_by_id(
+            person_id=person_id, db=db
+        )
+        if not db_person:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Person with this id does not exist",
+            )
+
+        changes = changed_fields(db_person, person_patch)
+        if not changes:
+            return db_person
+
+        return await self.update_person_by_id(
+            person_id=person_id,
+            person_update=apply_patch(PersonBase, db_person, changes),
+            db=db,
+        )
+
+    async def delete_person_by_id(
+        self, person_id: int, db: AsyncSession, if_match: Optional[str] = None
+    ) -> bool:
+        versions = parse_etags(if_match)
+        delete_success = await self.person_dao.delete_person_by_id(
+            person_id=person_id, db=db, versions=versions
+        )
         if not delete_success:
+            await self.raise_if_modified(person_id=person_id, db=db, versions=versions)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Person not found"
             )
-        
-        notificationMessage: str = f"PERSON (ID: {person_id}) DELETED"
-        self.rabbitmq_service.publish(message=notificationMessage)
+
+        # the tasks of the person were deleted with it
+        self.cache.invalidate(*person_cache_keys(person_id))
+        task_cache.clear()
 
         return delete_success
 
-person_service: PersonService = PersonService()
+person_service: PersonService = PersonService(person_dao, person_cache)
+async_person_service: AsyncPersonService = AsyncPersonService(
+    async_person_dao, person_cache
+)
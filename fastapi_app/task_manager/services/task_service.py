@@ -1,156 +1,722 @@
-from typing import Optional
+import csv
+import json
+import logging
+import time
+from typing import AsyncIterator, Callable, Iterable, Iterator, Optional, Union
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status
 
-from ..schemas.tasks import TaskCreate, TaskBase
-from ..daos.task_dao import TaskDAO, task_dao
+from ..schemas.tasks import (
+    TaskCreate, TaskBase, TaskBulkCreate, TaskFilter, TaskPatch, Task as TaskSchema,
+    task_rule_violation
+)
+from ..schemas.patch import apply_patch, changed_fields
+from ..schemas.export import ExportFormat, encode_export, encode_export_async
+from ..schemas.imports import IMPORT_MAX_ERRORS, ImportFormat
+from ..schemas.bulk import BULK_CHUNK_SIZE
+from ..schemas.stats import StatsBucket
+from ..schemas.pagination import build_offset_page, build_page
+from ..schemas.notifications import tasks_imported
+from ..schemas.etag import etag_matches, format_etag, parse_etags
+from ..daos.task_dao import (
+    TaskDAO, task_dao, AsyncTaskDAO, async_task_dao, TASK_EXPORT_COLUMNS, is_missing_person_error
+)
 from ..db.models import Person, Task
-from ..services.person_service import person_service
-from ..rabbitmq.rabbitmq_service import RabbitMQService
-from datetime import datetime
+from ..db.database import is_replica_session
+from ..services.person_service import (
+    person_service, async_person_service, person_cache_keys, reject_bulk_errors
+)
+from ..services.cache import EntityCache, person_cache, task_cache
+from datetime import date
+
+logger = logging.getLogger(__name__)
+
+
+def validate_tasks_bulk(tasks: list[TaskBulkCreate]) -> tuple[list, list[dict]]:
+    """splits the items of a bulk create into the ones keeping the task rules
+    and the errors of the others
+
+    Returns:
+        tuple[list, list[dict]]: (index, task) pairs and errors
+    """
+    valid, errors = [], []
+    for index, task in enumerate(tasks):
+        violation = task_rule_violation(task)
+        if violation is not None:
+            errors.append({"index": index, "detail": violation})
+            continue
+        valid.append((index, task))
+    return valid, errors
+
+
+def read_import_records(
+    lines: Iterable[str], import_format: ImportFormat
+) -> Iterator[tuple[int, Union[dict, str]]]:
+    """reads the records of an import file one at a time
+
+    Yields:
+        tuple[int, dict | str]: line number and record, or line number and
+            error detail for a line that cannot be parsed
+    """
+    if import_format is ImportFormat.csv:
+        reader = csv.DictReader(lines)
+        for row in reader:
+            # empty cells are missing values, cells without a header are dropped
+            yield reader.line_num, {
+                key: value or None for key, value in row.items() if key is not None
+            }
+        return
+
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_number, "Invalid JSON"
+            continue
+        if not isinstance(record, dict):
+            yield line_number, "Expected a JSON object"
+            continue
+        yield line_number, record
+
+
+def validate_import_record(record: dict) -> TaskBulkCreate:
+    """checks a record of an import file with the rules of create_new_task,
+    files exported from /tasks/export name the person assigned_person_id
+
+    Raises:
+        ValueError: the record is not a valid task, with the reason as message
+    """
+    if "person_id" not in record and "assigned_person_id" in record:
+        record = {**record, "person_id": record["assigned_person_id"]}
+    try:
+        task = TaskBulkCreate.model_validate(record)
+    except ValidationError as exc:
+        raise ValueError("; ".join(
+            f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}"
+            for error in exc.errors()
+        )) from exc
+    violation = task_rule_violation(task)
+    if violation is not None:
+        raise ValueError(violation)
+    return task
+
+
+def add_import_error(result: dict, line: int, detail: str) -> None:
+    result["failed"] += 1
+    if len(result["errors"]) < IMPORT_MAX_ERRORS:
+        result["errors"].append({"line": line, "detail": detail})
+
+
+def invalidate_task_persons(tasks: list[TaskBulkCreate]) -> None:
+    """drops the cached persons that tasks were just added to
+    """
+    for person_id in {task.person_id for task in tasks}:
+        person_cache.invalidate(*person_cache_keys(person_id))
 
 
 class TaskService:
-    def __init__(self, task_dao_param: TaskDAO):
+    def __init__(
+        self,
+        task_dao_param: TaskDAO,
+        cache_param: EntityCache,
+    ):
         self.task_dao = task_dao_param
-        self.rabbitmq_service = RabbitMQService('rabbitmq3')
-        self.rabbitmq_service.connect()
+        self.cache = cache_param
+
+    def invalidate_task(self, task_id: int, person_id: int) -> None:
+        """drops the cached task and the cached person that lists it
+        """
+        self.cache.invalidate(task_id)
+        person_cache.invalidate(*person_cache_keys(person_id))
 
     def create_new_task(
         self, task: TaskCreate, person_id: int, db: Session
     ) -> Optional[Task]:
-        if not task.name:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST, detail="Task name cannot be empty!"
+        # the foreign key proves the person exists, no SELECT is sent before the INSERT
+        try:
+            db_task: Task = self.task_dao.create_new_task(
+                task=task, person_id=person_id, db=db
             )
-        if len(task.name) > 50:
+        except IntegrityError as error:
+            if not is_missing_person_error(error):
+                raise
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST, detail="Task name is too long!"
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Person with this id does not exist",
             )
-        if not task.startdate:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Task start date cannot be null!",
+
+        if not db_task:
+            return None
+        self.invalidate_task(db_task.id, person_id)
+
+        return db_task
+
+    def create_new_tasks_bulk(
+        self, tasks: list[TaskBulkCreate], partial: bool, db: Session
+    ) -> dict:
+        valid, errors = validate_tasks_bulk(tasks)
+        existing_person_ids = person_service.get_existing_person_ids(
+            person_ids=list({task.person_id for _, task in valid}), db=db
+        )
+        new_tasks = []
+        for index, task in valid:
+            if task.person_id in existing_person_ids:
+                new_tasks.append(task)
+            else:
+                errors.append({"index": index, "detail": "Person with this id does not exist"})
+        reject_bulk_errors(errors, partial)
+
+        created = 0
+        if new_tasks:
+            try:
+                created = self.task_dao.create_new_tasks_bulk(tasks=new_tasks, db=db)
+            except IntegrityError as error:
+                # a person was deleted after the check
+                if not is_missing_person_error(error):
+                    raise
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Person with this id does not exist",
+                )
+
+            invalidate_task_persons(new_tasks)
+
+        return {"created": created, "errors": errors}
+
+    def import_tasks(
+        self,
+        lines: Iterable[str],
+        import_format: ImportFormat,
+        db: Session,
+        progress: Optional[Callable[[dict], None]] = None,
+    ) -> dict:
+        """imports the tasks of a file read line by line, valid records are inserted
+        in multi-row batches of BULK_CHUNK_SIZE, each committed on its own
+
+        Args:
+            lines (Iterable[str]): lines of the file, consumed as they are read
+            import_format (ImportFormat): ndjson or csv with a header line
+            db (Session): local db session
+            progress (Callable[[dict], None]): called with the running result after each batch
+
+        Returns:
+            dict: tasks created and failed, errors per line and throughput
+        """
+        result = {"created": 0, "failed": 0, "errors": [], "seconds": 0.0, "rows_per_second": 0.0}
+        start = time.perf_counter()
+        batch = []
+
+        def flush():
+            self.import_tasks_batch(batch=batch, result=result, db=db)
+            batch.clear()
+            result["seconds"] = time.perf_counter() - start
+            result["rows_per_second"] = (
+                (result["created"] + result["failed"]) / result["seconds"]
             )
-        if len(task.description) > 100:
+            if progress is not None:
+                progress(result)
+
+        for line, record in read_import_records(lines, import_format):
+            if isinstance(record, str):
+                add_import_error(result, line, record)
+                continue
+            try:
+                batch.append((line, validate_import_record(record)))
+            except ValueError as exc:
+                add_import_error(result, line, str(exc))
+                continue
+            if len(batch) == BULK_CHUNK_SIZE:
+                flush()
+        flush()
+
+        return result
+
+    def import_tasks_batch(
+        self, batch: list[tuple[int, TaskBulkCreate]], result: dict, db: Session
+    ) -> None:
+        existing_person_ids = person_service.get_existing_person_ids(
+            person_ids=list({task.person_id for _, task in batch}), db=db
+        )
+        new_tasks = []
+        for line, task in batch:
+            if task.person_id in existing_person_ids:
+                new_tasks.append((line, task))
+            else:
+                add_import_error(result, line, "Person with this id does not exist")
+        if not new_tasks:
+            return
+
+        try:
+            result["created"] += self.task_dao.create_new_tasks_bulk(
+                tasks=[task for _, task in new_tasks], db=db, notification=tasks_imported
+            )
+        except IntegrityError as error:
+            # a person was deleted after the check, the batch was rolled back
+            if not is_missing_person_error(error):
+                raise
+            for line, _ in new_tasks:
+                add_import_error(result, line, "Person with this id does not exist")
+        else:
+            invalidate_task_persons([task for _, task in new_tasks])
+        logger.info(
+            "task import: %d created, %d failed", result["created"], result["failed"]
+        )
+
+    def get_all_tasks(
+        self,
+        db: Session,
+        cursor: Optional[int],
+        limit: int,
+        filters: Optional[TaskFilter] = None,
+        fields: Optional[frozenset[str]] = None,
+    ) -> dict:
+        # one extra row tells whether there is a next page
+        tasks = self.task_dao.get_all_tasks(
+            db=db, cursor=cursor, limit=limit + 1, filters=filters, fields=fields
+        )
+        return build_page(tasks, limit)
+
+    def search_tasks(
+        self, db: Session, q: str, cursor: Optional[int], limit: int
+    ) -> dict:
+        offset = cursor or 0
+        tasks = self.task_dao.search_tasks(db=db, q=q, offset=offset, limit=limit + 1)
+        return build_offset_page(tasks, offset, limit)
+
+    def get_task_stats(
+        self,
+        db: Session,
+        filters: TaskFilter,
+        bucket: StatsBucket,
+        overdue_before: Optional[date] = None,
+    ) -> dict:
+        return self.task_dao.get_task_stats(
+            db=db, filters=filters, bucket=bucket, overdue_before=overdue_before or date.today()
+        )
+
+    def get_person_task_stats(
+        self,
+        person_id: int,
+        db: Session,
+        bucket: StatsBucket,
+        overdue_before: Optional[date] = None,
+    ) -> dict:
+        # the version lookup alone tells whether the person exists
+        person_service.get_person_etag(person_id=person_id, db=db)
+        return self.get_task_stats(
+            db=db,
+            filters=TaskFilter(person_id=person_id),
+            bucket=bucket,
+            overdue_before=overdue_before,
+        )
+
+    def export_tasks(
+        self, db: Session, export_format: ExportFormat, filters: Optional[TaskFilter] = None
+    ) -> Iterator[str]:
+        partitions = self.task_dao.stream_tasks(db=db, filters=filters)
+        return encode_export(partitions, TASK_EXPORT_COLUMNS, export_format)
+
+    def get_task_etag(self, task_id: int, db: Session) -> str:
+        version = self.task_dao.get_task_version(task_id=task_id, db=db)
+        if version is None:
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Task description is too long!",
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Task with this id does not exist",
             )
-        if (task.completed and not task.enddate) or (task.enddate and not task.completed):
+        return format_etag(version)
+
+    def raise_if_modified(
+        self, task_id: int, db: Session, versions: Optional[list[tuple]]
+    ) -> None:
+        """a conditional write matched no row, tells a task with another version
+        apart from a missing one
+        """
+        if versions is not None and self.task_dao.get_task_version(task_id=task_id, db=db):
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="enddate and completed values are invalid!",
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail="Task was modified, its version does not match If-Match",
             )
-        db_person = person_service.get_person_by_id(db=db, person_id=person_id) # if exception not raised here, means person exists
 
-        try:
-            start_date = datetime.strptime(str(task.startdate), "%Y-%m-%d")
-            if task.enddate:
-                end_date = datetime.strptime(str(task.enddate), "%Y-%m-%d")
-                if start_date > end_date:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail="End date must be later than start date",
-                    )
-        except ValueError:
+    def get_task_by_id(
+        self,
+        task_id: int,
+        db: Session,
+        fields: Optional[frozenset[str]] = None,
+        if_none_match: Optional[str] = None,
+    ) -> tuple[str, Optional[Task]]:
+        """ETag and task, the task is None when If-None-Match has the ETag
+
+        A cached task is served with the ETag it was cached with, without a query.
+        Otherwise the ETag is computed from the task as it was loaded, only
+        If-None-Match costs a version lookup before it.
+        """
+        # sparse reads are not cached, the full ones are served as serialized dicts
+        cached = fields is None and self.cache.get(task_id)
+        if cached:
+            etag, task = cached
+            return etag, None if etag_matches(if_none_match, etag) else task
+        generation = self.cache.generation
+
+        if if_none_match is not None:
+            etag = self.get_task_etag(task_id=task_id, db=db)
+            if etag_matches(if_none_match, etag):
+                return etag, None
+        db_task: Task = self.task_dao.get_task_by_id(task_id=task_id, db=db, fields=fields)
+        if not db_task:
             raise HTTPException(
-                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                detail="Invalid date format. Use YYYY-MM-DD format for dates.",
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Task with this id does not exist",
             )
-        db_task: Task = self.task_dao.create_new_task(
-            task=task, person_id=person_id, db=db
+        etag = format_etag((db_task.version,))
+
+        # a lagging replica would have its rows served for the whole ttl
+        if fields is None and self.cache.enabled and not is_replica_session(db):
+            task = TaskSchema.model_validate(db_task).model_dump()
+            self.cache.set(task_id, (etag, task), generation)
+            return etag, task
+        return etag, db_task
+
+    def update_task_by_id(
+        self,
+        task_id: int,
+        task_update: TaskBase,
+        db: Session,
+        if_match: Optional[str] = None,
+    ) -> Optional[dict]:
+        versions = parse_etags(if_match)
+        updated_task = self.task_dao.update_task_by_id(
+            task_id=task_id, task_update=task_update, db=db, versions=versions
         )
+        if updated_task is None:
+            self.raise_if_modified(task_id=task_id, db=db, versions=versions)
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Task with this id does not exist",
+            )
+        
+        self.invalidate_task(task_id, updated_task["assigned_person_id"])
 
+        return updated_task
+    
+    def patch_task_by_id(
+        self, task_id: int, task_patch: TaskPatch, db: Session
+    ) -> Optional[Task]:
+        # read past the cache, the patch is applied to the stored row
+        db_task = self.task_dao.get_task_by_id(task_id=task_id, db=db)
         if not db_task:
-            return None
-        
-        notificationMessage: str = f"TASK CREATE: {db_task.name}, PERSON ASSIGNED: {db_task.assigned_person}"
-        self.rabbitmq_service.publish(message=notificationMessage)
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Task with this id does not exist",
+            )
 
-        return db_task
+        # nothing is written or published when the sent fields already have these values
+        changes = changed_fields(db_task, task_patch)
+        if not changes:
+            return db_task
 
-    def get_all_tasks(self, db: Session) -> Optional[list[Task]]:
-        return self.task_dao.get_all_tasks(db=db)
+        # the rules are checked on the body the patch results in
+        apply_patch(TaskBase, db_task, changes)
 
-    def get_task_by_id(self, task_id: int, db: Session) -> Optional[Task]:
-        db_task: Task = self.task_dao.get_task_by_id(task_id=task_id, db=db)
-        if not db_task:
+        # a task written since it was read fails the version guard rather than
+        # replacing values the rules were not checked against
+        if not self.task_dao.patch_task_by_id(
+            task_id=task_id, changes=changes, db=db, version=db_task.version
+        ):
+            if self.task_dao.get_task_version(task_id=task_id, db=db):
+                raise HTTPException(
+                    status_code=status.HTTP_412_PRECONDITION_FAILED,
+                    detail="Task was modified while it was patched",
+                )
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Task with this id does not exist",
             )
+
+        self.invalidate_task(task_id, db_task.assigned_person_id)
+
         return db_task
 
-    def update_task_by_id(
-        self, task_id: int, task_update: TaskBase, db: Session
-    ) -> Optional[Person]:
-        if not task_update.name:
+    def delete_task_by_id(
+        self, task_id: int, db: Session, if_match: Optional[str] = None
+    ) -> bool:
+        versions = parse_etags(if_match)
+        deleted_task = self.task_dao.delete_task_by_id(
+            task_id=task_id, db=db, versions=versions
+        )
+        if deleted_task is None:
+            self.raise_if_modified(task_id=task_id, db=db, versions=versions)
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST, detail="Task name cannot be empty!"
+                status_code=status.HTTP_404_NOT_FOUND, detail="Task not found"
             )
-        if len(task_update.name) > 50:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST, detail="Task name is too long!"
+        self.invalidate_task(task_id, deleted_task.assigned_person_id)
+
+        return True
+
+
+class AsyncTaskService:
+    def __init__(
+        self,
+        task_dao_param: AsyncTaskDAO,
+        cache_param: EntityCache,
+    ):
+        self.task_dao = task_dao_param
+        self.cache = cache_param
+
+    def invalidate_task(self, task_id: int, person_id: int) -> None:
+        """drops the cached task and the cached person that lists it
+        """
+        self.cache.invalidate(task_id)
+        person_cache.invalidate(*person_cache_keys(person_id))
+
+    async def create_new_task(
+        self, task: TaskCreate, person_id: int, db: AsyncSession
+    ) -> Optional[Task]:
+        # the foreign key proves the person exists, no SELECT is sent before the INSERT
+        try:
+            db_task: Task = await self.task_dao.create_new_task(
+                task=task, person_id=person_id, db=db
             )
-        if not task_update.startdate:
+        except IntegrityError as error:
+            if not is_missing_person_error(error):
+                raise
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Task start date cannot be null!",
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Person with this id does not exist",
             )
-        if len(task_update.description) > 100:
+
+        if not db_task:
+            return None
+        self.invalidate_task(db_task.id, person_id)
+
+        return db_task
+
+    async def create_new_tasks_bulk(
+        self, tasks: list[TaskBulkCreate], partial: bool, db: AsyncSession
+    ) -> dict:
+        valid, errors = validate_tasks_bulk(tasks)
+        existing_person_ids = await async_person_service.get_existing_person_ids(
+            person_ids=list({task.person_id for _, task in valid}), db=db
+        )
+        new_tasks = []
+        for index, task in valid:
+            if task.person_id in existing_person_ids:
+                new_tasks.append(task)
+            else:
+                errors.append({"index": index, "detail": "Person with this id does not exist"})
+        reject_bulk_errors(errors, partial)
+
+        created = 0
+        if new_tasks:
+            try:
+                created = await self.task_dao.create_new_tasks_bulk(tasks=new_tasks, db=db)
+            except IntegrityError as error:
+                # a person was deleted after the check
+                if not is_missing_person_error(error):
+                    raise
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Person with this id does not exist",
+                )
+
+            invalidate_task_persons(new_tasks)
+
+        return {"created": created, "errors": errors}
+
+    async def get_all_tasks(
+        self,
+        db: AsyncSession,
+        cursor: Optional[int],
+        limit: int,
+        filters: Optional[TaskFilter] = None,
+        fields: Optional[frozenset[str]] = None,
+    ) -> dict:
+        tasks = await self.task_dao.get_all_tasks(
+            db=db, cursor=cursor, limit=limit + 1, filters=filters, fields=fields
+        )
+        return build_page(tasks, limit)
+
+    async def search_tasks(
+        self, db: AsyncSession, q: str, cursor: Optional[int], limit: int
+    ) -> dict:
+        offset = cursor or 0
+        tasks = await self.task_dao.search_tasks(db=db, q=q, offset=offset, limit=limit + 1)
+        return build_offset_page(tasks, offset, limit)
+
+    async def get_task_stats(
+        self,
+        db: AsyncSession,
+        filters: TaskFilter,
+        bucket: StatsBucket,
+        overdue_before: Optional[date] = None,
+    ) -> dict:
+        return await self.task_dao.get_task_stats(
+            db=db, filters=filters, bucket=bucket, overdue_before=overdue_before or date.today()
+        )
+
+    async def get_person_task_stats(
+        self,
+        person_id: int,
+        db: AsyncSession,
+        bucket: StatsBucket,
+        overdue_before: Optional[date] = None,
+    ) -> dict:
+        # the version lookup alone tells whether the person exists
+        await async_person_service.get_person_etag(person_id=person_id, db=db)
+        return await self.get_task_stats(
+            db=db,
+            filters=TaskFilter(person_id=person_id),
+            bucket=bucket,
+            overdue_before=overdue_before,
+        )
+
+    def export_tasks(
+        self, db: AsyncSession, export_format: ExportFormat, filters: Optional[TaskFilter] = None
+    ) -> AsyncIterator[str]:
+        partitions = self.task_dao.stream_tasks(db=db, filters=filters)
+        return encode_export_async(partitions, TASK_EXPORT_COLUMNS, export_format)
+
+    async def get_task_etag(self, task_id: int, db: AsyncSession) -> str:
+        version = await self.task_dao.get_task_version(task_id=task_id, db=db)
+        if version is None:
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Task description is too long!",
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Task with this id does not exist",
             )
-        if (task_update.completed and not task_update.enddate) or (
-            task_update.enddate and not task_update.completed
-        ):
+        return format_etag(version)
+
+    async def raise_if_modified(
+        self, task_id: int, db: AsyncSession, versions: Optional[list[tuple]]
+    ) -> None:
+        """a conditional write matched no row, tells a task with another version
+        apart from a missing one
+        """
+        if versions is not None and await self.task_dao.get_task_version(task_id=task_id, db=db):
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="enddate and completed values are invalid!",
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail="Task was modified, its version does not match If-Match",
             )
 
-        try:
-            start_date = datetime.strptime(str(task_update.startdate), "%Y-%m-%d")
-            if task_update.enddate:
-                end_date = datetime.strptime(str(task_update.enddate), "%Y-%m-%d")
-                if start_date > end_date:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail="End date must be later than start date",
-                    )
-        except ValueError:
+    async def get_task_by_id(
+        self,
+        task_id: int,
+        db: AsyncSession,
+        fields: Optional[frozenset[str]] = None,
+        if_none_match: Optional[str] = None,
+    ) -> tuple[str, Optional[Task]]:
+        """ETag and task, the task is None when If-None-Match has the ETag
+
+        A cached task is served with the ETag it was cached with, without a query.
+        Otherwise the ETag is computed from the task as it was loaded, only
+        If-None-Match costs a version lookup before it.
+        """
+        # sparse reads are not cached, the full ones are served as serialized dicts
+        cached = fields is None and self.cache.get(task_id)
+        if cached:
+            etag, task = cached
+            return etag, None if etag_matches(if_none_match, etag) else task
+        generation = self.cache.generation
+
+        if if_none_match is not None:
+            etag = await self.get_task_etag(task_id=task_id, db=db)
+            if etag_matches(if_none_match, etag):
+                return etag, None
+        db_task: Task = await self.task_dao.get_task_by_id(task_id=task_id, db=db, fields=fields)
+        if not db_task:
             raise HTTPException(
-                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                detail="Invalid date format. Use YYYY-MM-DD format for dates.",
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Task with this id does not exist",
             )
-        
-        updated_task = self.task_dao.update_task_by_id(
-            task_id=task_id, task_update=task_update, db=db
+        etag = format_etag((db_task.version,))
+
+        # a lagging replica would have its rows served for the whole ttl
+        if fields is None and self.cache.enabled and not is_replica_session(db):
+            task = TaskSchema.model_validate(db_task).model_dump()
+            self.cache.set(task_id, (etag, task), generation)
+            return etag, task
+        return etag, db_task
+
+    async def update_task_by_id(
+        self,
+        task_id: int,
+        task_update: TaskBase,
+        db: AsyncSession,
+        if_match: Optional[str] = None,
+    ) -> Optional[dict]:
+        versions = parse_etags(if_match)
+        updated_task = await self.task_dao.update_task_by_id(
+            task_id=task_id, task_update=task_update, db=db, versions=versions
         )
         if updated_task is None:
+            await self.raise_if_modified(task_id=task_id, db=db, versions=versions)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Task with this id does not exist",
             )
-        
-        notificationMessage: str = f"TASK UPDATED: {updated_task.name}, PERSON ASSIGNED: {updated_task.assigned_person}"
-        self.rabbitmq_service.publish(message=notificationMessage)
+
+        self.invalidate_task(task_id, updated_task["assigned_person_id"])
 
         return updated_task
-    
-    def delete_task_by_id(self, task_id: int, db: Session) -> bool:
-        delete_success = self.task_dao.delete_task_by_id(task_id=task_id, db=db)
-        if not delete_success:
+
+    async def patch_task_by_id(
+        self, task_id: int, task_patch: TaskPatch, db: AsyncSession
+    ) -> Optional[Task]:
+        # read past the cache, the patch is applied to the stored row
+        db_task = await self.task_dao.get_task_by_id(task_id=task_id, db=db)
+        if not db_task:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Task with this id does not exist",
+            )
+
+        changes = changed_fields(db_task, task_patch)
+        if not changes:
+            return db_task
+
+        # the rules are checked on the body the patch results in
+        apply_patch(TaskBase, db_task, changes)
+
+        # a task written since it was read fails the version guard rather than
+        # replacing values the rules were not checked against
+        if not await self.task_dao.patch_task_by_id(
+            task_id=task_id, changes=changes, db=db, version=db_task.version
+        ):
+            if await self.task_dao.get_task_version(task_id=task_id, db=db):
+                raise HTTPException(
+                    status_code=status.HTTP_412_PRECONDITION_FAILED,
+                    detail="Task was modified while it was patched",
+                )
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Task with this id does not exist",
+            )
+
+        self.invalidate_task(task_id, db_task.assigned_person_id)
+
+        return db_task
+
+    async def delete_task_by_id(
+        self, task_id: int, db: AsyncSession, if_match: Optional[str] = None
+    ) -> bool:
+        versions = parse_etags(if_match)
+        deleted_task = await self.task_dao.delete_task_by_id(
+            task_id=task_id, db=db, versions=versions
+        )
+        if deleted_task is None:
+            await self.raise_if_modified(task_id=task_id, db=db, versions=versions)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Task not found"
             )
-        
-        notificationMessage: str = f"TASK ID {task_id} DELETED"
-        self.rabbitmq_service.publish(message=notificationMessage)
+        self.invalidate_task(task_id, deleted_task.assigned_person_id)
 
-        return delete_success
+        return True
 
 
-task_service: TaskService = TaskService(task_dao)
+task_service: TaskService = TaskService(task_dao, task_cache)
+async_task_service: AsyncTaskService = AsyncTaskService(
+    async_task_dao, task_cache
+)
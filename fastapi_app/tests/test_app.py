@@ -1,12 +1,41 @@
+import asyncio
+import csv
+import io
+import json
 import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from unittest import mock
+import pika
+from pika.adapters.blocking_connection import BlockingConnection
+from pika.exceptions import AMQPError, NackError
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
 import pytest
+from fastapi import FastAPI
+from fastapi.exceptions import RequestValidationError
 from fastapi.testclient import TestClient
-from task_manager.main import app
-from task_manager.db.database import get_db
-from task_manager.db.models import Base
+from task_manager.main import app, create_app
+from task_manager.async_routes import router as async_router
+from task_manager.schemas.rules import rule_violation_handler
+from task_manager.schemas import serialization
+from task_manager.daos import outbox_dao
+from task_manager.daos.task_dao import task_dao
+from task_manager.db import database
+from task_manager.db.database import get_db, get_read_db, get_async_db, get_async_read_db
+from task_manager.rabbitmq.rabbitmq_service import rabbitmq_service
+from task_manager.rabbitmq.background_publisher import (
+    BackgroundPublisher, BackpressurePolicy, notification_publisher
+)
+from task_manager.services.cache import EntityCache, person_cache, task_cache
+from task_manager.services.outbox_relay import OutboxRelay
+from task_manager.db.models import Base, OutboxMessage, Person, Task
 
 # constants
 PERSONS_ENDPOINT = "/persons"
@@ -29,10 +58,29 @@ DATABASE_USERNAME = os.getenv("DATABASE_USERNAME")
 DATABASE_PASSWORD = os.getenv("DATABASE_PASSWORD")
 DATABASE_HOST = os.getenv("DATABASE_HOST")
 TEST_DATABASE = os.getenv("TEST_DATABASE")
+TEST_REPLICA_DATABASE = os.getenv("TEST_REPLICA_DATABASE")
 TEST_DATABASE_URL = f"mysql+pymysql://{DATABASE_USERNAME}:{DATABASE_PASSWORD}@{DATABASE_HOST}/{TEST_DATABASE}"
+TEST_ASYNC_DATABASE_URL = f"mysql+aiomysql://{DATABASE_USERNAME}:{DATABASE_PASSWORD}@{DATABASE_HOST}/{TEST_DATABASE}"
+
+TEST_REPLICA_DATABASE_URL = f"mysql+pymysql://{DATABASE_USERNAME}:{DATABASE_PASSWORD}@{DATABASE_HOST}/{TEST_REPLICA_DATABASE}"
 
 test_engine = create_engine(TEST_DATABASE_URL)
-TestSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=test_engine)
+TestSessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, expire_on_commit=False, bind=test_engine
+)
+
+# separate database standing in for the read replica, without replication
+test_replica_engine = create_engine(TEST_REPLICA_DATABASE_URL)
+TestReplicaSessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, expire_on_commit=False, bind=test_replica_engine,
+    info={"replica": True},
+)
+
+# TestClient runs every request in a fresh event loop, so async connections are not pooled
+test_async_engine = create_async_engine(TEST_ASYNC_DATABASE_URL, poolclass=NullPool)
+TestAsyncSessionLocal = async_sessionmaker(
+    bind=test_async_engine, autoflush=False, expire_on_commit=False
+)
 
 
 def override_get_db():
@@ -46,11 +94,72 @@ def override_get_db():
         db.close()
 
 
-# overwriting dependency in the endpoint routes to use test database
+def override_get_replica_db():
+    """
+    gets local session in test replica database, used for testing read routing
+    """
+    try:
+        db = TestReplicaSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+
+def outbox_messages() -> list[str]:
+    """
+    notifications written to the outbox of the test database, oldest first
+    """
+    with TestSessionLocal() as session:
+        return list(session.scalars(select(OutboxMessage.message).order_by(OutboxMessage.id)))
+
+
+class FakeBroker:
+    """
+    in-process stand-in for the RabbitMQ service of the outbox relay,
+    nacks the next publish_batch calls when told to and records how many
+    connections of the test database were checked out while publishing
+    """
+    def __init__(self):
+        self.messages = []
+        self.nacks = 0
+        self.closed = 0
+        self.checked_out = []
+
+    def publish_batch(self, messages):
+        self.checked_out.append(test_engine.pool.checkedout())
+        if self.nacks:
+            self.nacks -= 1
+            raise NackError(messages)
+        self.messages.extend(messages)
+
+    def close(self):
+        self.closed += 1
+
+
+async def override_get_async_db():
+    """
+    gets local async session in test database, used for testing the async endpoints
+    """
+    async with TestAsyncSessionLocal() as db:
+        yield db
+
+
+# overwriting dependency in the endpoint routes to use test database,
+# reads go to the same database unless a test routes them to the replica
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_read_db] = override_get_db
 
 client = TestClient(app)
 
+# app serving the async variant of the crud endpoints
+async_app = FastAPI()
+async_app.include_router(async_router)
+async_app.add_exception_handler(RequestValidationError, rule_violation_handler)
+async_app.dependency_overrides[get_async_db] = override_get_async_db
+async_app.dependency_overrides[get_async_read_db] = override_get_async_db
+
+async_client = TestClient(async_app)
+
 
 @pytest.fixture(scope="function")
 def db():
@@ -60,6 +169,23 @@ def db():
     Base.metadata.create_all(bind=test_engine)
     yield
     Base.metadata.drop_all(bind=test_engine)
+    # ids are reused once the tables are recreated
+    person_cache.clear()
+    task_cache.clear()
+
+
+@pytest.fixture(scope="function")
+def replica_db():
+    """
+    Fixture to route the read-only endpoints to the test replica database
+    """
+    Base.metadata.create_all(bind=test_replica_engine)
+    app.dependency_overrides[get_read_db] = override_get_replica_db
+    yield
+    app.dependency_overrides[get_read_db] = override_get_db
+    Base.metadata.drop_all(bind=test_replica_engine)
+    person_cache.clear()
+    task_cache.clear()
 
 
 @pytest.mark.parametrize(
@@ -125,7 +251,8 @@ def test_get_all_persons(db):
     response = client.get(f"{PERSONS_ENDPOINT}/")
     assert response.status_code == 200
     persons = response.json()
-    assert persons == []
+    assert persons["items"] == []
+    assert persons["next_cursor"] is None
 
     test_person_data = [{"name": PERSON_NAME_JOHN}, {"name": PERSON_NAME_ALICE}]
     for person_data in test_person_data:
@@ -134,7 +261,7 @@ def test_get_all_persons(db):
 
     read_response = client.get(f"{PERSONS_ENDPOINT}/")
     assert read_response.status_code == 200
-    all_persons = read_response.json()
+    all_persons = read_response.json()["items"]
     name_to_id = {person["name"]: person["id"] for person in all_persons}
 
     for person_data in test_person_data:
@@ -184,12 +311,38 @@ def test_update_person_by_id_valid(db):
     assert response_create_person.status_code == 201
     created_person = response_create_person.json()
     assert created_person["name"] == PERSON_NAME_JOHN
-    response_update_person = client.put(
-        f'{PERSONS_ENDPOINT}/{created_person["id"]}', json=test_person_update_data
-    )
+    created_task = client.post(
+        TASKS_ENDPOINT,
+        json={
+            "name": TASK_ONE_NAME,
+            "description": DESCRIPTION_ONE,
+            "completed": False,
+            "startdate": "2023-09-06",
+            "enddate": None,
+        },
+        params={"person_id": created_person["id"]},
+    ).json()
+
+    statements = []
+
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(test_engine, "before_cursor_execute", record_statement)
+    try:
+        response_update_person = client.put(
+            f'{PERSONS_ENDPOINT}/{created_person["id"]}', json=test_person_update_data
+        )
+    finally:
+        event.remove(test_engine, "before_cursor_execute", record_statement)
     assert response_update_person.status_code == 200
     updated_person = response_update_person.json()
     assert updated_person["name"] == test_person_update_data["name"]
+    assert updated_person["id"] == created_person["id"]
+    assert [task["id"] for task in updated_person["tasks"]] == [created_task["id"]]
+    # the person is not read back, only its tasks are selected after the update
+    selects = [statement for statement in statements if statement.startswith("SELECT")]
+    assert len(selects) == 1 and "FROM tasks" in selects[0]
 
 
 @pytest.mark.parametrize(
@@ -484,7 +637,8 @@ def test_get_all_tasks(db):
     response = client.get(f"{TASKS_ENDPOINT}/")
     assert response.status_code == 200
     tasks = response.json()
-    assert tasks == []
+    assert tasks["items"] == []
+    assert tasks["next_cursor"] is None
 
     test_person_data = {"name": PERSON_NAME_JOHN}
     response_create_person = client.post(PERSONS_ENDPOINT, json=test_person_data)
@@ -515,7 +669,7 @@ def test_get_all_tasks(db):
 
     read_response = client.get(f"{TASKS_ENDPOINT}/")
     assert read_response.status_code == 200
-    all_tasks = read_response.json()
+    all_tasks = read_response.json()["items"]
     name_to_id = {task["name"]: task["id"] for task in all_tasks}
 
     for task_data in test_task_data:
@@ -648,6 +802,7 @@ def test_update_task_by_id_valid(db, update_task_data):
     assert updated_task["completed"] == update_task_data["completed"]
     assert updated_task["startdate"] == update_task_data["startdate"]
     assert updated_task["enddate"] == update_task_data["enddate"]
+    assert updated_task["assigned_person_id"] == created_person["id"]
 
 
 @pytest.mark.parametrize(
@@ -908,6 +1063,1243 @@ def test_delete_task_by_id_not_found(db):
     assert response_delete_task_id_not_found.status_code == 404
 
 
+
+def test_get_pool_metrics(db):
+    """
+    test connection pool metrics endpoint, the engine only exists while the app is running,
+    the app starts even though the broker host does not resolve
+    """
+    assert database.engine is None
+    # the lifespan builds its engines on the test database, not on the one of the app
+    with (
+        mock.patch.object(database, "DATABASE_URL", TEST_DATABASE_URL),
+        mock.patch.object(database, "ASYNC_DATABASE_URL", TEST_ASYNC_DATABASE_URL),
+        mock.patch.object(database, "DATABASE_REPLICA_HOST", None),
+        mock.patch.object(pika, "BlockingConnection", BlockingConnection),
+        mock.patch.object(rabbitmq_service, "rabbitmq_url", "rabbitmq.invalid"),
+        TestClient(create_app()) as lifespan_client,
+    ):
+        response = lifespan_client.get("/metrics/pool")
+        assert response.status_code == 200
+        pool_status = response.json()
+        for key in ("checked_out", "overflow", "avg_wait_seconds", "timeouts"):
+            assert key in pool_status
+        assert pool_status["timeouts"] == 0
+    assert database.engine is None
+    assert not rabbitmq_service.is_connected
+
+
+def test_async_crud_endpoints(db):
+    """
+    test the async variant of the person and task endpoints
+    """
+    response_create_person = async_client.post(PERSONS_ENDPOINT, json={"name": PERSON_NAME_JOHN})
+    assert response_create_person.status_code == 201
+    created_person = response_create_person.json()
+    assert created_person["tasks"] == []
+
+    response_duplicate_person = async_client.post(PERSONS_ENDPOINT, json={"name": PERSON_NAME_JOHN})
+    assert response_duplicate_person.status_code == 400
+
+    test_task_data = {
+        "name": TASK_ONE_NAME,
+        "description": DESCRIPTION_ONE,
+        "completed": False,
+        "startdate": "2023-09-06",
+        "enddate": None,
+    }
+    response_create_task = async_client.post(
+        TASKS_ENDPOINT, json=test_task_data, params={"person_id": created_person["id"]}
+    )
+    assert response_create_task.status_code == 201
+    created_task = response_create_task.json()
+
+    response_get_persons = async_client.get(PERSONS_ENDPOINT, params={"limit": 1})
+    assert response_get_persons.status_code == 200
+    assert [person["id"] for person in response_get_persons.json()["items"]] == [created_person["id"]]
+
+    response_get_person = async_client.get(f"{PERSONS_ENDPOINT}/{created_person['id']}")
+    assert response_get_person.status_code == 200
+    assert [task["id"] for task in response_get_person.json()["tasks"]] == [created_task["id"]]
+
+    test_task_data.update({"completed": True, "enddate": "2023-09-15"})
+    response_update_task = async_client.put(
+        f"{TASKS_ENDPOINT}/{created_task['id']}", json=test_task_data
+    )
+    assert response_update_task.status_code == 200
+    assert response_update_task.json()["completed"] is True
+
+    response_delete_person = async_client.delete(f"{PERSONS_ENDPOINT}/{created_person['id']}")
+    assert response_delete_person.status_code == 204
+
+    response_get_task = async_client.get(f"{TASKS_ENDPOINT}/{created_task['id']}")
+    assert response_get_task.status_code == 404
+
+
+def test_read_endpoints_use_replica(db, replica_db):
+    """
+    test reads are served from the replica while writes and
+    read-after-write stay on the primary
+    """
+    response_create_person = client.post(PERSONS_ENDPOINT, json={"name": PERSON_NAME_JOHN})
+    assert response_create_person.status_code == 201
+    created_person = response_create_person.json()
+
+    # nothing is replicated, so the replica does not see the new person yet
+    assert client.get(PERSONS_ENDPOINT).json()["items"] == []
+    assert client.get(f"{PERSONS_ENDPOINT}/{created_person['id']}").status_code == 404
+
+    # creating a task checks the person on the primary
+    test_task_data = {
+        "name": TASK_ONE_NAME,
+        "description": DESCRIPTION_ONE,
+        "completed": False,
+        "startdate": "2023-09-06",
+        "enddate": None,
+    }
+    response_create_task = client.post(
+        TASKS_ENDPOINT, json=test_task_data, params={"person_id": created_person["id"]}
+    )
+    assert response_create_task.status_code == 201
+
+    replica_session = TestReplicaSessionLocal()
+    replica_session.add(Person(id=created_person["id"], name=PERSON_NAME_ALICE))
+    replica_session.commit()
+    replica_session.close()
+
+    response_get_person = client.get(f"{PERSONS_ENDPOINT}/{created_person['id']}")
+    assert response_get_person.status_code == 200
+    assert response_get_person.json()["name"] == PERSON_NAME_ALICE
+    assert response_get_person.json()["tasks"] == []
+    # what the replica serves may lag behind the primary, it is not cached
+    assert person_cache.status_dict()["entries"] == 0
+
+    response_update_person = client.put(
+        f"{PERSONS_ENDPOINT}/{created_person['id']}", json={"name": PERSON_NAME_ALICE}
+    )
+    assert response_update_person.status_code == 200
+    assert len(response_update_person.json()["tasks"]) == 1
+
+
+def test_update_person_by_id_invalid_duplicate_name(db):
+    """
+    test update person to a name that is already registered
+    """
+    for person_name in (PERSON_NAME_JOHN, PERSON_NAME_ALICE):
+        response_create_person = client.post(PERSONS_ENDPOINT, json={"name": person_name})
+        assert response_create_person.status_code == 201
+    created_person = response_create_person.json()
+
+    response_update_person = client.put(
+        f'{PERSONS_ENDPOINT}/{created_person["id"]}', json={"name": PERSON_NAME_JOHN}
+    )
+    assert response_update_person.status_code == 400
+    assert response_update_person.json()["detail"] == "Person with this name already registered"
+
+    # the session is usable again after the failed write
+    response_get_person = client.get(f'{PERSONS_ENDPOINT}/{created_person["id"]}')
+    assert response_get_person.json()["name"] == PERSON_NAME_ALICE
+
+
+def test_get_all_persons_pagination(db):
+    """
+    test keyset pagination of persons and tasks
+    """
+    for i in range(5):
+        response_create_person = client.post(PERSONS_ENDPOINT, json={"name": f"Person {i}"})
+        assert response_create_person.status_code == 201
+        response_create_task = client.post(
+            TASKS_ENDPOINT,
+            json={
+                "name": f"Task {i}",
+                "description": DESCRIPTION_ONE,
+                "completed": False,
+                "startdate": "2023-09-06",
+                "enddate": None,
+            },
+            params={"person_id": response_create_person.json()["id"]},
+        )
+        assert response_create_task.status_code == 201
+
+    for endpoint in (PERSONS_ENDPOINT, TASKS_ENDPOINT):
+        pages = []
+        params = {"limit": 2}
+        while True:
+            response = client.get(endpoint, params=params)
+            assert response.status_code == 200
+            page = response.json()
+            assert page["limit"] == 2
+            pages.append([item["id"] for item in page["items"]])
+            if page["next_cursor"] is None:
+                break
+            params["cursor"] = page["next_cursor"]
+        assert pages == [[1, 2], [3, 4], [5]]
+
+    assert client.get(PERSONS_ENDPOINT, params={"limit": 0}).status_code == 422
+
+
+def test_get_all_tasks_filtered(db):
+    """
+    test filtering tasks by person, completion state and date ranges
+    """
+    person_ids = []
+    for person_name in (PERSON_NAME_JOHN, PERSON_NAME_ALICE):
+        response_create_person = client.post(PERSONS_ENDPOINT, json={"name": person_name})
+        assert response_create_person.status_code == 201
+        person_ids.append(response_create_person.json()["id"])
+
+    test_task_data = [
+        (person_ids[0], {"completed": True, "startdate": "2023-09-01", "enddate": "2023-09-05"}),
+        (person_ids[0], {"completed": False, "startdate": "2023-09-10", "enddate": None}),
+        (person_ids[1], {"completed": True, "startdate": "2023-09-03", "enddate": "2023-09-20"}),
+        (person_ids[1], {"completed": False, "startdate": "2023-10-01", "enddate": None}),
+    ]
+    for person_id, task_data in test_task_data:
+        response_create_task = client.post(
+            TASKS_ENDPOINT,
+            json={"name": TASK_ONE_NAME, "description": DESCRIPTION_ONE, **task_data},
+            params={"person_id": person_id},
+        )
+        assert response_create_task.status_code == 201
+
+    def filtered_task_ids(**params):
+        response = client.get(TASKS_ENDPOINT, params=params)
+        assert response.status_code == 200
+        return [task["id"] for task in response.json()["items"]]
+
+    assert filtered_task_ids(person_id=person_ids[0]) == [1, 2]
+    assert filtered_task_ids(completed=True) == [1, 3]
+    assert filtered_task_ids(person_id=person_ids[1], completed=False) == [4]
+    assert filtered_task_ids(start_from="2023-09-03", start_to="2023-09-10") == [2, 3]
+    assert filtered_task_ids(end_from="2023-09-06") == [3]
+    assert filtered_task_ids(end_to="2023-09-05", person_id=person_ids[1]) == []
+    assert client.get(TASKS_ENDPOINT, params={"start_from": "not a date"}).status_code == 422
+
+
+def test_get_persons_include_tasks(db):
+    """
+    test persons embed their tasks by default and skip them with an empty include
+    """
+    response_create_person = client.post(PERSONS_ENDPOINT, json={"name": PERSON_NAME_JOHN})
+    assert response_create_person.status_code == 201
+    created_person = response_create_person.json()
+    response_create_task = client.post(
+        TASKS_ENDPOINT,
+        json={
+            "name": TASK_ONE_NAME,
+            "description": DESCRIPTION_ONE,
+            "completed": False,
+            "startdate": "2023-09-06",
+            "enddate": None,
+        },
+        params={"person_id": created_person["id"]},
+    )
+    assert response_create_task.status_code == 201
+
+    persons = client.get(PERSONS_ENDPOINT).json()["items"]
+    assert [task["name"] for task in persons[0]["tasks"]] == [TASK_ONE_NAME]
+    person = client.get(f"{PERSONS_ENDPOINT}/{created_person['id']}").json()
+    assert [task["name"] for task in person["tasks"]] == [TASK_ONE_NAME]
+
+    persons = client.get(PERSONS_ENDPOINT, params={"include": ""}).json()["items"]
+    assert persons == [{"name": PERSON_NAME_JOHN, "id": created_person["id"], "tasks": None}]
+    response_get_person = client.get(
+        f"{PERSONS_ENDPOINT}/{created_person['id']}", params={"include": ""}
+    )
+    assert response_get_person.json()["tasks"] is None
+
+    assert client.get(PERSONS_ENDPOINT, params={"include": "owner"}).status_code == 422
+
+
+def test_create_persons_and_tasks_bulk(db):
+    """
+    test bulk create, rejecting the whole batch or creating the valid items with partial
+    """
+    response_create_person = client.post(PERSONS_ENDPOINT, json={"name": PERSON_NAME_JOHN})
+    assert response_create_person.status_code == 201
+
+    test_person_data = [
+        {"name": PERSON_NAME_ALICE},
+        {"name": PERSON_NAME_JOHN},
+        {"name": ""},
+        {"name": "Bob"},
+        {"name": "Bob"},
+    ]
+    response_bulk = client.post(f"{PERSONS_ENDPOINT}/bulk", json=test_person_data)
+    assert response_bulk.status_code == 400
+    assert [error["index"] for error in response_bulk.json()["detail"]] == [1, 2, 4]
+    assert len(client.get(PERSONS_ENDPOINT).json()["items"]) == 1
+
+    response_bulk = client.post(
+        f"{PERSONS_ENDPOINT}/bulk", json=test_person_data, params={"partial": True}
+    )
+    assert response_bulk.status_code == 201
+    result = response_bulk.json()
+    assert result["created"] == 2
+    assert result["errors"] == [
+        {"index": 1, "detail": "Person with this name already registered"},
+        {"index": 2, "detail": "Person name cannot be empty!"},
+        {"index": 4, "detail": "Person with this name already registered"},
+    ]
+    persons = client.get(PERSONS_ENDPOINT).json()["items"]
+    assert [person["name"] for person in persons] == [PERSON_NAME_JOHN, PERSON_NAME_ALICE, "Bob"]
+
+    test_task_data = [
+        {"name": TASK_ONE_NAME, "description": DESCRIPTION_ONE, "completed": False,
+         "startdate": "2023-09-06", "enddate": None, "person_id": 1},
+        {"name": TASK_TWO_NAME, "description": DESCRIPTION_TWO, "completed": True,
+         "startdate": "2023-09-06", "enddate": "2023-09-01", "person_id": 2},
+        {"name": TASK_TWO_NAME, "description": DESCRIPTION_TWO, "completed": False,
+         "startdate": "2023-09-06", "enddate": None, "person_id": 69},
+        {"name": TASK_TWO_NAME, "description": DESCRIPTION_TWO, "completed": True,
+         "startdate": "2023-09-06", "enddate": "2023-09-08", "person_id": 3},
+    ]
+    response_bulk = client.post(f"{TASKS_ENDPOINT}/bulk", json=test_task_data)
+    assert response_bulk.status_code == 400
+    assert [error["index"] for error in response_bulk.json()["detail"]] == [1, 2]
+
+    response_bulk = client.post(
+        f"{TASKS_ENDPOINT}/bulk", json=test_task_data, params={"partial": True}
+    )
+    assert response_bulk.status_code == 201
+    assert response_bulk.json()["created"] == 2
+    tasks = client.get(TASKS_ENDPOINT).json()["items"]
+    assert [task["assigned_person_id"] for task in tasks] == [1, 3]
+
+
+
+
+def test_patch_task_by_id(db):
+    """
+    test patch task writes only the changed columns,
+    and neither writes nor publishes when nothing changes
+    """
+    response_create_person = client.post(PERSONS_ENDPOINT, json={"name": PERSON_NAME_JOHN})
+    created_person = response_create_person.json()
+    test_task_data = {
+        "name": TASK_ONE_NAME,
+        "description": DESCRIPTION_ONE,
+        "completed": False,
+        "startdate": "2023-09-06",
+        "enddate": None,
+    }
+    created_task = client.post(
+        TASKS_ENDPOINT, json=test_task_data, params={"person_id": created_person["id"]}
+    ).json()
+
+    updates = []
+
+    def record_update(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("UPDATE"):
+            updates.append(statement)
+
+    notifications = len(outbox_messages())
+    event.listen(test_engine, "before_cursor_execute", record_update)
+    try:
+        response_patch_task = client.patch(
+            f"{TASKS_ENDPOINT}/{created_task['id']}",
+            json={"completed": True, "enddate": "2023-09-15", "name": TASK_ONE_NAME},
+        )
+        assert response_patch_task.status_code == 200
+        assert response_patch_task.json() == {
+            **test_task_data,
+            "completed": True,
+            "enddate": "2023-09-15",
+            "id": created_task["id"],
+            "assigned_person_id": created_person["id"],
+        }
+        assert len(updates) == 1
+        assert "name" not in updates[0] and "description" not in updates[0]
+        assert len(outbox_messages()) == notifications + 1
+
+        response_patch_task = client.patch(
+            f"{TASKS_ENDPOINT}/{created_task['id']}", json={"completed": True}
+        )
+        assert response_patch_task.status_code == 200
+        assert len(updates) == 1
+        assert len(outbox_messages()) == notifications + 1
+    finally:
+        event.remove(test_engine, "before_cursor_execute", record_update)
+
+    # the merged task is validated like the body of a PUT
+    response_patch_task = client.patch(
+        f"{TASKS_ENDPOINT}/{created_task['id']}", json={"enddate": None}
+    )
+    assert response_patch_task.status_code == 400
+    response_patch_task = client.patch(
+        f"{TASKS_ENDPOINT}/{created_task['id']}", json={"description": None}
+    )
+    assert response_patch_task.status_code == 422
+    assert client.patch(f"{TASKS_ENDPOINT}/69", json={}).status_code == 404
+
+
+def test_patch_person_by_id(db):
+    """
+    test patch person, an unchanged name is neither written nor published
+    """
+    created_person = client.post(PERSONS_ENDPOINT, json={"name": PERSON_NAME_JOHN}).json()
+
+    response_patch_person = client.patch(
+        f"{PERSONS_ENDPOINT}/{created_person['id']}", json={"name": PERSON_NAME_JOHN}
+    )
+    assert response_patch_person.status_code == 200
+    assert response_patch_person.json()["name"] == PERSON_NAME_JOHN
+    assert outbox_messages() == [f"PERSON CREATE: {PERSON_NAME_JOHN}"]
+
+    response_patch_person = client.patch(
+        f"{PERSONS_ENDPOINT}/{created_person['id']}", json={"name": PERSON_NAME_ALICE}
+    )
+    assert response_patch_person.status_code == 200
+    assert response_patch_person.json()["name"] == PERSON_NAME_ALICE
+    assert outbox_messages()[-1] == f"PERSON UPDATED: {PERSON_NAME_ALICE}"
+
+    assert client.patch(f"{PERSONS_ENDPOINT}/69", json={}).status_code == 404
+
+
+
+
+def test_export_tasks_and_persons(db):
+    """
+    test exports stream every row as NDJSON or CSV
+    """
+    created_person = client.post(PERSONS_ENDPOINT, json={"name": PERSON_NAME_JOHN}).json()
+    test_task_data = [
+        {
+            "name": TASK_ONE_NAME,
+            "description": DESCRIPTION_ONE,
+            "completed": True,
+            "startdate": "2023-09-06",
+            "enddate": "2023-09-10",
+        },
+        {
+            "name": TASK_TWO_NAME,
+            "description": DESCRIPTION_TWO,
+            "completed": False,
+            "startdate": "2023-09-08",
+            "enddate": None,
+        },
+    ]
+    for task_data in test_task_data:
+        response_create_task = client.post(
+            TASKS_ENDPOINT, json=task_data, params={"person_id": created_person["id"]}
+        )
+        assert response_create_task.status_code == 201
+
+    response_export_tasks = client.get(f"{TASKS_ENDPOINT}/export")
+    assert response_export_tasks.status_code == 200
+    assert response_export_tasks.headers["content-type"] == "application/x-ndjson"
+    exported_tasks = [json.loads(line) for line in response_export_tasks.text.splitlines()]
+    assert [{key: task[key] for key in test_task_data[0]} for task in exported_tasks] == test_task_data
+    assert {task["assigned_person_id"] for task in exported_tasks} == {created_person["id"]}
+
+    response_export_tasks = client.get(
+        f"{TASKS_ENDPOINT}/export", params={"format": "csv", "completed": False}
+    )
+    assert response_export_tasks.status_code == 200
+    assert response_export_tasks.headers["content-type"].startswith("text/csv")
+    exported_tasks = list(csv.DictReader(io.StringIO(response_export_tasks.text)))
+    assert [task["name"] for task in exported_tasks] == [TASK_TWO_NAME]
+
+    response_export_persons = client.get(f"{PERSONS_ENDPOINT}/export", params={"format": "csv"})
+    assert response_export_persons.status_code == 200
+    assert response_export_persons.text.splitlines() == ["id,name", f"{created_person['id']},{PERSON_NAME_JOHN}"]
+
+    assert client.get(f"{PERSONS_ENDPOINT}/export", params={"format": "xml"}).status_code == 422
+
+
+
+
+def test_import_tasks(db):
+    """
+    test import of a CSV and an NDJSON file, invalid lines are reported by line number
+    """
+    created_person = client.post(PERSONS_ENDPOINT, json={"name": PERSON_NAME_JOHN}).json()
+    person_id = created_person["id"]
+    csv_file = (
+        "name,description,completed,startdate,enddate,person_id\n"
+        f"{TASK_ONE_NAME},{DESCRIPTION_ONE},true,2023-09-06,2023-09-10,{person_id}\n"
+        f"{TASK_TWO_NAME},{DESCRIPTION_TWO},false,2023-09-08,,{person_id}\n"
+        f"{TASK_TWO_NAME},{DESCRIPTION_TWO},true,2023-09-08,,{person_id}\n"
+        f"{TASK_TWO_NAME},{DESCRIPTION_TWO},false,2023-09-08,,69\n"
+    )
+    response_import = client.post(
+        f"{TASKS_ENDPOINT}/import", params={"format": "csv"}, content=csv_file
+    )
+    assert response_import.status_code == 200
+    result = response_import.json()
+    assert result["created"] == 2
+    assert result["failed"] == 2
+    assert result["errors"] == [
+        {"line": 4, "detail": "enddate and completed values are invalid!"},
+        {"line": 5, "detail": "Person with this id does not exist"},
+    ]
+
+    # a file exported from /tasks/export imports as is
+    response_export = client.get(f"{TASKS_ENDPOINT}/export")
+    response_import = client.post(
+        f"{TASKS_ENDPOINT}/import", content=response_export.text + "not json\n"
+    )
+    assert response_import.status_code == 200
+    assert response_import.json()["created"] == 2
+    assert response_import.json()["errors"] == [{"line": 3, "detail": "Invalid JSON"}]
+
+    # only "\n" ends a line, JSON strings may hold U+2028 or NEL unescaped
+    record = {
+        "name": TASK_ONE_NAME, "description": "first\u2028second\x85third", "completed": False,
+        "startdate": "2023-09-06", "enddate": None, "person_id": person_id,
+    }
+    response_import = client.post(
+        f"{TASKS_ENDPOINT}/import", content=json.dumps(record, ensure_ascii=False).encode() + b"\n"
+    )
+    assert response_import.json()["created"] == 1
+    assert response_import.json()["errors"] == []
+
+    response_get_person = client.get(f"{PERSONS_ENDPOINT}/{person_id}")
+    assert len(response_get_person.json()["tasks"]) == 5
+
+
+
+
+def test_get_task_and_person_stats(db):
+    """
+    test task statistics are counted per completion state and date bucket
+    """
+    person_ids = [
+        client.post(PERSONS_ENDPOINT, json={"name": name}).json()["id"]
+        for name in (PERSON_NAME_JOHN, PERSON_NAME_ALICE)
+    ]
+    test_task_data = [
+        (person_ids[0], True, "2023-08-20", "2023-09-02"),
+        (person_ids[0], False, "2023-09-06", None),
+        (person_ids[0], False, "2023-10-01", None),
+        (person_ids[1], True, "2023-09-08", "2023-09-10"),
+    ]
+    for person_id, completed, startdate, enddate in test_task_data:
+        response_create_task = client.post(
+            TASKS_ENDPOINT,
+            json={
+                "name": TASK_ONE_NAME,
+                "description": DESCRIPTION_ONE,
+                "completed": completed,
+                "startdate": startdate,
+                "enddate": enddate,
+            },
+            params={"person_id": person_id},
+        )
+        assert response_create_task.status_code == 201
+
+    response_stats = client.get(f"{TASKS_ENDPOINT}/stats", params={"overdue_before": "2023-09-15"})
+    assert response_stats.status_code == 200
+    assert response_stats.json() == {
+        "total": 4,
+        "completed": 2,
+        "open": 2,
+        "overdue": 1,
+        "started": [
+            {"start": "2023-08-01", "count": 1},
+            {"start": "2023-09-01", "count": 2},
+            {"start": "2023-10-01", "count": 1},
+        ],
+        "finished": [{"start": "2023-09-01", "count": 2}],
+    }
+
+    response_stats = client.get(
+        f"{PERSONS_ENDPOINT}/{person_ids[0]}/stats", params={"bucket": "year"}
+    )
+    assert response_stats.status_code == 200
+    stats = response_stats.json()
+    assert (stats["total"], stats["completed"], stats["open"]) == (3, 1, 2)
+    assert stats["started"] == [{"start": "2023-01-01", "count": 3}]
+
+    assert client.get(f"{PERSONS_ENDPOINT}/69/stats").status_code == 404
+
+
+
+
+def test_search_tasks(db):
+    """
+    test search finds tasks by keywords in name or description, most relevant first
+    """
+    created_person = client.post(PERSONS_ENDPOINT, json={"name": PERSON_NAME_JOHN}).json()
+    test_task_data = [
+        ("Release notes", "write the release notes"),
+        ("Database backup", "verify the nightly job"),
+        ("Backup restore", "restore the backup on staging to check the backup"),
+        ("Frontend review", "review the login page"),
+    ]
+    task_ids = []
+    for name, description in test_task_data:
+        response_create_task = client.post(
+            TASKS_ENDPOINT,
+            json={"name": name, "description": description, "completed": False, "startdate": "2023-09-06"},
+            params={"person_id": created_person["id"]},
+        )
+        task_ids.append(response_create_task.json()["id"])
+
+    response_search = client.get(f"{TASKS_ENDPOINT}/search", params={"q": "backup"})
+    assert response_search.status_code == 200
+    assert [task["id"] for task in response_search.json()["items"]] == [task_ids[2], task_ids[1]]
+
+    response_search = client.get(f"{TASKS_ENDPOINT}/search", params={"q": "backup", "limit": 1})
+    assert [task["id"] for task in response_search.json()["items"]] == [task_ids[2]]
+    response_search = client.get(
+        f"{TASKS_ENDPOINT}/search",
+        params={"q": "backup", "limit": 1, "cursor": response_search.json()["next_cursor"]},
+    )
+    assert [task["id"] for task in response_search.json()["items"]] == [task_ids[1]]
+    assert response_search.json()["next_cursor"] is None
+
+    # updated and deleted tasks leave the search results
+    client.put(
+        f"{TASKS_ENDPOINT}/{task_ids[1]}",
+        json={"name": "Database vacuum", "description": "vacuum", "completed": False, "startdate": "2023-09-06"},
+    )
+    client.delete(f"{TASKS_ENDPOINT}/{task_ids[2]}")
+    response_search = client.get(f"{TASKS_ENDPOINT}/search", params={"q": "backup"})
+    assert response_search.json()["items"] == []
+
+    assert client.get(f"{TASKS_ENDPOINT}/search", params={"q": ""}).status_code == 422
+
+
+
+
+def test_get_tasks_and_persons_sparse_fields(db):
+    """
+    test fields= only returns the fields asked for
+    """
+    created_person = client.post(PERSONS_ENDPOINT, json={"name": PERSON_NAME_JOHN}).json()
+    created_task = client.post(
+        TASKS_ENDPOINT,
+        json={"name": TASK_ONE_NAME, "description": DESCRIPTION_ONE, "completed": False, "startdate": "2023-09-06"},
+        params={"person_id": created_person["id"]},
+    ).json()
+
+    response_get_tasks = client.get(TASKS_ENDPOINT, params={"fields": "id,name", "limit": 1})
+    assert response_get_tasks.status_code == 200
+    assert response_get_tasks.json()["items"] == [{"id": created_task["id"], "name": TASK_ONE_NAME}]
+
+    response_get_task = client.get(f"{TASKS_ENDPOINT}/{created_task['id']}", params={"fields": "completed"})
+    assert response_get_task.json() == {"completed": False}
+
+    response_get_persons = client.get(PERSONS_ENDPOINT, params={"fields": "name"})
+    assert response_get_persons.json()["items"] == [{"name": PERSON_NAME_JOHN}]
+
+    response_get_person = client.get(
+        f"{PERSONS_ENDPOINT}/{created_person['id']}", params={"fields": "id,tasks"}
+    )
+    assert response_get_person.json() == {"id": created_person["id"], "tasks": [created_task]}
+
+    response_get_tasks = client.get(TASKS_ENDPOINT, params={"fields": "id,secret"})
+    assert response_get_tasks.status_code == 400
+    assert response_get_tasks.json()["detail"] == "Unknown fields: secret"
+    assert client.get(f"{TASKS_ENDPOINT}/69", params={"fields": "id"}).status_code == 404
+
+
+def test_get_task_and_person_served_from_cache(db):
+    """
+    test reads by id are served from the cache and the writes of the services invalidate it
+    """
+    created_person = client.post(PERSONS_ENDPOINT, json={"name": PERSON_NAME_JOHN}).json()
+    task_data = {"name": TASK_ONE_NAME, "description": DESCRIPTION_ONE, "completed": False, "startdate": "2023-09-06"}
+    created_task = client.post(
+        TASKS_ENDPOINT, json=task_data, params={"person_id": created_person["id"]}
+    ).json()
+    task_endpoint = f"{TASKS_ENDPOINT}/{created_task['id']}"
+    person_endpoint = f"{PERSONS_ENDPOINT}/{created_person['id']}"
+
+    assert client.get(task_endpoint).json() == created_task
+    assert client.get(person_endpoint).json()["tasks"] == [created_task]
+    hits = task_cache.hits
+
+    # a write that bypasses the services is not seen until the entry is invalidated
+    with TestSessionLocal() as session:
+        session.execute(Task.__table__.update().values(name=TASK_TWO_NAME))
+        session.commit()
+    assert client.get(task_endpoint).json()["name"] == TASK_ONE_NAME
+    assert task_cache.hits == hits + 1
+
+    response_update = client.put(task_endpoint, json={**task_data, "completed": True, "enddate": "2023-09-07"})
+    assert response_update.status_code == 200
+    assert client.get(task_endpoint).json()["completed"] is True
+    assert client.get(person_endpoint).json()["tasks"][0]["completed"] is True
+
+    assert client.delete(task_endpoint).status_code == 204
+    assert client.get(task_endpoint).status_code == 404
+    assert client.get(person_endpoint).json()["tasks"] == []
+
+    response_metrics = client.get("/metrics/cache")
+    assert response_metrics.status_code == 200
+    assert response_metrics.json()["tasks"]["hits"] == task_cache.hits
+    assert response_metrics.json()["persons"]["enabled"] is True
+
+    person_cache.enabled = False
+    try:
+        client.put(person_endpoint, json={"name": PERSON_NAME_ALICE})
+        lookups = person_cache.hits + person_cache.misses
+        assert client.get(person_endpoint).json()["name"] == PERSON_NAME_ALICE
+        assert person_cache.hits + person_cache.misses == lookups
+    finally:
+        person_cache.enabled = True
+
+
+def test_cache_drops_only_fills_of_invalidated_keys():
+    """
+    test a value loaded before an invalidation of its key is not cached,
+    while the invalidation of another key keeps it
+    """
+    cache = EntityCache(max_entries=2, ttl_seconds=60)
+    generation = cache.generation
+    cache.invalidate(2)
+    cache.set(1, "first", generation)
+    assert cache.get(1) == "first"
+
+    generation = cache.generation
+    cache.invalidate(1)
+    cache.set(1, "stale", generation)
+    assert cache.get(1) is None
+
+    generation = cache.generation
+    cache.clear()
+    cache.set(3, "stale", generation)
+    assert cache.get(3) is None
+
+    # keys forgotten over the limit count as invalidated for the fills in flight
+    generation = cache.generation
+    cache.invalidate(4, 5, 6)
+    cache.set(7, "stale", generation)
+    assert cache.get(7) is None
+    cache.set(7, "fresh", cache.generation)
+    assert cache.get(7) == "fresh"
+
+
+def test_conditional_get_and_if_match(db):
+    """
+    test GET sends an ETag, If-None-Match answers 304 from the cache or a
+    version-only lookup and If-Match rejects writes to a task or person that changed since it was read
+    """
+    created_person = client.post(PERSONS_ENDPOINT, json={"name": PERSON_NAME_JOHN}).json()
+    task_data = {"name": TASK_ONE_NAME, "description": DESCRIPTION_ONE, "completed": False, "startdate": "2023-09-06"}
+    created_task = client.post(
+        TASKS_ENDPOINT, json=task_data, params={"person_id": created_person["id"]}
+    ).json()
+    task_endpoint = f"{TASKS_ENDPOINT}/{created_task['id']}"
+    person_endpoint = f"{PERSONS_ENDPOINT}/{created_person['id']}"
+
+    response_get_task = client.get(task_endpoint)
+    task_etag = response_get_task.headers["ETag"]
+    assert task_etag == '"1"'
+    person_etag = client.get(person_endpoint).headers["ETag"]
+    assert client.get(task_endpoint, params={"fields": "name"}).headers["ETag"] == task_etag
+
+    statements = []
+
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(test_engine, "before_cursor_execute", record_statement)
+    try:
+        # the task is cached with its ETag by the first GET, no query is sent
+        response_not_modified = client.get(task_endpoint, headers={"If-None-Match": task_etag})
+        assert response_not_modified.status_code == 304
+        assert statements == []
+        assert client.get(task_endpoint).json()["name"] == TASK_ONE_NAME
+        assert statements == []
+
+        task_cache.clear()
+        response_not_modified = client.get(task_endpoint, headers={"If-None-Match": task_etag})
+    finally:
+        event.remove(test_engine, "before_cursor_execute", record_statement)
+    assert response_not_modified.status_code == 304
+    assert response_not_modified.headers["ETag"] == task_etag
+    assert response_not_modified.content == b""
+    assert len(statements) == 1 and "description" not in statements[0]
+    assert client.get(person_endpoint, headers={"If-None-Match": person_etag}).status_code == 304
+
+    updated_data = {**task_data, "name": TASK_TWO_NAME}
+    response_stale_update = client.put(task_endpoint, json=updated_data, headers={"If-Match": '"0"'})
+    assert response_stale_update.status_code == 412
+    response_update = client.put(task_endpoint, json=updated_data, headers={"If-Match": task_etag})
+    assert response_update.status_code == 200
+    assert client.get(task_endpoint).headers["ETag"] == '"2"'
+    assert client.get(task_endpoint, headers={"If-None-Match": task_etag}).json()["name"] == TASK_TWO_NAME
+
+    # the person is served with its tasks, so a task write changes its ETag
+    assert client.get(person_endpoint, headers={"If-None-Match": person_etag}).status_code == 200
+    response_stale_delete = client.delete(person_endpoint, headers={"If-Match": person_etag})
+    assert response_stale_delete.status_code == 412
+    assert client.put(person_endpoint, json={"name": PERSON_NAME_ALICE}, headers={"If-Match": person_etag}).status_code == 412
+
+    assert client.delete(task_endpoint, headers={"If-Match": task_etag}).status_code == 412
+    assert client.delete(task_endpoint, headers={"If-Match": '"2"'}).status_code == 204
+    assert client.delete(task_endpoint, headers={"If-Match": '"2"'}).status_code == 404
+
+    person_etag = client.get(person_endpoint).headers["ETag"]
+    assert client.delete(person_endpoint, headers={"If-Match": person_etag}).status_code == 204
+    assert client.get(person_endpoint, headers={"If-None-Match": person_etag}).status_code == 404
+
+
+def test_create_task_single_insert(db):
+    """
+    test creating a task sends one INSERT and the one of its notification,
+    the foreign key rejects an unknown person
+    """
+    created_person = client.post(PERSONS_ENDPOINT, json={"name": PERSON_NAME_JOHN}).json()
+    task_data = {"name": TASK_ONE_NAME, "description": DESCRIPTION_ONE, "completed": False, "startdate": "2023-09-06"}
+    statements = []
+
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith(("SELECT", "INSERT", "UPDATE")):
+            statements.append(statement)
+
+    event.listen(test_engine, "before_cursor_execute", record_statement)
+    try:
+        response_create_task = client.post(
+            TASKS_ENDPOINT, json=task_data, params={"person_id": created_person["id"]}
+        )
+        assert response_create_task.status_code == 201
+        assert response_create_task.json() == {
+            **task_data,
+            "enddate": None,
+            "id": response_create_task.json()["id"],
+            "assigned_person_id": created_person["id"],
+        }
+        # the task and its notification, in the same transaction
+        assert sorted(statement.split()[2] for statement in statements) == ["outbox", "tasks"]
+        assert all(statement.startswith("INSERT") for statement in statements)
+        assert outbox_messages()[-1] == (
+            f"TASK CREATE: {TASK_ONE_NAME}, PERSON ASSIGNED: {created_person['id']}"
+        )
+
+        response_unknown_person = client.post(TASKS_ENDPOINT, json=task_data, params={"person_id": 69})
+        assert response_unknown_person.status_code == 404
+        assert response_unknown_person.json()["detail"] == "Person with this id does not exist"
+        # the rolled back transaction leaves no notification
+        assert len(outbox_messages()) == 2
+    finally:
+        event.remove(test_engine, "before_cursor_execute", record_statement)
+
+
+def test_schema_rules_keep_error_bodies(db):
+    """
+    test a body breaking a rule of the schemas is answered with the 400 of the rule,
+    and a malformed field with the 422 of pydantic alone
+    """
+    created_person = client.post(PERSONS_ENDPOINT, json={"name": PERSON_NAME_JOHN}).json()
+    task_data = {"name": TASK_ONE_NAME, "description": DESCRIPTION_ONE, "completed": False, "startdate": "2023-09-06"}
+
+    for test_client in (client, async_client):
+        response_empty_name = test_client.post(PERSONS_ENDPOINT, json={"name": ""})
+        assert response_empty_name.status_code == 400
+        assert response_empty_name.json() == {"detail": "Person name cannot be empty!"}
+
+        response_invalid_dates = test_client.post(
+            TASKS_ENDPOINT,
+            json={**task_data, "completed": True, "enddate": "2023-09-01"},
+            params={"person_id": created_person["id"]},
+        )
+        assert response_invalid_dates.status_code == 400
+        assert response_invalid_dates.json() == {"detail": "End date must be later than start date"}
+
+        response_malformed = test_client.post(
+            TASKS_ENDPOINT,
+            json={**task_data, "name": "", "completed": "maybe"},
+            params={"person_id": created_person["id"]},
+        )
+        assert response_malformed.status_code == 422
+        assert [error["loc"] for error in response_malformed.json()["detail"]] == [["body", "completed"]]
+
+    created_task = client.post(
+        TASKS_ENDPOINT, json=task_data, params={"person_id": created_person["id"]}
+    ).json()
+    response_patch = client.patch(f"{TASKS_ENDPOINT}/{created_task['id']}", json={"completed": True})
+    assert response_patch.status_code == 400
+    assert response_patch.json() == {"detail": "enddate and completed values are invalid!"}
+
+
+def test_fast_serialization_keeps_bodies_and_openapi(db):
+    """
+    test the fast serialization path answers the bytes FastAPI does and leaves OpenAPI unchanged
+    """
+    created_person = client.post(PERSONS_ENDPOINT, json={"name": PERSON_NAME_JOHN}).json()
+    for task_data in (
+        {"name": TASK_ONE_NAME, "description": DESCRIPTION_ONE, "completed": False, "startdate": "2023-09-06"},
+        {"name": TASK_TWO_NAME, "description": "Deßcription ✓", "completed": True,
+         "startdate": "2023-09-06", "enddate": "2023-09-15"},
+    ):
+        created_task = client.post(
+            TASKS_ENDPOINT, json=task_data, params={"person_id": created_person["id"]}
+        ).json()
+    endpoints = [
+        PERSONS_ENDPOINT, f"{PERSONS_ENDPOINT}?include=", f"{PERSONS_ENDPOINT}/{created_person['id']}",
+        TASKS_ENDPOINT, f"{TASKS_ENDPOINT}?limit=1", f"{TASKS_ENDPOINT}/search?q=task",
+        f"{TASKS_ENDPOINT}/{created_task['id']}",
+    ]
+
+    def responses():
+        person_cache.clear()
+        task_cache.clear()
+        return [client.get(endpoint) for endpoint in endpoints]
+
+    default_responses = responses()
+    with mock.patch.object(serialization, "FAST_SERIALIZATION", True):
+        fast_responses = responses()
+        fast_openapi = create_app().openapi()
+
+    for default, fast in zip(default_responses, fast_responses):
+        assert fast.status_code == default.status_code == 200
+        assert fast.content == default.content
+        assert fast.headers["content-type"] == default.headers["content-type"]
+        assert fast.headers.get("etag") == default.headers.get("etag")
+    assert fast_openapi == create_app().openapi()
+
+
+def test_background_publisher_policies(db, tmp_path):
+    """
+    test notifications are published in batches off the request thread, and the
+    block, drop_oldest and spill policies when the broker falls behind, against
+    in-process brokers
+    """
+    # without the outbox the notifications are handed to the publisher on commit
+    app_broker = FakeBroker()
+    published_before = notification_publisher.status_dict()["published"]
+    with (
+        mock.patch.object(outbox_dao, "NOTIFICATION_OUTBOX", False),
+        mock.patch.object(notification_publisher, "rabbitmq_service", app_broker),
+        mock.patch.object(notification_publisher, "enabled", True),
+    ):
+        response_person = client.post(PERSONS_ENDPOINT, json={"name": PERSON_NAME_JOHN})
+        assert response_person.status_code == 201
+        assert notification_publisher.flush(timeout=5)
+    assert app_broker.messages == [f"PERSON CREATE: {PERSON_NAME_JOHN}"]
+    assert outbox_messages() == []
+    response_metrics = client.get("/metrics/publisher")
+    assert response_metrics.status_code == 200
+    assert response_metrics.json()["published"] == published_before + 1
+    assert response_metrics.json()["depth"] == 0
+
+    broker = mock.Mock()
+    published = []
+    started, release = threading.Event(), threading.Event()
+
+    def publish_batch(messages):
+        # the first batch waits for the test, the queue meanwhile fills up
+        started.set()
+        release.wait(timeout=5)
+        published.append(list(messages))
+
+    broker.publish_batch.side_effect = publish_batch
+    messages = [f"PERSON CREATE: {index}" for index in range(6)]
+
+    for policy, expected in (
+        (BackpressurePolicy.block, messages[:3]),
+        (BackpressurePolicy.drop_oldest, [messages[0], *messages[4:]]),
+        (BackpressurePolicy.spill, messages),
+    ):
+        published.clear()
+        started.clear()
+        release.clear()
+        spill_path = tmp_path / f"{policy.value}.ndjson"
+        publisher = BackgroundPublisher(
+            broker, max_size=2, batch_size=2, policy=policy, block_timeout=0.05,
+            spill_path=str(spill_path),
+        )
+        publisher.publish(messages[0])
+        assert started.wait(timeout=5)
+        for message in messages[1:]:
+            publisher.publish(message)
+        release.set()
+        assert publisher.flush(timeout=5)
+        publisher.stop()
+
+        assert [message for batch in published for message in batch] == expected
+        assert all(len(batch) <= 2 for batch in published)
+        status = publisher.status_dict()
+        assert status["published"] == len(expected)
+        assert status["dropped"] == len(messages) - len(expected)
+        assert status["spilled"] == (3 if policy == BackpressurePolicy.spill else 0)
+        assert status["depth"] == 0 and status["spill_pending"] == 0
+        assert not spill_path.exists()
+
+    # with the block policy a publish on an event loop does not wait for room
+    published.clear()
+    started.clear()
+    release.clear()
+    publisher = BackgroundPublisher(
+        broker, max_size=1, batch_size=1, policy=BackpressurePolicy.block, block_timeout=5,
+        spill_path=str(tmp_path / "loop.ndjson"),
+    )
+    publisher.publish(messages[0])
+    assert started.wait(timeout=5)
+    publisher.publish(messages[1])
+
+    async def publish_on_loop():
+        start = time.monotonic()
+        publisher.publish(messages[2])
+        return time.monotonic() - start
+
+    assert asyncio.run(publish_on_loop()) < 1
+    release.set()
+    assert publisher.flush(timeout=5)
+    publisher.stop()
+    assert [message for batch in published for message in batch] == messages[:2]
+    assert publisher.status_dict()["dropped"] == 1
+
+    # a batch the broker rejects, or whose host does not resolve, is retried on a new connection
+    published.clear()
+    broker.publish_batch.side_effect = [
+        AMQPError(), socket.gaierror(-2, "Name or service not known"), None
+    ]
+    publisher = BackgroundPublisher(broker, retry_seconds=0.01)
+    publisher.publish(messages[0])
+    assert publisher.flush(timeout=5)
+    publisher.stop()
+    assert publisher.status_dict()["failed_attempts"] == 2
+    assert publisher.status_dict()["published"] == 1
+    assert publisher.status_dict()["dropped"] == 0
+    assert broker.close.call_count == 2
+
+
+def test_outbox_written_with_changes_and_relayed(db):
+    """
+    test notifications are written to the outbox in the transaction of the change,
+    and the relay publishes them in order once the broker confirms them
+    """
+    created_person = client.post(PERSONS_ENDPOINT, json={"name": PERSON_NAME_JOHN}).json()
+    assert client.post(PERSONS_ENDPOINT, json={"name": PERSON_NAME_JOHN}).status_code == 400
+    task_data = {"name": TASK_ONE_NAME, "description": DESCRIPTION_ONE, "completed": False, "startdate": "2023-09-06"}
+    created_task = client.post(
+        TASKS_ENDPOINT, json=task_data, params={"person_id": created_person["id"]}
+    ).json()
+    assert client.put(f"{TASKS_ENDPOINT}/69", json=task_data).status_code == 404
+    assert client.delete(f"{TASKS_ENDPOINT}/{created_task['id']}").status_code == 204
+    assert async_client.post(PERSONS_ENDPOINT, json={"name": PERSON_NAME_ALICE}).status_code == 201
+    expected = [
+        f"PERSON CREATE: {PERSON_NAME_JOHN}",
+        f"TASK CREATE: {TASK_ONE_NAME}, PERSON ASSIGNED: {created_person['id']}",
+        f"TASK ID {created_task['id']} DELETED",
+        f"PERSON CREATE: {PERSON_NAME_ALICE}",
+    ]
+    # the rejected writes left no notification
+    assert outbox_messages() == expected
+
+    broker = FakeBroker()
+    relay = OutboxRelay(TestSessionLocal, broker, outbox_dao.outbox_dao, batch_size=3)
+    # rows claimed by a relay that stopped before marking them sent are
+    # skipped until the claim expires
+    with TestSessionLocal() as session:
+        claimed = outbox_dao.outbox_dao.claim_unsent(
+            db=session, limit=len(expected), claimed_at=datetime.utcnow(),
+            expired_before=datetime.utcnow() - timedelta(seconds=60),
+        )
+    assert [row.message for row in claimed] == expected
+    assert relay.relay_pending() == 0
+    relay.lease_seconds = 0
+
+    broker.nacks = 1
+    with pytest.raises(NackError):
+        relay.relay_batch()
+    assert broker.messages == []
+    with TestSessionLocal() as session:
+        # the claim of the rejected batch was released
+        claims = session.scalars(select(OutboxMessage.claimed_at).order_by(OutboxMessage.id))
+        assert list(claims)[:3] == [None] * 3
+    # so is the claim of a batch the broker host could not be reached for
+    unreachable = socket.gaierror(-2, "Name or service not known")
+    with mock.patch.object(broker, "publish_batch", side_effect=unreachable):
+        with pytest.raises(socket.gaierror):
+            relay.relay_batch()
+        with TestSessionLocal() as session:
+            claims = session.scalars(select(OutboxMessage.claimed_at).order_by(OutboxMessage.id))
+            assert list(claims)[:3] == [None] * 3
+        # the relay thread drops the broker connection to reconnect on the next attempt
+        relay.start()
+        try:
+            for _ in range(100):
+                if broker.closed:
+                    break
+                time.sleep(0.05)
+        finally:
+            relay.stop()
+    assert broker.closed >= 1
+    assert relay.relay_pending() == 4
+    assert broker.messages == expected
+    # no transaction or connection is held while the broker confirms a batch
+    assert set(broker.checked_out) == {0}
+    assert relay.relay_pending() == 0
+    assert relay.purge_sent() == 0
+
+    # the relay thread is woken up by the commit of a change
+    relay.poll_seconds = 60
+    relay.start()
+    try:
+        client.delete(f"{PERSONS_ENDPOINT}/{created_person['id']}")
+        for _ in range(100):
+            if len(broker.messages) == 5:
+                break
+            time.sleep(0.05)
+        assert broker.messages[4:] == [f"PERSON (ID: {created_person['id']}) DELETED"]
+    finally:
+        relay.stop()
+
+    relay.retention_seconds = -1
+    assert relay.purge_sent() == 5
+    assert outbox_messages() == []
+
+
+def test_delete_task_without_if_match_ignores_version(db):
+    """
+    test a DELETE without If-Match removes the task even if it was updated
+    after the session read it, only If-Match deletes are bound to a version
+    """
+    created_person = client.post(PERSONS_ENDPOINT, json={"name": PERSON_NAME_JOHN}).json()
+    task_data = {"name": TASK_ONE_NAME, "description": DESCRIPTION_ONE, "completed": False, "startdate": "2023-09-06"}
+    task_id = client.post(
+        TASKS_ENDPOINT, json=task_data, params={"person_id": created_person["id"]}
+    ).json()["id"]
+
+    with TestSessionLocal() as session:
+        # the session keeps version 1 in its identity map while the task is updated
+        read_task = session.get(Task, task_id)
+        assert read_task.version == 1
+        session.commit()
+        response_update = client.put(f"{TASKS_ENDPOINT}/{task_id}", json={**task_data, "name": TASK_TWO_NAME})
+        assert response_update.status_code == 200
+
+        assert task_dao.delete_task_by_id(task_id=task_id, db=session, versions=[(1,)]) is None
+        deleted_task = task_dao.delete_task_by_id(task_id=task_id, db=session)
+        assert deleted_task is not None and deleted_task.id == task_id
+
+    assert client.get(f"{TASKS_ENDPOINT}/{task_id}").status_code == 404
+
+
+def test_sqlite_engines_enforce_foreign_keys(tmp_path):
+    """
+    test the engines built for SQLite turn foreign keys on for their connections
+    """
+    sqlite_engine = database.create_pooled_engine(f"sqlite:///{tmp_path / 'foreign_keys.db'}")
+    try:
+        with sqlite_engine.connect() as connection:
+            assert connection.exec_driver_sql("PRAGMA foreign_keys").scalar() == 1
+    finally:
+        sqlite_engine.dispose()
+
+
+def test_create_task_only_maps_missing_person_to_not_found(db):
+    """
+    test only a violation of the person foreign key answers 404,
+    other integrity errors are raised
+    """
+    created_person = client.post(PERSONS_ENDPOINT, json={"name": PERSON_NAME_JOHN}).json()
+    task_data = {"name": TASK_ONE_NAME, "description": DESCRIPTION_ONE, "completed": False, "startdate": "2023-09-06"}
+    missing_person = IntegrityError("INSERT INTO tasks", {}, Exception(
+        1452, "Cannot add or update a child row: a foreign key constraint fails "
+        "(`test_db`.`tasks`, CONSTRAINT `fk_tasks_assigned_person_id` FOREIGN KEY "
+        "(`assigned_person_id`) REFERENCES `persons` (`id`) ON DELETE CASCADE)"
+    ))
+    duplicate = IntegrityError("INSERT INTO tasks", {}, Exception(
+        1062, "Duplicate entry '1' for key 'tasks.PRIMARY'"
+    ))
+
+    with mock.patch.object(task_dao, "create_new_task", side_effect=missing_person):
+        response_create_task = client.post(
+            TASKS_ENDPOINT, json=task_data, params={"person_id": created_person["id"]}
+        )
+    assert response_create_task.status_code == 404
+
+    with mock.patch.object(task_dao, "create_new_task", side_effect=duplicate):
+        with pytest.raises(IntegrityError):
+            client.post(TASKS_ENDPOINT, json=task_data, params={"person_id": created_person["id"]})
+
+
+def test_get_by_id_etag_from_loaded_row(db):
+    """
+    test an unconditional GET takes the ETag from the row it loads, without a
+    version lookup, and every variant of a person has the ETag the lookup computes
+    """
+    created_person = client.post(PERSONS_ENDPOINT, json={"name": PERSON_NAME_JOHN}).json()
+    task_data = {"name": TASK_ONE_NAME, "description": DESCRIPTION_ONE, "completed": False, "startdate": "2023-09-06"}
+    created_task = client.post(
+        TASKS_ENDPOINT, json=task_data, params={"person_id": created_person["id"]}
+    ).json()
+    person_endpoint = f"{PERSONS_ENDPOINT}/{created_person['id']}"
+    task_endpoint = f"{TASKS_ENDPOINT}/{created_task['id']}"
+    statements = []
+
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    person_cache.enabled = False
+    task_cache.enabled = False
+    event.listen(test_engine, "before_cursor_execute", record_statement)
+    try:
+        person_etags = set()
+        # the person and its tasks, the person row with its version columns
+        for params, queries in (({}, 2), ({"include": ""}, 1), ({"fields": "name"}, 1)):
+            statements.clear()
+            response_get_person = client.get(person_endpoint, params=params)
+            assert response_get_person.status_code == 200
+            assert len(statements) == queries
+            person_etags.add(response_get_person.headers["ETag"])
+        for params in ({}, {"fields": "name"}):
+            statements.clear()
+            response_get_task = client.get(task_endpoint, params=params)
+            assert len(statements) == 1
+            assert response_get_task.headers["ETag"] == '"1"'
+    finally:
+        event.remove(test_engine, "before_cursor_execute", record_statement)
+        person_cache.enabled = True
+        task_cache.enabled = True
+
+    assert len(person_etags) == 1
+    person_etag = person_etags.pop()
+    assert client.get(person_endpoint, headers={"If-None-Match": person_etag}).status_code == 304
+    assert client.get(task_endpoint, headers={"If-None-Match": '"1"'}).status_code == 304
+
+
+def test_patch_task_modified_concurrently(db):
+    """
+    test patch task fails with 412 when the task is written between the read
+    the changes are checked against and the UPDATE, the other write is kept
+    """
+    response_create_person = client.post(PERSONS_ENDPOINT, json={"name": PERSON_NAME_JOHN})
+    created_person = response_create_person.json()
+    created_task = client.post(
+        TASKS_ENDPOINT,
+        json={
+            "name": TASK_ONE_NAME,
+            "description": DESCRIPTION_ONE,
+            "completed": False,
+            "startdate": "2023-09-06",
+            "enddate": None,
+        },
+        params={"person_id": created_person["id"]},
+    ).json()
+    get_task_by_id = task_dao.get_task_by_id
+
+    def read_then_concurrent_put(task_id, db):
+        db_task = get_task_by_id(task_id=task_id, db=db)
+        with TestSessionLocal() as other_db:
+            other_db.execute(
+                Task.__table__.update()
+                .where(Task.id == task_id)
+                .values(startdate=datetime(2023, 9, 20).date(), version=Task.version + 1)
+            )
+            other_db.commit()
+        return db_task
+
+    with mock.patch.object(task_dao, "get_task_by_id", side_effect=read_then_concurrent_put):
+        response_patch_task = client.patch(
+            f"{TASKS_ENDPOINT}/{created_task['id']}",
+            json={"completed": True, "enddate": "2023-09-15"},
+        )
+    assert response_patch_task.status_code == 412
+
+    # the enddate would now be before the startdate, the patch was not written
+    response_get_task = client.get(f"{TASKS_ENDPOINT}/{created_task['id']}")
+    assert response_get_task.json()["startdate"] == "2023-09-20"
+    assert response_get_task.json()["enddate"] is None
+    assert response_get_task.json()["completed"] is False
+
 # -------------------------------------------------------------------------------
 
 
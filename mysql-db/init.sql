@@ -3,6 +3,7 @@
 
 CREATE DATABASE IF NOT EXISTS task_db;
 CREATE DATABASE IF NOT EXISTS test_db;
+CREATE DATABASE IF NOT EXISTS test_replica_db;
 
 -- create table tasks(
 --    id INT AUTO_INCREMENT PRIMARY KEY,
@@ -0,0 +1,9 @@
+-- enforce unique person names in the database instead of a check before every insert
+-- run against task_db (and test_db) created before this change, new databases get the
+-- constraint from Base.metadata.create_all
+-- duplicate names have to be renamed or removed first, this lists them:
+-- SELECT name, COUNT(*) FROM persons GROUP BY name HAVING COUNT(*) > 1;
+
+ALTER TABLE persons
+    DROP INDEX ix_persons_name,
+    ADD UNIQUE INDEX ix_persons_name (name);
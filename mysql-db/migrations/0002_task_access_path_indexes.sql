@@ -0,0 +1,12 @@
+-- rework the tasks indexes around the columns the endpoints filter and join on
+-- ix_tasks_id duplicates the primary key and no endpoint filters on description,
+-- both only slowed down inserts and updates.
+-- InnoDB drops the implicit foreign key index on assigned_person_id by itself
+-- once ix_tasks_assigned_person_id_startdate can enforce the constraint
+
+ALTER TABLE tasks
+    DROP INDEX ix_tasks_id,
+    DROP INDEX ix_tasks_description,
+    ADD INDEX ix_tasks_assigned_person_id_startdate (assigned_person_id, startdate),
+    ADD INDEX ix_tasks_completed_startdate (completed, startdate),
+    ADD INDEX ix_tasks_completed_enddate (completed, enddate);
@@ -0,0 +1,10 @@
+-- let the database delete the tasks of a deleted person, so deleting a person
+-- is a single DELETE instead of loading and deleting every task through the ORM
+-- tasks_ibfk_1 is the name MySQL gave the unnamed foreign key of tables created
+-- before this change, check it with:
+-- SHOW CREATE TABLE tasks;
+
+ALTER TABLE tasks
+    DROP FOREIGN KEY tasks_ibfk_1,
+    ADD CONSTRAINT fk_tasks_assigned_person_id
+        FOREIGN KEY (assigned_person_id) REFERENCES persons (id) ON DELETE CASCADE;
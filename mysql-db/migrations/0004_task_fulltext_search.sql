@@ -0,0 +1,7 @@
+-- keyword search over the task name and description for GET /tasks/search
+-- run against task_db (and test_db) created before this change, new databases get the
+-- index from Base.metadata.create_all.
+-- words shorter than innodb_ft_min_token_size (3 by default) are not indexed
+
+ALTER TABLE tasks
+    ADD FULLTEXT INDEX ix_tasks_name_description_fulltext (name, description);
@@ -0,0 +1,9 @@
+-- row version of tasks and persons, raised by one on every write, for the ETag of
+-- GET /tasks/{id} and /persons/{id} and the If-Match checks of PUT and DELETE.
+-- existing rows start at version 1
+
+ALTER TABLE tasks
+    ADD COLUMN version INT NOT NULL DEFAULT 1;
+
+ALTER TABLE persons
+    ADD COLUMN version INT NOT NULL DEFAULT 1;
@@ -0,0 +1,11 @@
+-- outbox of the notifications, written in the transaction of the person or task
+-- change they announce and published to RabbitMQ by the relay, which sets sent_at.
+-- sent rows are deleted by the relay once they are older than the retention
+
+CREATE TABLE outbox (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    message VARCHAR(255) NOT NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    sent_at DATETIME NULL,
+    INDEX ix_outbox_sent_at_id (sent_at, id)
+);
@@ -0,0 +1,6 @@
+-- claims of the outbox relay: a batch is claimed in a short transaction and
+-- published with no transaction open, claimed_at keeps the other relays off it.
+-- a claim older than NOTIFICATION_OUTBOX_LEASE_SECONDS has expired
+
+ALTER TABLE outbox
+    ADD COLUMN claimed_at DATETIME NULL;